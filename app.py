@@ -3,264 +3,242 @@ Flask Web Application for Mediation Application Form Generator
 Allows users to download the generated MS Word document
 """
 
-from flask import Flask, render_template, send_file, request
+import time
+
+# Taken before the other imports so startup timing includes them.
+STARTED_AT = time.perf_counter()
+
+import hmac
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, timezone
+
+from flask import (
+    Flask, Response, render_template, send_file, request, abort, g, jsonify, make_response,
+    stream_with_context, url_for
+)
 from io import BytesIO
-from docx import Document
-from docx.shared import Pt, Cm, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_TABLE_ALIGNMENT, WD_CELL_VERTICAL_ALIGNMENT
-from docx.oxml.ns import nsdecls
-from docx.oxml import parse_xml
+
+import batch
+import case_store
+import form_extract
+import jobs
+import profiling
+import tenants
+from artifacts import store as artifacts
+from builds import (
+    BACKENDS, DEFAULT_BACKEND, DEFAULT_TENANT, LAYOUT, TENANT_CACHE_SIZE, TENANTS, built,
+    get_blank_form, get_blank_pdf, get_compiled_template, render_document, template_key
+)
+from case_store import store as cases_db
+from executor import BoundedExecutor, GenerationTimeout, QueueFull
+from form_template import DOCUMENT_PART, party_lists
+from metrics import registry as metrics
+from result_cache import ResultCache, cache_key
 
 app = Flask(__name__)
+profiling.install(app)
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+OUTPUT_FORMATS = {
+    'docx': DOCX_MIMETYPE,
+    'pdf': 'application/pdf',
+}
+BLANK_FORM_MAX_AGE = 3600
+
+result_cache = ResultCache(
+    max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    directory=os.environ.get('RESULT_CACHE_DIR') or None,
+    max_disk_bytes=int(os.environ.get('RESULT_CACHE_DISK_MAX_BYTES', 1024 * 1024 * 1024))
+)
+
+
+def _report_generation_load(executor):
+    metrics.set('mediation_generation_running', executor.running)
+    metrics.set('mediation_generation_queue_depth', executor.queued)
+    metrics.set('mediation_generation_batches', executor.reserved)
+
+
+# Waiting requests hold a gunicorn thread, so concurrency + queue depth
+# should stay below the worker's threads to keep / and /ready answering.
+# Each streaming /bulk or /merge holds one of the queue's slots while it
+# runs, at most GENERATION_BATCH_SLOTS at once.
+generation = BoundedExecutor(
+    max_workers=int(os.environ.get('GENERATION_CONCURRENCY', 2)),
+    max_queue=int(os.environ.get('GENERATION_QUEUE_DEPTH', 4)),
+    timeout=float(os.environ.get('GENERATION_TIMEOUT', 30)),
+    on_change=_report_generation_load,
+    max_reserved=int(os.environ.get('GENERATION_BATCH_SLOTS', 2)),
+)
+RETRY_AFTER = os.environ.get('GENERATION_RETRY_AFTER', '2')
+
+
+def requested_tenant():
+    """Return the Tenant named by the 'tenant' query or form field (default if absent), or abort with 404."""
+    tenant_id = request.values.get('tenant') or tenants.DEFAULT_ID
+    try:
+        return TENANTS[tenant_id]
+    except KeyError:
+        abort(404, description=f'Unknown tenant "{tenant_id}".')
+
+
+def requested_backend():
+    """Return the layout backend from the 'backend' query or form field, or abort with 400."""
+    backend = request.values.get('backend') or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        abort(400, description='backend must be "docx" or "xml".')
+    return backend
+
+
+def render_form(fields, fmt='docx', offload=True, tenant=None, backend=None, store=True):
+    """Fill a tenant's precompiled template with fields and return .docx or PDF bytes.
+
+    Results are cached by template version, tenant version, backend,
+    format and field values. A cache miss is rendered on the generation
+    executor unless offload is False (batch routes, which are admitted up
+    front instead). With store False the cache is only read: a batch of
+    thousands of one-off rows would otherwise evict every interactive
+    entry and fill the disk tier.
+    """
+    tenant, backend = tenant or DEFAULT_TENANT, backend or DEFAULT_BACKEND
+    template = get_compiled_template(tenant, backend)
+
+    def render_uncached():
+        with metrics.time('mediation_generation_phase_seconds', phase='render'):
+            return render_document(template, fields, fmt)
+
+    key = cache_key(template_key(tenant, backend), fmt, fields, template.fields)
+    render = (lambda: generation.run(profiling.bind(render_uncached))) if offload else render_uncached
+    if store:
+        data, hit = result_cache.get_or_render(key, render)
+    else:
+        data = result_cache.peek(key)
+        hit = data is not None
+        if not hit:
+            data = render()
+    metrics.inc('mediation_cache_requests_total', cache='result', result='hit' if hit else 'miss')
+    return data
+
+
+def render_preview(fields=None, tenant=None, backend=None):
+    """Return (HTML fragment bytes, cache key) previewing a filled form, or the blank one when fields is None.
+
+    The HTML is laid out from the document the backend generates (see
+    form_html) and cached like rendered forms, by template version,
+    tenant, backend and field values, so a repeat costs a cache lookup.
+    The blank form keeps its template tags, highlighted.
+    """
+    tenant, backend = tenant or DEFAULT_TENANT, backend or DEFAULT_BACKEND
+    template = get_compiled_template(tenant, backend)
+
+    def build():
+        import form_html
+
+        with metrics.time('mediation_generation_phase_seconds', phase='preview'):
+            if fields is None:
+                with zipfile.ZipFile(BytesIO(get_blank_form(tenant, backend)[0])) as package:
+                    document_xml = package.read(DOCUMENT_PART)
+            else:
+                document_xml = template.render_xml(fields)
+            return form_html.document_to_html(document_xml, LAYOUT.font, tags=fields is None).encode('utf-8')
+
+    fmt = 'html-blank' if fields is None else 'html'
+    key = cache_key(template_key(tenant, backend), fmt, fields or {}, template.fields)
+    data, hit = result_cache.get_or_render(key, lambda: generation.run(profiling.bind(build)))
+    metrics.inc('mediation_cache_requests_total', cache='preview', result='hit' if hit else 'miss')
+    return data, key
+
+
+def requested_output_format(formats=tuple(OUTPUT_FORMATS)):
+    """Return the output format from the ?format= query parameter, or abort with 400 if not one of formats."""
+    fmt = request.args.get('format', 'docx').lower()
+    if fmt not in formats:
+        abort(400, description='format must be ' + ' or '.join(f'"{name}"' for name in formats) + '.')
+    return fmt
+
+
+STARTUP = {'import_seconds': None, 'warm_up_seconds': None, 'ready_seconds': None}
+_ready = threading.Event()
+_warm_up_lock = threading.Lock()
+
+
+def warm_up():
+    """Build the blank form, compiled template and blank PDF, then mark the app ready.
+
+    The other tenants' templates are compiled too, up to TENANT_CACHE_SIZE.
+    Run once in the gunicorn master with preload_app (see gunicorn.conf.py)
+    so every forked worker starts with the cached bytes already in memory.
+    """
+    with _warm_up_lock:
+        if _ready.is_set():
+            return
+        started = time.perf_counter()
+        get_blank_form()
+        get_compiled_template()
+        get_blank_pdf()
+        for tenant in list(TENANTS.values())[1:TENANT_CACHE_SIZE]:
+            get_compiled_template(tenant)
+        STARTUP['warm_up_seconds'] = round(time.perf_counter() - started, 4)
+        STARTUP['ready_seconds'] = round(time.perf_counter() - STARTED_AT, 4)
+        _ready.set()
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.observe('mediation_http_request_duration_seconds', time.perf_counter() - started, route=route)
+    metrics.inc('mediation_http_requests_total', route=route, method=request.method, status=response.status_code)
+    if response.content_length:
+        metrics.inc('mediation_http_response_bytes_total', response.content_length, route=route)
+    metrics.ensure_flusher()
+    return response
+
+
+def admit_batch():
+    """Reserve a generation slot for this batch request, or raise QueueFull.
+
+    Batches render on the request thread, so the slot is held until the
+    request context ends: after the last streamed chunk, or at once if
+    the request fails first (see _release_batch_slot).
+    """
+    g.batch_slot = generation.reserve()
+
+
+@app.teardown_request
+def _release_batch_slot(_):
+    slot = g.pop('batch_slot', None)
+    if slot is not None:
+        slot.release()
+
+
+@app.errorhandler(QueueFull)
+def generation_busy(_):
+    metrics.inc('mediation_generation_rejected_total', reason='queue_full')
+    return (
+        jsonify(error='Too many documents are being generated; retry shortly.'),
+        429, {'Retry-After': RETRY_AFTER}
+    )
 
 
-def set_cell_borders(cell, border_color="000000", border_size="4"):
-    """Set cell borders."""
-    tc = cell._tc
-    tcPr = tc.get_or_add_tcPr()
-    tcBorders = parse_xml(
-        f'<w:tcBorders {nsdecls("w")}>'
-        f'<w:top w:val="single" w:sz="{border_size}" w:color="{border_color}"/>'
-        f'<w:left w:val="single" w:sz="{border_size}" w:color="{border_color}"/>'
-        f'<w:bottom w:val="single" w:sz="{border_size}" w:color="{border_color}"/>'
-        f'<w:right w:val="single" w:sz="{border_size}" w:color="{border_color}"/>'
-        f'</w:tcBorders>'
+@app.errorhandler(GenerationTimeout)
+def generation_timeout(_):
+    metrics.inc('mediation_generation_rejected_total', reason='timeout')
+    return (
+        jsonify(error='Generating the document took too long; retry shortly.'),
+        503, {'Retry-After': RETRY_AFTER}
     )
-    tcPr.append(tcBorders)
-
-
-def add_formatted_paragraph(cell, text, bold=False, underline=False, font_size=11, font_name="Times New Roman"):
-    """Add a formatted paragraph to a cell."""
-    para = cell.paragraphs[0] if cell.paragraphs else cell.add_paragraph()
-    para.clear()
-    para.paragraph_format.space_before = Pt(2)
-    para.paragraph_format.space_after = Pt(2)
-    para.paragraph_format.line_spacing = 1.15
-    run = para.add_run(text)
-    run.bold = bold
-    run.underline = underline
-    run.font.size = Pt(font_size)
-    run.font.name = font_name
-    return para
-
-
-def add_new_paragraph(cell, text, bold=False, underline=False, font_size=11, font_name="Times New Roman"):
-    """Add a new paragraph to a cell."""
-    para = cell.add_paragraph()
-    para.paragraph_format.space_before = Pt(2)
-    para.paragraph_format.space_after = Pt(2)
-    para.paragraph_format.line_spacing = 1.15
-    run = para.add_run(text)
-    run.bold = bold
-    run.underline = underline
-    run.font.size = Pt(font_size)
-    run.font.name = font_name
-    return para
-
-
-def create_mediation_form():
-    """Create the Mediation Application Form document and return as BytesIO."""
-    doc = Document()
-
-    # Set document margins
-    sections = doc.sections
-    for section in sections:
-        section.top_margin = Cm(1.5)
-        section.bottom_margin = Cm(1.5)
-        section.left_margin = Cm(2)
-        section.right_margin = Cm(2)
-
-    # HEADER SECTION
-    header1 = doc.add_paragraph()
-    header1.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    header1.paragraph_format.space_after = Pt(3)
-    header1.paragraph_format.space_before = Pt(0)
-    header1.paragraph_format.line_spacing = 1.15
-    run1 = header1.add_run("FORM 'A'")
-    run1.bold = True
-    run1.font.size = Pt(12)
-    run1.font.name = "Times New Roman"
-
-    header2 = doc.add_paragraph()
-    header2.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    header2.paragraph_format.space_after = Pt(3)
-    header2.paragraph_format.space_before = Pt(0)
-    header2.paragraph_format.line_spacing = 1.15
-    run2 = header2.add_run("MEDIATION APPLICATION FORM")
-    run2.bold = True
-    run2.font.size = Pt(12)
-    run2.font.name = "Times New Roman"
-
-    header3 = doc.add_paragraph()
-    header3.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    header3.paragraph_format.space_after = Pt(3)
-    header3.paragraph_format.space_before = Pt(0)
-    header3.paragraph_format.line_spacing = 1.15
-    run3 = header3.add_run("[REFER RULE 3(1)]")
-    run3.bold = True
-    run3.font.size = Pt(12)
-    run3.font.name = "Times New Roman"
-
-    header4 = doc.add_paragraph()
-    header4.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    header4.paragraph_format.space_after = Pt(3)
-    header4.paragraph_format.space_before = Pt(0)
-    header4.paragraph_format.line_spacing = 1.15
-    run4 = header4.add_run("Mumbai District Legal Services Authority")
-    run4.font.size = Pt(12)
-    run4.font.name = "Times New Roman"
-
-    header5 = doc.add_paragraph()
-    header5.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    header5.paragraph_format.space_after = Pt(12)
-    header5.paragraph_format.space_before = Pt(0)
-    header5.paragraph_format.line_spacing = 1.15
-    run5 = header5.add_run("City Civil Court, Mumbai")
-    run5.font.size = Pt(12)
-    run5.font.name = "Times New Roman"
-
-    # DETAILS OF PARTIES SECTION
-    details_header = doc.add_paragraph()
-    details_header.paragraph_format.space_after = Pt(6)
-    details_header.paragraph_format.space_before = Pt(6)
-    details_header.paragraph_format.line_spacing = 1.15
-    run_details = details_header.add_run("DETAILS OF PARTIES:")
-    run_details.bold = True
-    run_details.font.size = Pt(11)
-    run_details.font.name = "Times New Roman"
-
-    # Create main table
-    table = doc.add_table(rows=1, cols=3)
-    table.alignment = WD_TABLE_ALIGNMENT.CENTER
-    table.columns[0].width = Cm(1)
-    table.columns[1].width = Cm(4)
-    table.columns[2].width = Cm(10)
-
-    # Row 1: Name of Applicant
-    row = table.rows[0]
-    add_formatted_paragraph(row.cells[0], "1")
-    row.cells[0].vertical_alignment = WD_CELL_VERTICAL_ALIGNMENT.CENTER
-    add_formatted_paragraph(row.cells[1], "Name of", bold=True)
-    add_new_paragraph(row.cells[1], "Applicant", bold=True)
-    add_formatted_paragraph(row.cells[2], "{{client_name}}")
-    for cell in row.cells:
-        set_cell_borders(cell)
-
-    # Row 2: Address header (merged)
-    row2 = table.add_row()
-    row2.cells[0].merge(row2.cells[2])
-    add_formatted_paragraph(row2.cells[0], "Address and contact details of Applicant", bold=True, underline=True)
-    set_cell_borders(row2.cells[0])
-
-    # Row 3: Address
-    row3 = table.add_row()
-    add_formatted_paragraph(row3.cells[0], "1")
-    row3.cells[0].vertical_alignment = WD_CELL_VERTICAL_ALIGNMENT.CENTER
-    add_formatted_paragraph(row3.cells[1], "Address", bold=True)
-    cell_addr = row3.cells[2]
-    add_formatted_paragraph(cell_addr, "REGISTERED ADDRESS:", bold=True)
-    add_new_paragraph(cell_addr, "{{branch_address}}")
-    add_new_paragraph(cell_addr, "CORRESPONDENCE BRANCH ADDRESS:", bold=True)
-    add_new_paragraph(cell_addr, "{{branch_address}}")
-    for cell in row3.cells:
-        set_cell_borders(cell)
-
-    # Row 4-6: Contact details
-    for label, value in [("Telephone No.", "{{mobile}}"), ("Mobile No.", ""), ("Email ID", "info@kslegal.co.in")]:
-        row_n = table.add_row()
-        add_formatted_paragraph(row_n.cells[0], "")
-        add_formatted_paragraph(row_n.cells[1], label, bold=True)
-        add_formatted_paragraph(row_n.cells[2], value)
-        if label == "Email ID":
-            for run in row_n.cells[2].paragraphs[0].runs:
-                run.font.color.rgb = RGBColor(0, 0, 255)
-                run.underline = True
-        for cell in row_n.cells:
-            set_cell_borders(cell)
-
-    # OPPOSITE PARTY SECTION
-    row7 = table.add_row()
-    add_formatted_paragraph(row7.cells[0], "2")
-    row7.cells[0].vertical_alignment = WD_CELL_VERTICAL_ALIGNMENT.CENTER
-    row7.cells[1].merge(row7.cells[2])
-    add_formatted_paragraph(row7.cells[1], "Name, Address and Contact details of Opposite Party:", bold=True)
-    for cell in [row7.cells[0], row7.cells[1]]:
-        set_cell_borders(cell)
-
-    row8 = table.add_row()
-    row8.cells[0].merge(row8.cells[2])
-    add_formatted_paragraph(row8.cells[0], "Address and contact details of Defendant/s", bold=True, underline=True)
-    set_cell_borders(row8.cells[0])
-
-    # Defendant Name
-    row9 = table.add_row()
-    add_formatted_paragraph(row9.cells[0], "")
-    add_formatted_paragraph(row9.cells[1], "Name", bold=True)
-    add_formatted_paragraph(row9.cells[2], "{{customer_name}}")
-    for cell in row9.cells:
-        set_cell_borders(cell)
-
-    # Defendant Address
-    row10 = table.add_row()
-    add_formatted_paragraph(row10.cells[0], "")
-    add_formatted_paragraph(row10.cells[1], "Address", bold=True)
-    cell_def_addr = row10.cells[2]
-    add_formatted_paragraph(cell_def_addr, "REGISTERED ADDRESS:", bold=True)
-    add_new_paragraph(cell_def_addr, '{% if address1 and address1 != "" %}{{address1}} {% else %} ________________ {%')
-    add_new_paragraph(cell_def_addr, "endif %}")
-    add_new_paragraph(cell_def_addr, "CORRESPONDENCE ADDRESS:", bold=True)
-    add_new_paragraph(cell_def_addr, '{% if address1 and address1 != "" %}{{address1}} {% else %} ________________ {%')
-    add_new_paragraph(cell_def_addr, "endif %}")
-    for cell in row10.cells:
-        set_cell_borders(cell)
-
-    # Defendant contact details
-    for label in ["Telephone No.", "Mobile No.", "Email ID"]:
-        row_n = table.add_row()
-        add_formatted_paragraph(row_n.cells[0], "")
-        add_formatted_paragraph(row_n.cells[1], label, bold=True)
-        add_formatted_paragraph(row_n.cells[2], "")
-        for cell in row_n.cells:
-            set_cell_borders(cell)
-
-    # DETAILS OF DISPUTE SECTION
-    dispute_header = doc.add_paragraph()
-    dispute_header.paragraph_format.space_after = Pt(6)
-    dispute_header.paragraph_format.space_before = Pt(12)
-    dispute_header.paragraph_format.line_spacing = 1.15
-    run_dispute = dispute_header.add_run("DETAILS OF DISPUTE:")
-    run_dispute.bold = True
-    run_dispute.font.size = Pt(11)
-    run_dispute.font.name = "Times New Roman"
-
-    dispute_table = doc.add_table(rows=1, cols=1)
-    dispute_table.alignment = WD_TABLE_ALIGNMENT.CENTER
-
-    row_d1 = dispute_table.rows[0]
-    cell_d1 = row_d1.cells[0]
-    para_d1 = cell_d1.paragraphs[0]
-    para_d1.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    para_d1.paragraph_format.space_before = Pt(4)
-    para_d1.paragraph_format.space_after = Pt(4)
-    para_d1.paragraph_format.line_spacing = 1.15
-    run_d1 = para_d1.add_run("THE COMM. COURTS (PRE-INSTITUTION………SETTLEMENT) RULES,2018")
-    run_d1.bold = True
-    run_d1.underline = True
-    run_d1.font.size = Pt(11)
-    run_d1.font.name = "Times New Roman"
-    set_cell_borders(cell_d1)
-
-    row_d2 = dispute_table.add_row()
-    cell_d2 = row_d2.cells[0]
-    add_formatted_paragraph(cell_d2, "Nature of disputes as per section 2(1)(c) of the Commercial Courts Act, 2015 (4 of 2016):", bold=True)
-    set_cell_borders(cell_d2)
-
-    # Save to BytesIO
-    file_stream = BytesIO()
-    doc.save(file_stream)
-    file_stream.seek(0)
-    return file_stream
 
 
 @app.route('/')
@@ -271,21 +249,499 @@ def index():
 
 @app.route('/download')
 def download():
-    """Generate and download the Word document."""
-    file_stream = create_mediation_form()
+    """Download the blank form (.docx, or PDF with ?format=pdf) from the build cache.
+
+    send_file handles HEAD, If-None-Match (304) and Range (206) for us,
+    and sends the artifact file with sendfile when the server supports it.
+    """
+    fmt = requested_output_format()
+    tenant, backend = requested_tenant(), requested_backend()
+    name, build = ('blank_pdf', get_blank_pdf) if fmt == 'pdf' else ('blank_form', get_blank_form)
+    if built(name, tenant, backend):
+        data, etag = build(tenant, backend)
+    else:
+        data, etag = generation.run(profiling.bind(build), tenant, backend)
+    with metrics.time('mediation_generation_phase_seconds', phase='send_file'):
+        path, _ = artifacts.put(data, fmt, etag)
+        return send_file(
+            path,
+            as_attachment=True,
+            download_name=f'mediation_application_form.{fmt}',
+            mimetype=OUTPUT_FORMATS[fmt],
+            etag=etag,
+            conditional=True,
+            max_age=BLANK_FORM_MAX_AGE
+        )
+
+
+@app.route('/render', methods=['POST'])
+def render():
+    """Fill the placeholders from a JSON object of field values and download the result.
+
+    'applicants' and 'defendants' may be lists of objects, one block per party.
+    """
+    fields = request.get_json(silent=True)
+    if not isinstance(fields, dict):
+        abort(400, description='Expected a JSON object of field values.')
+    try:
+        party_lists(fields)
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    fmt = requested_output_format()
+    if fmt == 'pdf':
+        import form_pdf
+
+        problems = form_pdf.field_problems(fields)
+        if problems:
+            return jsonify(error='These values cannot be written to a PDF; request the .docx instead.',
+                           problems=problems), 400
+    tenant, backend = requested_tenant(), requested_backend()
+    data = render_form(fields, fmt, tenant=tenant, backend=backend)
+    with metrics.time('mediation_generation_phase_seconds', phase='send_file'):
+        path, digest = artifacts.put(data, fmt)
+        if case_store.ENABLED:
+            cases_db.keep(path, fmt, digest)
+            cases_db.enqueue(case_store.case_record(
+                'render', fields, fmt, digest, fmt, tenant.id, template_key(tenant, backend)
+            ))
+            metrics.inc('mediation_cases_recorded_total', source='render')
+        return send_file(
+            path,
+            as_attachment=True,
+            download_name=f'mediation_application_form.{fmt}',
+            mimetype=OUTPUT_FORMATS[fmt],
+            etag=digest
+        )
+
+
+def batch_recorder(source, fmt, tenant, backend):
+    """Return a case_store.BatchRecorder for a streamed batch, or None unless CASE_STORE=1."""
+    if not case_store.ENABLED:
+        return None
+    return cases_db.recorder(source, fmt, tenant.id, template_key(tenant, backend), batch.VALIDATE_BLOCK)
+
+
+def recorded(chunks, extension, recorder):
+    """Yield a streamed batch output, archiving it for the cases recorder holds.
+
+    The cases are added to recorder as their forms are rendered and
+    written every batch.VALIDATE_BLOCK rows; once the whole output is
+    archived they are pointed at it. With extension None (or a download that
+    stops early) the cases keep no file. With recorder None (CASE_STORE
+    off) the chunks pass straight through.
+    """
+    if recorder is None:
+        return chunks
+    if extension is not None:
+        chunks = cases_db.archive.iter_put(chunks, extension, lambda _, digest: recorder.attach(digest, extension))
+
+    def recording():
+        try:
+            yield from chunks
+        finally:
+            recorder.flush()
+
+    return recording()
+
+
+def read_batch_upload():
+    """Return (upload, format, column mapping) for a batch request, or abort with 400."""
+    upload = request.files.get('file')
+    if upload is None:
+        abort(400, description='Upload the cases as a "file" field.')
+    fmt = batch.detect_format(upload.filename, request.form.get('format'))
+    if fmt is None:
+        abort(400, description='Cases must be a .csv or .jsonl file.')
+    try:
+        mapping = json.loads(request.form.get('columns') or '{}')
+    except ValueError:
+        mapping = None
+    if not isinstance(mapping, dict):
+        abort(400, description='"columns" must be a JSON object.')
+    return upload, fmt, mapping
+
+
+def requested_error_mode():
+    """Return the 'on_error' form field ('skip' or 'reject'), or abort with 400."""
+    mode = request.form.get('on_error', 'skip')
+    if mode not in ('skip', 'reject'):
+        abort(400, description='"on_error" must be "skip" or "reject".')
+    return mode
+
+
+def reject_batch(errors):
+    """Abort with a 400 JSON report of the rows that failed validation."""
+    abort(make_response(jsonify(
+        error='The upload has invalid rows; nothing was generated.',
+        rows=[{'row': number, 'message': message} for number, message in sorted(errors, key=lambda e: e[0])]
+    ), 400))
+
+
+def read_valid_cases(output='docx'):
+    """Return (valid cases, errors) for a batch upload.
+
+    With on_error=skip the cases are validated lazily,
+    batch.VALIDATE_BLOCK rows at a time as the response streams, and
+    errors is complete only once they have been consumed. on_error=reject validates the whole upload
+    first and aborts with the report on any error. For PDF output, rows
+    with text the PDF fonts cannot draw count as invalid.
+    """
+    upload, fmt, mapping = read_batch_upload()
+    mode = requested_error_mode()
+    errors = []
+    block_size = None if mode == 'reject' else batch.VALIDATE_BLOCK
+    cases = batch.validate(batch.read_cases(upload.stream, fmt, mapping, errors), errors, block_size)
+    if output == 'pdf':
+        import form_pdf
+
+        cases = form_pdf.drawable_cases(cases, errors)
+    if mode == 'reject':
+        with metrics.time('mediation_generation_phase_seconds', phase='validate'):
+            cases = list(cases)
+        if errors:
+            reject_batch(errors)
+    return cases, errors
+
+
+@app.route('/bulk', methods=['POST'])
+def bulk():
+    """Fill one form per row of an uploaded CSV or JSONL file and stream back a ZIP.
+
+    Columns are matched to template fields by name; an optional 'columns'
+    form field holds a JSON {column: field} mapping for other headers.
+    Invalid rows are listed in errors.txt at the end of the archive, or
+    with on_error=reject the whole upload is validated first and the
+    request fails with a JSON report.
+    """
+    output = requested_output_format()
+    tenant, backend = requested_tenant(), requested_backend()
+    admit_batch()
+    cases, errors = read_valid_cases(output)
+    get_compiled_template(tenant, backend)
+
+    def generate():
+        recorder = batch_recorder('bulk', output, tenant, backend)
+
+        def listed():
+            for number, fields in cases:
+                if recorder is not None:
+                    recorder.add(fields, batch.entry_name(number, fields, output))
+                yield number, fields
+
+        entries = batch.iter_form_entries(
+            listed(), lambda fields: render_form(fields, output, False, tenant, backend, store=False), errors, output
+        )
+        yield from recorded(batch.iter_zip(entries), 'zip', recorder)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename=mediation_forms.zip'}
+    )
+
+
+@app.route('/merge', methods=['POST'])
+def merge():
+    """Fill one form per row of an uploaded CSV or JSONL file into a single .docx.
+
+    Each form starts on a new page; rows that were skipped are listed on a
+    final page. The document is streamed record by record. There is no
+    merged PDF, so ?format= other than docx is refused with 400.
+    """
+    requested_output_format(('docx',))
+    tenant, backend = requested_tenant(), requested_backend()
+    admit_batch()
+    cases, errors = read_valid_cases()
+    template = get_compiled_template(tenant, backend)
+    notes = []
+    recorder = batch_recorder('merge', 'docx', tenant, backend)
+
+    def records():
+        for _, fields in cases:
+            if recorder is not None:
+                recorder.add(fields)
+            yield fields
+        # Only now is every row validated; render_merged prints notes last.
+        if errors:
+            notes.append('Rows not included in this document:')
+            notes.extend(batch.error_report(errors).splitlines())
+
+    def generate():
+        with metrics.time('mediation_generation_phase_seconds', phase='merge'):
+            chunks = template.render_merged(records(), notes)
+            # The merged document holds every row's form, so no case keeps it as its file.
+            yield from recorded(chunks, None, recorder)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=DOCX_MIMETYPE,
+        headers={'Content-Disposition': 'attachment; filename=mediation_forms.docx'}
+    )
+
+
+def _job_or_404(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        abort(404)
+    job['status_url'] = url_for('job_status', job_id=job_id)
+    job['result_url'] = url_for('job_result', job_id=job_id)
+    return job
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Validate and queue a CSV or JSONL batch (same upload as /bulk) for the background runner.
+
+    Jobs produce .docx only; ?format= other than docx is refused with 400.
+    """
+    requested_output_format(('docx',))
+    upload, fmt, mapping = read_batch_upload()
+    tenant, backend = requested_tenant(), requested_backend()
+    try:
+        job_id = jobs.submit(
+            upload.stream, fmt, mapping, on_error=requested_error_mode(), tenant=tenant.id, backend=backend
+        )
+    except batch.BatchRejected as exc:
+        reject_batch(exc.errors)
+    job = _job_or_404(job_id)
+    return jsonify(job), 202, {'Location': job['status_url']}
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report a job's status, rows done out of total and estimated time left."""
+    return jsonify(_job_or_404(job_id))
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Send the ZIP of filled forms once the job is done (409 before, 410 once expired).
+
+    Range requests let clients resume large downloads.
+    """
+    job = _job_or_404(job_id)
+    if job['status'] != 'done':
+        return jsonify(job), 409
+    result = jobs.result_path(job_id)
+    if result is None:
+        abort(410, description='The result has expired; submit the batch again.')
+    path, digest = result
     return send_file(
-        file_stream,
+        path,
         as_attachment=True,
-        download_name='mediation_application_form.docx',
-        mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        download_name=f'mediation_forms_{job_id}.zip',
+        mimetype='application/zip',
+        etag=digest,
+        conditional=True
+    )
+
+
+def require_case_access():
+    """Abort unless the case store is on and the request carries its admin token.
+
+    Without CASES_TOKEN the routes do not exist (404); a missing or wrong
+    X-Cases-Token header gets a 403.
+    """
+    if not case_store.ENABLED or case_store.TOKEN is None:
+        abort(404)
+    token = request.headers.get('X-Cases-Token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), case_store.TOKEN.encode('utf-8')):
+        abort(403)
+
+
+def _case_json(case):
+    key = case.pop('key')
+    case['id'] = key
+    case['created'] = datetime.fromtimestamp(case['created'], timezone.utc).isoformat(timespec='seconds')
+    case['url'] = url_for('case_detail', key=key)
+    case['download_url'] = url_for('case_download', key=key) if case['artifact'] is not None else None
+    for name in ('artifact_ext', 'entry'):
+        del case[name]
+    return case
+
+
+@app.route('/cases')
+def case_search():
+    """Find generated forms by customer_name, client_name, mobile or q (words), newest first.
+
+    Names and numbers match whole values, or a prefix when they end in
+    '*'; since/until (ISO date or epoch seconds) bound the creation time.
+    The response links the next page while there may be more. Needs the
+    CASES_TOKEN admin token.
+    """
+    require_case_access()
+    args = request.args
+    try:
+        since, until = (case_store.parse_time(args[name]) if args.get(name) else None for name in ('since', 'until'))
+        limit = int(args.get('limit', 50))
+    except ValueError:
+        abort(400, description='since/until must be ISO dates or epoch seconds, limit an integer.')
+    try:
+        found = cases_db.search(
+            args.get('customer_name'), args.get('client_name'), args.get('mobile'), args.get('q'),
+            since=since, until=until, before=args.get('before') or None, limit=limit
+        )
+    except case_store.CaseQueryError as exc:
+        return jsonify(error='Invalid search.', problems=exc.problems), 400
+    body = {'cases': [_case_json(case) for case in found], 'next': None}
+    if len(found) == limit:
+        body['next'] = url_for('case_search', **{**args.to_dict(), 'before': body['cases'][-1]['id']})
+    return jsonify(body)
+
+
+@app.route('/cases/<key>')
+def case_detail(key):
+    """Return one recorded form: its fields, template version and artifact hash (admin token)."""
+    require_case_access()
+    case = cases_db.get(key)
+    if case is None:
+        abort(404)
+    return jsonify(_case_json(case))
+
+
+@app.route('/cases/<key>/download')
+def case_download(key):
+    """Send a recorded form again, exactly as it was generated (admin token; 410 once evicted).
+
+    Forms from /bulk and jobs are read out of the archived ZIP they were
+    sent in. Forms from /merge have no file of their own (404).
+    """
+    require_case_access()
+    case = cases_db.get(key)
+    if case is None:
+        abort(404)
+    if case['artifact'] is None:
+        abort(404, description='This form was sent inside a merged document, which is not kept per case.')
+    path = cases_db.artifact_path(case)
+    if path is None:
+        abort(410, description='The stored file has expired; generate the form again.')
+    if case['entry'] is None:
+        return send_file(path, as_attachment=True, download_name=f'mediation_application_form.{case["format"]}',
+                         mimetype=OUTPUT_FORMATS[case['format']], etag=case['artifact'], conditional=True)
+    with zipfile.ZipFile(path) as archive:
+        data = archive.read(case['entry'])
+    return send_file(BytesIO(data), as_attachment=True, download_name=case['entry'],
+                     mimetype=OUTPUT_FORMATS[case['format']], etag=f'{case["artifact"]}-{key}')
+
+
+# Worker processes for /extract, per gunicorn worker; spawned rather than
+# forked, since the server process has threads running.
+EXTRACT_PROCESSES = int(os.environ.get('EXTRACT_PROCESSES', 2))
+_extract_pool = None
+_extract_pool_pid = None
+_extract_pool_lock = threading.Lock()
+
+
+def extract_pool():
+    """Return this process's extraction pool, started on first use; None when EXTRACT_PROCESSES < 2."""
+    global _extract_pool, _extract_pool_pid
+    if EXTRACT_PROCESSES < 2:
+        return None
+    with _extract_pool_lock:
+        if _extract_pool_pid != os.getpid():
+            _extract_pool = multiprocessing.get_context('spawn').Pool(EXTRACT_PROCESSES)
+            _extract_pool_pid = os.getpid()
+        return _extract_pool
+
+
+@app.route('/extract', methods=['POST'])
+def extract():
+    """Read the field values back out of returned, filled forms and stream them as JSONL.
+
+    Upload any number of .docx files, or .zip archives of them, as "file"
+    fields. Each form becomes one line, in upload order (see form_extract);
+    one that cannot be read becomes a line with an "error".
+    """
+    uploads = request.files.getlist('file')
+    if not uploads:
+        abort(400, description='Upload the filled forms as "file" fields (.docx, or .zip archives of them).')
+    for upload in uploads:
+        if not (upload.filename or '').lower().endswith(('.docx', '.zip')):
+            abort(400, description=f'"{upload.filename}" is not a .docx or .zip file.')
+    directory = tempfile.mkdtemp(prefix='extract-')
+    try:
+        tasks = []
+        for index, upload in enumerate(uploads):
+            path = os.path.join(directory, f'{index:06d}{os.path.splitext(upload.filename)[1].lower()}')
+            upload.save(path)
+            tasks.extend(form_extract.iter_sources(path, upload.filename))
+    except zipfile.BadZipFile:
+        shutil.rmtree(directory, ignore_errors=True)
+        abort(400, description='An uploaded .zip file is not a readable archive.')
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    # A handful of forms is quicker read here than shipped to the pool.
+    pool = extract_pool() if len(tasks) > form_extract.CHUNK_SIZE else None
+
+    def generate():
+        try:
+            for record in form_extract.extract_all(tasks, pool):
+                metrics.inc('mediation_extracted_forms_total', result='error' if 'error' in record else 'ok')
+                yield json.dumps(record, ensure_ascii=False) + '\n'
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=extracted_forms.jsonl'}
     )
 
 
-@app.route('/preview')
+@app.route('/preview', methods=['GET', 'POST'])
 def preview():
-    """Show a preview of the form structure."""
-    return render_template('preview.html')
+    """Preview the form as HTML, laid out from the document it is generated as.
+
+    GET shows the blank form page with its template fields highlighted.
+    POST takes a JSON object of field values (as for /render) and returns
+    just the filled form's HTML fragment, for live previews while a form
+    is being typed. The ETag is the cache key: GET revalidates with a 304,
+    and a live preview can skip redrawing when it has not changed.
+    """
+    tenant, backend = requested_tenant(), requested_backend()
+    if request.method == 'GET':
+        html, key = render_preview(tenant=tenant, backend=backend)
+        response = make_response(render_template('preview.html', form=html.decode('utf-8')))
+    else:
+        fields = request.get_json(silent=True)
+        if not isinstance(fields, dict):
+            abort(400, description='Expected a JSON object of field values.')
+        try:
+            party_lists(fields)
+        except ValueError as exc:
+            abort(400, description=str(exc))
+        html, key = render_preview(fields, tenant, backend)
+        response = make_response(html)
+        response.mimetype = 'text/html'
+    response.set_etag(key)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once the generator is warmed up, 503 until then.
+
+    A worker that was not warmed up in the master starts warming up in the
+    background on the first probe.
+    """
+    if _ready.is_set():
+        return jsonify(status='ready', **STARTUP)
+    if not _warm_up_lock.locked():
+        threading.Thread(target=warm_up, daemon=True).start()
+    return jsonify(status='warming', **STARTUP), 503
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose request, generation and cache metrics in Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+STARTUP['import_seconds'] = round(time.perf_counter() - STARTED_AT, 4)
 
 
 if __name__ == '__main__':
+    warm_up()
     app.run(debug=True)
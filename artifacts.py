@@ -0,0 +1,186 @@
+"""
+Content-addressed artifact files served straight from disk.
+
+Generated documents are written once to ARTIFACT_DIR under the sha256 of
+their content, so responses can hand send_file() a path: werkzeug wraps
+it in wsgi.file_wrapper and gunicorn sends it with sendfile(), without
+the bytes passing through Python. Large outputs are spooled to a
+temporary file in the same directory while they are generated and
+renamed into place when complete, so worker memory stays flat however
+big they are.
+
+Retention: files not used for ARTIFACT_MAX_AGE seconds are deleted, and
+when the directory grows past ARTIFACT_MAX_BYTES the least recently used
+files go first. Every process that writes artifacts enforces the policy.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts')
+# Leftover temporary files older than this belonged to a writer that died.
+STALE_TEMP_AGE = 3600
+SWEEP_INTERVAL = 300
+
+
+class ArtifactStore:
+    """Directory of immutable files named by content hash, with LRU and age limits."""
+
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3, max_age=7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._bytes = None
+        self._swept = 0.0
+        self.stats = {'writes': 0, 'evictions': 0}
+
+    def path(self, digest, extension):
+        return os.path.join(self.directory, digest[:2], f'{digest}.{extension}')
+
+    def get(self, digest, extension):
+        """Return the path of a stored artifact and mark it used, or None if it is gone."""
+        path = self.path(digest, extension)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, data, extension, digest=None):
+        """Store bytes (digest is their sha256 if already known); return (path, digest)."""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        path = self.get(digest, extension)
+        if path is None:
+            path = self.put_chunks([data], extension)[0]
+        return path, digest
+
+    def put_chunks(self, chunks, extension):
+        """Spool an iterable of bytes to disk and store it; return (path, digest)."""
+        stored = []
+        for _ in self.iter_put(chunks, extension, lambda path, digest: stored.append((path, digest))):
+            pass
+        return stored[0]
+
+    def iter_put(self, chunks, extension, on_stored):
+        """Yield chunks unchanged while spooling them to disk; call on_stored(path, digest) once stored.
+
+        Nothing is stored if the consumer stops early, e.g. a client that
+        disconnects halfway through a streamed download.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+                    yield chunk
+            digest = digest.hexdigest()
+            path = self.path(digest, extension)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            _unlink(tmp_path)
+            raise
+        self._added(size)
+        on_stored(path, digest)
+
+    def put_file(self, source, extension, digest):
+        """Store a copy of the file at source, whose sha256 is digest; return its path.
+
+        The copy is a hard link when both are on the same filesystem.
+        """
+        path = self.get(digest, extension)
+        if path is not None:
+            return path
+        path = self.path(digest, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = os.path.join(self.directory, f'.tmp-{digest}-{os.getpid()}-{threading.get_ident()}')
+        try:
+            try:
+                os.link(source, tmp_path)
+            except OSError:
+                shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            _unlink(tmp_path)
+            raise
+        os.utime(path)
+        self._added(os.path.getsize(path))
+        return path
+
+    def _added(self, size):
+        """Account for a newly stored file and sweep if the policy is due."""
+        with self._lock:
+            self.stats['writes'] += 1
+            if self._bytes is not None:
+                self._bytes += size
+            due = (self._bytes is None or self._bytes > self.max_bytes
+                   or time.monotonic() - self._swept > SWEEP_INTERVAL)
+        if due:
+            self.sweep()
+
+    def _scan(self):
+        """Return [(last used, size, path)] for stored files, removing stale temporaries."""
+        files = []
+        now = time.time()
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                used = max(st.st_atime, st.st_mtime)
+                if name.startswith('.tmp-'):
+                    if now - used > STALE_TEMP_AGE:
+                        _unlink(path)
+                    continue
+                files.append((used, st.st_size, path))
+        return files
+
+    def sweep(self):
+        """Apply the retention policy: drop expired files, then LRU files over the size limit.
+
+        Files already removed by another process are skipped. A file that is
+        still being sent keeps streaming, since its descriptor stays open.
+        """
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        expire_before = time.time() - self.max_age
+        # Once over the limit, trim to 90% so the next few writes do not sweep again.
+        target = self.max_bytes * 0.9 if total > self.max_bytes else self.max_bytes
+        evicted = 0
+        for used, size, path in files:
+            if used >= expire_before and total <= target:
+                break
+            if _unlink(path):
+                total -= size
+                evicted += 1
+        with self._lock:
+            self._bytes = total
+            self._swept = time.monotonic()
+            self.stats['evictions'] += evicted
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        return False
+    return True
+
+
+store = ArtifactStore(
+    ARTIFACT_DIR,
+    max_bytes=int(os.environ.get('ARTIFACT_MAX_BYTES', 2 * 1024 ** 3)),
+    max_age=float(os.environ.get('ARTIFACT_MAX_AGE', 7 * 24 * 3600)),
+)
@@ -0,0 +1,223 @@
+"""
+Batch helpers for generating many filled forms from one upload.
+
+Cases are read row by row from a CSV or JSONL stream and the filled
+documents are written into a ZIP archive that is yielded entry by entry,
+so neither the upload nor the archive has to be held in memory.
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import time
+import zipfile
+from collections import deque
+
+from form_template import party_lists
+from schema import validate_cases
+
+# Rows validated together as cases stream in: few enough that the first
+# form of a streamed /bulk or /merge goes out quickly, and memory stays
+# bounded for very large inputs.
+VALIDATE_BLOCK = 500
+
+CASE_FORMATS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+
+
+def detect_format(filename, requested=None):
+    """Return 'csv' or 'jsonl' from an explicit format or the file extension."""
+    if requested:
+        requested = requested.lower()
+        return requested if requested in ('csv', 'jsonl') else None
+    for extension, fmt in CASE_FORMATS.items():
+        if (filename or '').lower().endswith(extension):
+            return fmt
+    return None
+
+
+def normalize_column(name):
+    """Turn a column header like 'Customer Name' into a field name like 'customer_name'."""
+    return re.sub(r'[^a-z0-9]+', '_', str(name).strip().lower()).strip('_')
+
+
+def map_columns(row, mapping=None):
+    """Map an input row onto template field names.
+
+    mapping is an optional {column: field} dict for headers that do not
+    normalize to a field name on their own.
+    """
+    mapping = mapping or {}
+    fields = {}
+    for column, value in row.items():
+        if column is None:
+            continue
+        fields[mapping.get(column) or normalize_column(column)] = value
+    return fields
+
+
+def read_cases(stream, fmt, mapping=None, errors=None):
+    """Yield (row_number, fields) from a binary CSV or JSONL stream.
+
+    Rows that cannot be parsed, or whose party lists are malformed, are
+    skipped and reported as (row_number, message) in the errors list, when
+    one is given.
+    """
+    for number, fields in _read_rows(stream, fmt, mapping, errors):
+        try:
+            party_lists(fields)
+        except ValueError as exc:
+            if errors is not None:
+                errors.append((number, str(exc)))
+            continue
+        yield number, fields
+
+
+def _read_rows(stream, fmt, mapping, errors):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, map_columns(row, mapping)
+        return
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row, message = None, f'invalid JSON: {exc}'
+        else:
+            message = 'expected a JSON object'
+        if not isinstance(row, dict):
+            if errors is not None:
+                errors.append((number, message))
+            continue
+        yield number, map_columns(row, mapping)
+
+
+class BatchRejected(ValueError):
+    """Raised when a batch submitted with on_error='reject' has invalid rows."""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} problem(s) in the uploaded rows')
+        self.errors = errors
+
+
+def validate(cases, errors, block_size=None):
+    """Yield the cases that pass the field schema, normalized.
+
+    Rows are checked block_size at a time (the whole batch by default)
+    and failures are appended to errors as (row_number, message).
+    """
+    block = []
+    for case in cases:
+        block.append(case)
+        if block_size and len(block) >= block_size:
+            valid, report = validate_cases(block)
+            errors.extend(report)
+            yield from valid
+            block = []
+    valid, report = validate_cases(block)
+    errors.extend(report)
+    yield from valid
+
+
+def error_report(errors):
+    """Return the errors.txt text for (row_number, message) pairs, in row order."""
+    return ''.join(f'row {number}: {message}\n' for number, message in sorted(errors, key=lambda e: e[0]))
+
+
+def entry_name(number, fields, extension='docx'):
+    """Return the archive member name for a filled form, named after the (first) defendant."""
+    name = fields.get('customer_name')
+    defendants = fields.get('defendants')
+    if not name and isinstance(defendants, list) and defendants and isinstance(defendants[0], dict):
+        name = defendants[0].get('customer_name')
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', str(name or '')).strip('_')[:40]
+    return f'{number:06d}_{slug}.{extension}' if slug else f'{number:06d}.{extension}'
+
+
+def iter_form_entries(cases, render, errors=None, extension='docx'):
+    """Yield (name, bytes) archive entries for cases, plus errors.txt if any rows failed."""
+    for number, fields in cases:
+        yield entry_name(number, fields, extension), render(fields)
+    if errors:
+        yield 'errors.txt', error_report(errors).encode('utf-8')
+
+
+def chunked(cases, size):
+    """Yield lists of up to size cases."""
+    chunk = []
+    for case in cases:
+        chunk.append(case)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_chunks(pool, func, tasks, processes, on_done):
+    """Run func(task) for every task on a process pool, passing each result to on_done in task order."""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        # Keep only a couple of chunks per process in flight so huge
+        # inputs are never read into memory all at once.
+        if len(pending) >= processes * 2:
+            on_done(pending.popleft().get())
+    while pending:
+        on_done(pending.popleft().get())
+
+
+class _StreamSink:
+    """Write-only file object that collects what ZipFile writes until drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries):
+    """Yield a ZIP archive of (name, bytes) entries, one chunk per entry.
+
+    Entries are stored rather than deflated since .docx files are already
+    compressed. The sink is not seekable, so ZipFile writes data
+    descriptors and the central directory goes out with the last chunk.
+    """
+    sink = _StreamSink()
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            archive.writestr(zipfile.ZipInfo(name, date_time=date_time), data)
+            yield sink.drain()
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def write_part(path, rows, render, extension='docx'):
+    """Write the filled forms of (number, fields) rows to path as a ZIP, renamed into place once complete."""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for chunk in iter_zip(iter_form_entries(rows, render, extension=extension)):
+            f.write(chunk)
+    os.replace(tmp_path, path)
@@ -0,0 +1,109 @@
+"""
+Shared helpers for the benchmark scripts: timing statistics, JSON result
+files and comparison against a baseline run.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values using linear interpolation."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def time_calls(func, repeat):
+    """Return the durations in seconds of repeat calls of func()."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize_ms(seconds):
+    """Summarize a list of durations in seconds as milliseconds."""
+    ms = [s * 1000 for s in seconds]
+    return {
+        'count': len(ms),
+        'min_ms': round(min(ms), 3),
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(kind, results, output=None):
+    """Write results with run metadata as JSON and return the path written."""
+    payload = {
+        'kind': kind,
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if output is None:
+        directory = os.path.join(ROOT, 'benchmarks', 'results')
+        os.makedirs(directory, exist_ok=True)
+        output = os.path.join(directory, f'{kind}-{payload["commit"] or "local"}-{int(time.time())}.json')
+    with open(output, 'w') as f:
+        json.dump(payload, f, indent=2)
+    return output
+
+
+def _flatten(results, prefix=''):
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{name}.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(baseline_path, results, threshold=0.10):
+    """Print metrics that regressed against a baseline file and return their count.
+
+    Timing (*_ms) and size (*_bytes) metrics regress when they grow;
+    throughput (*rps) regresses when it shrinks.
+    """
+    with open(baseline_path) as f:
+        baseline = dict(_flatten(json.load(f)['results']))
+    regressions = 0
+    for name, value in _flatten(results):
+        old = baseline.get(name)
+        if not old or not name.endswith(('_ms', '_bytes', 'rps')):
+            continue
+        change = (value - old) / old
+        worse = -change if name.endswith('rps') else change
+        if worse > threshold:
+            regressions += 1
+            print(f'REGRESSION {name}: {old} -> {value} ({change:+.1%})')
+    return regressions
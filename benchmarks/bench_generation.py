@@ -0,0 +1,97 @@
+"""
+Micro-benchmarks for Form A generation.
+
+Measures python-docx build time, doc.save time, the form_xml backend, the
+precompiled /render path, peak traced memory and output sizes, and writes
+them as JSON.
+
+Usage:
+    python benchmarks/bench_generation.py [--repeat 50] [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+import zipfile
+from io import BytesIO
+
+from _common import compare, summarize_ms, time_calls, write_results
+
+import app
+import form_generator
+import form_xml
+
+SAMPLE_FIELDS = {
+    'client_name': 'ABC Finance Ltd',
+    'branch_address': '12 MG Road, Fort, Mumbai 400001',
+    'mobile': '9876543210',
+    'customer_name': 'Ramesh Kumar',
+    'address1': 'Flat 4, Sunrise Apartments, Andheri East, Mumbai 400069',
+}
+
+
+def peak_memory(func):
+    """Return the peak traced allocation size in bytes for one call."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(repeat):
+    # Warm imports and caches so the first sample is not an outlier.
+    form_generator.create_mediation_form()
+    template = app.get_compiled_template()
+
+    docs = [form_generator.build_document() for _ in range(repeat)]
+    save_times = []
+    for doc in docs:
+        stream = BytesIO()
+        start = time.perf_counter()
+        doc.save(stream)
+        save_times.append(time.perf_counter() - start)
+
+    output = form_generator.create_mediation_form().getvalue()
+    with zipfile.ZipFile(BytesIO(output)) as package:
+        document_xml = package.read('word/document.xml')
+
+    return {
+        'build_document': summarize_ms(time_calls(form_generator.build_document, repeat)),
+        'doc_save': summarize_ms(save_times),
+        'create_mediation_form': summarize_ms(time_calls(form_generator.create_mediation_form, repeat)),
+        'create_mediation_form_xml': summarize_ms(time_calls(form_xml.create_mediation_form, repeat * 20)),
+        'render_xml': summarize_ms(time_calls(lambda: template.render_xml(SAMPLE_FIELDS), repeat * 20)),
+        'render_docx': summarize_ms(time_calls(lambda: template.render(SAMPLE_FIELDS), repeat)),
+        'memory': {
+            'create_mediation_form_peak_bytes': peak_memory(form_generator.create_mediation_form),
+            'create_mediation_form_xml_peak_bytes': peak_memory(form_xml.create_mediation_form),
+            'render_docx_peak_bytes': peak_memory(lambda: template.render(SAMPLE_FIELDS)),
+        },
+        'size': {
+            'docx_bytes': len(output),
+            'document_xml_bytes': len(document_xml),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50, help='samples per timed benchmark')
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/)')
+    parser.add_argument('--baseline', help='earlier results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown before flagging')
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    for name, stats in results.items():
+        print(f'{name:24} {stats}')
+    print(f'Results written to {write_results("generation", results, args.output)}')
+    if args.baseline and compare(args.baseline, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Scaling benchmark for repeated applicant and defendant blocks.
+
+Times the python-docx layout (build_document plus save) and the
+precompiled /render path for growing numbers of parties, and reports the
+time per party so a non-linear step stands out.
+
+Usage:
+    python benchmarks/bench_parties.py [--parties 1 10 100 1000 5000] [--repeat 3]
+                                       [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import sys
+from io import BytesIO
+
+from _common import compare, summarize_ms, time_calls, write_results
+
+import app
+import form_generator
+
+
+def parties(count):
+    return [
+        {'customer_name': f'Defendant {i}', 'address1': f'{i} Station Road, Mumbai 4000{i % 100:02d}'}
+        for i in range(1, count + 1)
+    ]
+
+
+def generate(count):
+    doc = form_generator.build_document(applicants=1, defendants=count)
+    doc.save(BytesIO())
+
+
+def run(counts, repeat):
+    form_generator.create_mediation_form()
+    template = app.get_compiled_template()
+    results = {}
+    for count in counts:
+        fields = {'client_name': 'ABC Finance Ltd', 'defendants': parties(count)}
+        generator = summarize_ms(time_calls(lambda: generate(count), repeat))
+        render = summarize_ms(time_calls(lambda: template.render(fields), repeat))
+        results[f'parties_{count}'] = {
+            'generator': generator,
+            'render_docx': render,
+            'generator_per_party_ms': round(generator['p50_ms'] / count, 4),
+            'render_per_party_ms': round(render['p50_ms'] / count, 4),
+            'render_docx_bytes': len(template.render(fields)),
+        }
+        print(f'{count:>6} parties  generator {generator["p50_ms"]:>9.1f} ms  render {render["p50_ms"]:>8.2f} ms')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--parties', type=int, nargs='+', default=[1, 10, 100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=3, help='samples per party count')
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/)')
+    parser.add_argument('--baseline', help='earlier results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown before flagging')
+    args = parser.parse_args()
+
+    results = run(args.parties, args.repeat)
+    print(f'Results written to {write_results("parties", results, args.output)}')
+    if args.baseline and compare(args.baseline, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Startup-time measurement for gunicorn, with and without preload/warm-up.
+
+For each mode, starts gunicorn, measures the time until it answers (the
+cold mode on /, since probing /ready would warm it up; the preload mode on
+/ready) and the latency of the first /download requests, and writes the
+results as JSON.
+
+Usage:
+    python benchmarks/bench_startup.py [--workers 2] [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import http.client
+
+from _common import ROOT, compare, write_results
+from load_test import free_port, request
+
+# An empty config file stands in for gunicorn.conf.py: no preload, no warm-up.
+EMPTY_CONFIG = os.path.join(tempfile.gettempdir(), 'mediation_empty_gunicorn.conf.py')
+
+MODES = {
+    'cold': (['--config', EMPTY_CONFIG], '/'),
+    'preload': (['--config', os.path.join(ROOT, 'gunicorn.conf.py')], '/ready'),
+}
+
+
+def wait_ready(port, process, path, timeout=60):
+    """Poll path until it returns 200 and return its body."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {process.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            conn.request('GET', path)
+            response = conn.getresponse()
+            body = response.read()
+            conn.close()
+            if response.status == 200:
+                return body
+        except OSError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError('gunicorn did not become ready in time')
+
+
+def measure(mode, workers):
+    config_args, probe = MODES[mode]
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--log-level', 'warning', *config_args],
+        cwd=ROOT,
+    )
+    try:
+        wait_ready(port, process, probe)
+        ready_ms = (time.perf_counter() - started) * 1000
+        first_downloads = []
+        for _ in range(workers * 2):
+            start = time.perf_counter()
+            request('127.0.0.1', port, '/download')
+            first_downloads.append(round((time.perf_counter() - start) * 1000, 3))
+        startup = json.loads(wait_ready(port, process, '/ready'))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {
+        'time_to_ready_ms': round(ready_ms, 3),
+        'first_download_max_ms': max(first_downloads),
+        'first_downloads': first_downloads,
+        'app_startup': startup,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/)')
+    parser.add_argument('--baseline', help='earlier results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown before flagging')
+    args = parser.parse_args()
+
+    open(EMPTY_CONFIG, 'w').close()
+    results = {}
+    for mode in MODES:
+        results[mode] = measure(mode, args.workers)
+        print(f'{mode:8} {results[mode]}')
+    print(f'Results written to {write_results("startup", results, args.output)}')
+    if args.baseline and compare(args.baseline, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Load test for the Flask routes through a locally started gunicorn.
+
+Starts `gunicorn app:app` on a free local port, drives each route with
+a pool of client threads at several concurrency levels, and reports
+p50/p95/p99 latency and requests/second as JSON.
+
+Usage:
+    python benchmarks/load_test.py [--workers 2] [--concurrency 1 4 16]
+                                   [--duration 5] [--paths / /preview /download]
+                                   [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import http.client
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from _common import ROOT, compare, summarize_ms, write_results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(port, workers, extra_args=()):
+    """Start gunicorn in the repo root and wait until it answers on /."""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--log-level', 'warning', *extra_args],
+        cwd=ROOT,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {process.returncode}')
+        try:
+            status, _ = request('127.0.0.1', port, '/')
+            if status == 200:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('gunicorn did not become ready within 30s')
+
+
+def request(host, port, path):
+    """Issue one GET and return (status, body length)."""
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, len(response.read())
+    finally:
+        conn.close()
+
+
+def drive(port, path, concurrency, duration):
+    """Run concurrency client threads against path for duration seconds."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        local, failed = [], 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                status, _ = request('127.0.0.1', port, path)
+            except OSError:
+                failed += 1
+                continue
+            if status >= 400:
+                failed += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stats = summarize_ms(latencies) if latencies else {'count': 0}
+    stats['errors'] = errors[0]
+    stats['rps'] = round(len(latencies) / elapsed, 1)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per route and level')
+    parser.add_argument('--paths', nargs='+', default=['/', '/preview', '/download'])
+    parser.add_argument('--gunicorn-arg', action='append', default=[], dest='gunicorn_args',
+                        help='extra argument passed to gunicorn (repeatable)')
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/)')
+    parser.add_argument('--baseline', help='earlier results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown before flagging')
+    args = parser.parse_args()
+
+    port = free_port()
+    process = start_gunicorn(port, args.workers, args.gunicorn_args)
+    results = {'workers': args.workers}
+    try:
+        for path in args.paths:
+            request('127.0.0.1', port, path)  # warm every worker's first request path
+            for concurrency in args.concurrency:
+                stats = drive(port, path, concurrency, args.duration)
+                results.setdefault(path, {})[f'c{concurrency}'] = stats
+                print(f'{path:12} c={concurrency:<3} {stats}')
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    print(f'Results written to {write_results("load", results, args.output)}')
+    if args.baseline and compare(args.baseline, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
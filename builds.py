@@ -0,0 +1,197 @@
+"""
+Blank forms and compiled templates, built once per tenant and cached.
+
+The layout plan, the tenant profiles and the template version live here,
+free of any web code, so the Flask app, the job runner and the command
+line share one build cache (and forked worker processes inherit it).
+Builds are keyed by template version and tenant, and only the
+TENANT_CACHE_SIZE most recently used tenants keep theirs.
+"""
+
+import hashlib
+import importlib.metadata
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import batch
+import form_layout
+import tenants
+from form_template import CompiledTemplate
+from metrics import registry as metrics
+
+# Layout backends: python-docx (form_generator.py) or raw WordprocessingML (form_xml.py).
+BACKENDS = ('docx', 'xml')
+DEFAULT_BACKEND = os.environ.get('FORM_BACKEND', 'docx')
+if DEFAULT_BACKEND not in BACKENDS:
+    raise ValueError(f'FORM_BACKEND must be one of {", ".join(BACKENDS)}')
+
+
+# Compiled once at startup; a malformed layout spec stops the app like a malformed template.
+LAYOUT = form_layout.load_plan()
+
+
+# Modules whose code decides the bytes of a built or rendered form.
+RENDER_MODULES = (
+    'form_layout', 'form_generator', 'form_xml', 'form_template', 'docx_package', 'form_pdf', 'form_html',
+)
+
+
+def template_version():
+    """Return a short hash of the layout spec, the code that turns it into output and the python-docx version.
+
+    Built and rendered bytes only change when the layout spec, the
+    backends that lay it out (or the library they use), the template
+    renderer, the packager or the PDF and HTML writers change, so the hash
+    is used in the cache key for built bytes, for results in the (possibly
+    deploy-surviving) disk cache and for preview ETags. The sources are
+    read without importing them, to keep python-docx out of startup until
+    a document is actually needed.
+    """
+    digest = hashlib.sha256(importlib.metadata.version('python-docx').encode())
+    digest.update(LAYOUT.spec_hash.encode())
+    for module in RENDER_MODULES:
+        with open(importlib.util.find_spec(module).origin, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+TEMPLATE_VERSION = template_version()
+
+
+def template_key(tenant, backend):
+    """Return the version string of a tenant's template on a backend (cache keys, case records)."""
+    return f'{TEMPLATE_VERSION}-{tenant.version}-{backend}'
+
+
+# Read once at startup; a malformed profile stops the app like a malformed template.
+TENANTS = tenants.load_tenants()
+DEFAULT_TENANT = TENANTS[tenants.DEFAULT_ID]
+TENANT_CACHE_SIZE = int(os.environ.get('TENANT_CACHE_SIZE', 8))
+
+_build_lock = threading.RLock()
+# (tenant id, tenant version) -> {name: built value}, least recently used first.
+_built = OrderedDict()
+
+
+def build_once(name, factory, tenant=None):
+    """Return factory(), built at most once per template version and tenant.
+
+    Builds are grouped per tenant, and only the TENANT_CACHE_SIZE most
+    recently used tenants keep theirs; the default tenant is never evicted.
+    """
+    tenant = tenant or DEFAULT_TENANT
+    key = (tenant.id, tenant.version)
+    builds = _built.get(key)
+    if builds is not None and name in builds:
+        metrics.inc('mediation_cache_requests_total', cache=name, result='hit')
+        try:
+            _built.move_to_end(key)
+        except KeyError:  # evicted by another thread meanwhile
+            pass
+        return builds[name]
+    with _build_lock:
+        builds = _built.get(key)
+        if builds is None:
+            builds = _built[key] = {}
+            _evict_tenants(keep=key)
+        else:
+            _built.move_to_end(key)
+        if name not in builds:
+            metrics.inc('mediation_cache_requests_total', cache=name, result='miss')
+            builds[name] = factory()
+        return builds[name]
+
+
+def _evict_tenants(keep):
+    """Drop the least recently used tenants' builds beyond TENANT_CACHE_SIZE (lock held)."""
+    for key in list(_built):
+        if len(_built) <= max(TENANT_CACHE_SIZE, 1):
+            break
+        if key != keep and key[0] != tenants.DEFAULT_ID:
+            del _built[key]
+    metrics.set('mediation_tenant_templates_cached', len(_built))
+
+
+def _build_name(name, backend):
+    return name if backend == 'docx' else f'{name}_{backend}'
+
+
+def _build_blank_form(tenant, backend):
+    if backend == 'xml':
+        import form_xml
+
+        with metrics.time('mediation_generation_phase_seconds', phase='build'):
+            data = form_xml.build_docx(tenant=tenant, plan=LAYOUT)
+        return data, hashlib.sha256(data).hexdigest()
+
+    import form_generator
+
+    with metrics.time('mediation_generation_phase_seconds', phase='build'):
+        doc = form_generator.build_document(tenant=tenant, plan=LAYOUT)
+    stream = BytesIO()
+    with metrics.time('mediation_generation_phase_seconds', phase='save'):
+        doc.save(stream)
+    data = stream.getvalue()
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def get_blank_form(tenant=None, backend=None):
+    """Return (bytes, etag) of a tenant's blank form, building it once per template version."""
+    tenant, backend = tenant or DEFAULT_TENANT, backend or DEFAULT_BACKEND
+    return build_once(_build_name('blank_form', backend), lambda: _build_blank_form(tenant, backend), tenant)
+
+
+def get_compiled_template(tenant=None, backend=None):
+    """Return a tenant's blank form precompiled for placeholder substitution."""
+    tenant, backend = tenant or DEFAULT_TENANT, backend or DEFAULT_BACKEND
+    return build_once(
+        _build_name('compiled_template', backend),
+        lambda: CompiledTemplate(get_blank_form(tenant, backend)[0]),
+        tenant
+    )
+
+
+def _build_blank_pdf(tenant, backend):
+    import form_pdf
+
+    data = form_pdf.document_to_pdf(get_compiled_template(tenant, backend).render_xml({}))
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def get_blank_pdf(tenant=None, backend=None):
+    """Return (bytes, etag) of a tenant's blank form as PDF."""
+    tenant, backend = tenant or DEFAULT_TENANT, backend or DEFAULT_BACKEND
+    return build_once(_build_name('blank_pdf', backend), lambda: _build_blank_pdf(tenant, backend), tenant)
+
+
+def built(name, tenant=None, backend=None):
+    """Return True if build_once(name, ...) has already run for this template version, tenant and backend."""
+    tenant, backend = tenant or DEFAULT_TENANT, backend or DEFAULT_BACKEND
+    return _build_name(name, backend) in _built.get((tenant.id, tenant.version), ())
+
+
+def render_document(template, fields, fmt='docx'):
+    """Return .docx or PDF bytes of template filled with fields."""
+    if fmt == 'pdf':
+        import form_pdf
+
+        return form_pdf.document_to_pdf(template.render_xml(fields))
+    return template.render(fields)
+
+
+def render_part(task):
+    """Write one chunk of rows as a part ZIP of filled forms and return its row count.
+
+    task is (path, rows, tenant id, backend, output format). This is the
+    pool task of both the job runner and the command line; the worker
+    builds the tenant's template once and keeps it in its build cache.
+    """
+    path, rows, tenant_id, backend, fmt = task
+    if tenant_id not in TENANTS:
+        raise ValueError(f'tenant "{tenant_id}" is no longer configured')
+    template = get_compiled_template(TENANTS[tenant_id], backend)
+    batch.write_part(path, rows, lambda fields: render_document(template, fields, fmt), fmt)
+    return len(rows)
@@ -0,0 +1,569 @@
+"""
+Indexed local store of every form the service has generated.
+
+When CASE_STORE=1, each filled form from /render, /bulk, /merge or a
+background job is recorded in CASES_DIR/cases.sqlite3 with its input fields, the template
+version it was built with and the sha256 of the file that was sent. That
+file is kept in CASES_DIR/artifacts/, an artifact store of its own with a
+much longer retention than the download cache, so a form can be sent
+again later exactly as it went out instead of being regenerated. Forms
+from a batch are not split out: they point at the ZIP they were sent in,
+plus their member name. Forms from /merge have no file of their own,
+since the merged document also holds other customers' forms.
+
+Records hold personal data, so recording is off by default and the web
+routes that read them need the CASES_TOKEN admin token. Cases are
+addressed by a random key, never by their row id.
+
+Lookups go through indexes rather than scans:
+
+- case_keys holds one (field, value, case id) row per customer_name,
+  client_name and mobile value, normalized (names casefolded with
+  whitespace collapsed, phone numbers reduced to their digits, plus their
+  last ten digits). It is a WITHOUT ROWID table keyed on all three
+  columns, so an exact or prefix lookup is a single index range read,
+  newest case first.
+- cases_fts is an FTS5 index of the same values, for "all of these words"
+  searches. It is contentless (the values are already in cases.fields),
+  which makes the store append-only.
+
+Case ids increase with time, so "newest first" is an index order and
+paging uses the last id seen. Inserts are batched: the web app queues
+records and a background thread writes up to BATCH_SIZE of them per
+transaction, streamed batch outputs are written block by block through a
+BatchRecorder while they stream, and jobs use record() directly.
+
+    python case_store.py --customer-name "Ravi Kumar"
+    python case_store.py --text "ravi 98200" --since 2026-09-01
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from artifacts import ArtifactStore
+from metrics import registry as metrics
+
+CASES_DIR = os.environ.get('CASES_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cases')
+# Set CASE_STORE=1 to record generated forms (off by default: records hold personal data).
+ENABLED = os.environ.get('CASE_STORE', '0').lower() in ('1', 'true', 'yes', 'on')
+# Admin token for the /cases routes (X-Cases-Token header); unset, the routes are disabled.
+TOKEN = os.environ.get('CASES_TOKEN') or None
+# Records written per transaction.
+BATCH_SIZE = 1000
+# Longest a queued record waits before the background writer commits it.
+FLUSH_INTERVAL = 0.5
+# Queued records kept for retry while the database cannot be written; beyond this the oldest are dropped.
+MAX_PENDING = 100000
+MAX_RESULTS = 500
+# A prefix matching more keys than this is searched newest case first instead of key by key.
+PREFIX_SCAN_LIMIT = 5000
+# Sorts after every string that starts with a given prefix.
+PREFIX_END = '\U0010ffff'
+# SQLite page cache per connection; keeps the index pages hot for large bulk inserts.
+CACHE_KIB = 64 * 1024
+# Fields that are indexed for lookup, and which party group holds them in multi-party forms.
+LOOKUP_FIELDS = {
+    'customer_name': 'defendants',
+    'client_name': 'applicants',
+    'mobile': 'applicants',
+}
+# Phone numbers are also indexed by their last digits, so a search without the country code matches.
+NATIONAL_DIGITS = 10
+NON_DIGITS_RE = re.compile(r'\D+')
+WORD_RE = re.compile(r'\w+')
+SURROGATES_RE = re.compile('[\ud800-\udfff]')
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    created REAL NOT NULL,
+    source TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    template_version TEXT NOT NULL,
+    format TEXT NOT NULL,
+    artifact TEXT,
+    artifact_ext TEXT,
+    entry TEXT,
+    fields TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS cases_key ON cases (key);
+CREATE INDEX IF NOT EXISTS cases_created ON cases (created);
+CREATE TABLE IF NOT EXISTS case_keys (
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    case_id INTEGER NOT NULL,
+    PRIMARY KEY (field, value, case_id)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS cases_fts USING fts5(
+    customer_name, client_name, mobile, content='', detail='none', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+
+class CaseQueryError(ValueError):
+    """Raised for search parameters that cannot be used; .problems lists them."""
+
+    def __init__(self, problems):
+        super().__init__('; '.join(problems))
+        self.problems = problems
+
+
+def normalize_name(value):
+    return ' '.join(str(value).split()).casefold()
+
+
+def normalize_mobile(value):
+    return NON_DIGITS_RE.sub('', str(value))
+
+
+NORMALIZERS = {
+    'customer_name': normalize_name,
+    'client_name': normalize_name,
+    'mobile': normalize_mobile,
+}
+
+
+def lookup_values(fields):
+    """Return {field: [raw values]} for the LOOKUP_FIELDS of a form, across all its parties."""
+    values = {}
+    for name, group in LOOKUP_FIELDS.items():
+        parties = fields.get(group)
+        if isinstance(parties, list) and parties:
+            found = [party.get(name) for party in parties if isinstance(party, dict)]
+        else:
+            found = [fields.get(name)]
+        values[name] = [str(value) for value in found if value not in (None, '')]
+    return values
+
+
+def national_key(name, key):
+    """Return the key an exact lookup uses: a phone number's last NATIONAL_DIGITS, any other key as is.
+
+    Every stored number is indexed under its last digits too (see
+    index_keys), so +919876543210 and 9876543210 find the same forms.
+    """
+    if name == 'mobile' and len(key) > NATIONAL_DIGITS:
+        return key[-NATIONAL_DIGITS:]
+    return key
+
+
+def index_keys(values):
+    """Return the distinct (field, normalized value) keys of a form's lookup values."""
+    keys = set()
+    for name, raw in values.items():
+        for value in raw:
+            key = NORMALIZERS[name](value)
+            if not key:
+                continue
+            keys.add((name, key))
+            keys.add((name, national_key(name, key)))
+    return keys
+
+
+def storable(value):
+    """Return value with lone surrogates removed from its strings; SQLite cannot store them."""
+    if isinstance(value, str):
+        return SURROGATES_RE.sub('', value)
+    if isinstance(value, dict):
+        return {storable(key): storable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [storable(item) for item in value]
+    return value
+
+
+def case_record(source, fields, fmt, artifact, artifact_ext, tenant='default', template_version='', entry=None):
+    """Return a record for record()/enqueue(): one generated form and where its file is (None if not kept)."""
+    fields = storable(fields)
+    return {
+        'source': source,
+        'tenant': tenant,
+        'template_version': template_version,
+        'format': fmt,
+        'artifact': artifact,
+        'artifact_ext': artifact_ext,
+        'entry': entry,
+        'fields': fields,
+    }
+
+
+def match_query(text):
+    """Return an FTS5 query matching every word of text as a prefix, or None if it has no words."""
+    words = WORD_RE.findall(text)
+    return ' '.join(f'"{word}"*' for word in words) or None
+
+
+def parse_time(value):
+    """Return epoch seconds for a number or an ISO 8601 date/time string."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class CaseStore:
+    """SQLite index of generated forms plus the archive of their files."""
+
+    def __init__(self, directory, archive):
+        self.directory = directory
+        self.archive = archive
+        self.path = os.path.join(directory, 'cases.sqlite3')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._wake = threading.Event()
+        self._writer_pid = None
+
+    def connect(self):
+        """Return this thread's connection, opening (and if needed creating) the database."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{CACHE_KIB}')
+        conn.executescript(SCHEMA)
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def keep(self, path, extension, digest):
+        """Copy a stored file into the case archive (a hard link where possible)."""
+        return self.archive.put_file(path, extension, digest)
+
+    def record(self, records):
+        """Insert records, BATCH_SIZE per transaction; return how many were written."""
+        conn = self.connect()
+        batch, written = [], 0
+        for record in records:
+            batch.append(record)
+            if len(batch) >= BATCH_SIZE:
+                self._insert(conn, batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            self._insert(conn, batch)
+            written += len(batch)
+        return written
+
+    def insert(self, records):
+        """Insert records in one transaction; return the id of the first (the rest follow it)."""
+        return self._insert(self.connect(), records)
+
+    def recorder(self, source, fmt, tenant, template_version, block_size=BATCH_SIZE):
+        """Return a BatchRecorder for the cases of one streamed batch output."""
+        return BatchRecorder(self, source, fmt, tenant, template_version, block_size)
+
+    def attach(self, ranges, artifact, extension):
+        """Point the cases in the (first id, last id) ranges at the file they were sent in."""
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('UPDATE cases SET artifact = ?, artifact_ext = ? WHERE id BETWEEN ? AND ?',
+                             [(artifact, extension, first, last) for first, last in ranges])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _insert(self, conn, records):
+        """Insert records in one transaction; return the id of the first (the rest follow it)."""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            next_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM cases').fetchone()[0]
+            # Stamped inside the write lock, so creation times grow with the ids.
+            created = time.time()
+            rows, keys, texts = [], [], []
+            for case_id, record in enumerate(records, start=next_id):
+                fields = record['fields']
+                values = lookup_values(fields)
+                rows.append((
+                    case_id, secrets.token_urlsafe(16), created, record['source'], record['tenant'], record['template_version'],
+                    record['format'], record['artifact'], record['artifact_ext'], record['entry'],
+                    json.dumps(fields, ensure_ascii=False, separators=(',', ':')),
+                ))
+                keys.extend((name, value, case_id) for name, value in index_keys(values))
+                texts.append((case_id, *(' '.join(values[name]) for name in LOOKUP_FIELDS)))
+            conn.executemany('INSERT INTO cases VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            conn.executemany('INSERT OR IGNORE INTO case_keys VALUES (?, ?, ?)', keys)
+            conn.executemany('INSERT INTO cases_fts (rowid, customer_name, client_name, mobile) VALUES (?, ?, ?, ?)',
+                             texts)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return next_id
+
+    def enqueue(self, record):
+        """Queue a record for the background writer, which commits within FLUSH_INTERVAL."""
+        self._ensure_writer()
+        with self._lock:
+            self._pending.append(record)
+            full = len(self._pending) >= BATCH_SIZE
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write every queued record now, BATCH_SIZE per transaction.
+
+        If a transaction fails, it and the records after it are queued
+        again for the next flush and the error is raised.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for start in range(0, len(pending), BATCH_SIZE):
+            try:
+                self._insert(self.connect(), pending[start:start + BATCH_SIZE])
+            except sqlite3.Error:
+                self._requeue(pending[start:])
+                raise
+
+    def _requeue(self, records):
+        """Put unwritten records back at the head of the queue, dropping the oldest past MAX_PENDING."""
+        with self._lock:
+            self._pending[:0] = records
+            dropped = max(len(self._pending) - MAX_PENDING, 0)
+            del self._pending[:dropped]
+        if dropped:
+            metrics.inc('mediation_cases_dropped_total', dropped)
+            log.error('Case store queue full: dropped %d unwritten case records', dropped)
+
+    def _ensure_writer(self):
+        """Start this process's writer thread; threads do not survive fork, so it is started lazily."""
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._pending = []
+            self._writer_pid = os.getpid()
+        threading.Thread(target=self._write_loop, name='case-store-writer', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                log.exception('Could not write case records to %s; %d queued for retry', self.path, len(self._pending))
+            except Exception:
+                # Anything else is a bad record, not a bad database: keep the writer alive for the rest.
+                log.exception('Could not write case records to %s', self.path)
+
+    def search(self, customer_name=None, client_name=None, mobile=None, text=None,
+               since=None, until=None, before=None, limit=50):
+        """Return the newest matching cases as dicts, newest first.
+
+        customer_name, client_name and mobile match whole values after
+        normalization, or a prefix when they end in '*'. text matches
+        forms whose names or numbers contain every word (as a prefix).
+        since/until bound the creation time (epoch seconds) and before
+        is the key of the last case of the previous page.
+
+        The most selective filter drives the query, read in case id order
+        so it stops after limit rows; the others are checked per row.
+        """
+        problems = []
+        exact, prefixes = [], []
+        for name, value in (('mobile', mobile), ('customer_name', customer_name), ('client_name', client_name)):
+            if value is None:
+                continue
+            key = NORMALIZERS[name](value.rstrip('*'))
+            if not key:
+                problems.append(f'{name} is empty')
+            elif value.endswith('*'):
+                prefixes.append((name, key))
+            else:
+                exact.append((name, national_key(name, key)))
+        query = None
+        if text is not None:
+            query = match_query(text)
+            if query is None:
+                problems.append('text has no words to search for')
+        if not 1 <= limit <= MAX_RESULTS:
+            problems.append(f'limit must be between 1 and {MAX_RESULTS}')
+        conn = self.connect()
+        high = 1 << 62
+        if before is not None:
+            row = conn.execute('SELECT id FROM cases WHERE key = ?', (before,)).fetchone()
+            if row is None:
+                problems.append('before is not a known case')
+            else:
+                high = row[0] - 1
+        if problems:
+            raise CaseQueryError(problems)
+
+        # Ids grow with creation time, so a time window is also a range of ids.
+        low = 1
+        if since is not None:
+            row = conn.execute('SELECT id FROM cases WHERE created >= ? ORDER BY created, id LIMIT 1',
+                               (since,)).fetchone()
+            if row is None:
+                return []
+            low = max(low, row[0])
+        if until is not None:
+            row = conn.execute('SELECT id FROM cases WHERE created < ? ORDER BY created DESC, id DESC LIMIT 1',
+                               (until,)).fetchone()
+            if row is None:
+                return []
+            high = min(high, row[0])
+        where, params = [], []
+        if exact and (exact[0][0] != 'client_name' or query is None):
+            name, key = exact.pop(0)
+            source, id_column = 'case_keys d JOIN cases c ON c.id = d.case_id', 'd.case_id'
+            where.append('d.field = ? AND d.value = ?')
+            params.extend((name, key))
+        elif query is not None:
+            source, id_column = 'cases_fts d JOIN cases c ON c.id = d.rowid', 'd.rowid'
+            where.append('cases_fts MATCH ?')
+            params.append(query)
+            query = None
+        elif prefixes and self._rare_prefix(*prefixes[0]):
+            name, key = prefixes.pop(0)
+            source, id_column = 'case_keys d JOIN cases c ON c.id = d.case_id', 'd.case_id'
+            where.append('d.field = ? AND d.value >= ? AND d.value < ?')
+            params.extend((name, key, key + PREFIX_END))
+        else:
+            # Nothing selective (or a common prefix): newest cases first, filtered as they come.
+            source, id_column = 'cases c', 'c.id'
+        where.append(f'{id_column} BETWEEN ? AND ?')
+        params.extend((low, high))
+        for name, key in exact:
+            where.append('EXISTS (SELECT 1 FROM case_keys WHERE field = ? AND value = ? AND case_id = c.id)')
+            params.extend((name, key))
+        if query is not None:
+            where.append('EXISTS (SELECT 1 FROM cases_fts WHERE cases_fts MATCH ? AND rowid = c.id)')
+            params.append(query)
+        for clause, value in (('c.created >= ?', since), ('c.created < ?', until)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        sql = f'SELECT c.* FROM {source} WHERE {" AND ".join(where)} ORDER BY {id_column} DESC'
+        if not prefixes:
+            sql += f' LIMIT {limit}'
+        cases = []
+        for row in conn.execute(sql, params):
+            case = _case(row)
+            if prefixes:
+                keys = index_keys(lookup_values(case['fields']))
+                if not all(any(field == name and value.startswith(key) for field, value in keys)
+                           for name, key in prefixes):
+                    continue
+            cases.append(case)
+            if len(cases) == limit:
+                break
+        return cases
+
+    def _rare_prefix(self, name, key):
+        """Return True if fewer than PREFIX_SCAN_LIMIT keys start with key."""
+        matches = self.connect().execute(
+            'SELECT COUNT(*) FROM (SELECT 1 FROM case_keys WHERE field = ? AND value >= ? AND value < ? LIMIT ?)',
+            (name, key, key + PREFIX_END, PREFIX_SCAN_LIMIT)
+        ).fetchone()[0]
+        return matches < PREFIX_SCAN_LIMIT
+
+    def get(self, key):
+        """Return one case as a dict, or None if there is no case with that key."""
+        row = self.connect().execute('SELECT * FROM cases WHERE key = ?', (key,)).fetchone()
+        return None if row is None else _case(row)
+
+    def artifact_path(self, case):
+        """Return the archived file a case was sent in, or None if none was kept or it has been evicted."""
+        if case['artifact'] is None:
+            return None
+        return self.archive.get(case['artifact'], case['artifact_ext'])
+
+
+class BatchRecorder:
+    """Records the cases of a streamed batch block by block, then points them at its file.
+
+    Each block is inserted in one transaction, so its cases have
+    consecutive ids and only the (first, last) id pair of every block is
+    kept until attach(); memory does not grow with the batch.
+    """
+
+    def __init__(self, store, source, fmt, tenant, template_version, block_size=BATCH_SIZE):
+        self.store = store
+        self.source, self.fmt, self.tenant, self.template_version = source, fmt, tenant, template_version
+        self.block_size = block_size
+        self.count = 0
+        self._block = []
+        self._ranges = []
+
+    def add(self, fields, entry=None):
+        """Record one form of the batch; its block is written once block_size forms are waiting."""
+        self._block.append(case_record(
+            self.source, fields, self.fmt, None, None, self.tenant, self.template_version, entry
+        ))
+        if len(self._block) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """Write the waiting forms now."""
+        if not self._block:
+            return
+        first = self.store.insert(self._block)
+        self._ranges.append((first, first + len(self._block) - 1))
+        self.count += len(self._block)
+        metrics.inc('mediation_cases_recorded_total', len(self._block), source=self.source)
+        self._block = []
+
+    def attach(self, artifact, extension):
+        """Write the waiting forms, then point every form of the batch at the file they were sent in."""
+        self.flush()
+        if self._ranges:
+            self.store.attach(self._ranges, artifact, extension)
+
+
+def _case(row):
+    case = dict(row)
+    case['fields'] = json.loads(case['fields'])
+    return case
+
+
+store = CaseStore(CASES_DIR, ArtifactStore(
+    os.path.join(CASES_DIR, 'artifacts'),
+    max_bytes=int(os.environ.get('CASE_ARTIFACT_MAX_BYTES', 20 * 1024 ** 3)),
+    max_age=float(os.environ.get('CASE_ARTIFACT_MAX_AGE', 400 * 24 * 3600)),
+))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Look up generated forms in the case store.')
+    parser.add_argument('--customer-name', help="defendant's name (end with * for a prefix)")
+    parser.add_argument('--client-name', help="applicant's name (end with * for a prefix)")
+    parser.add_argument('--mobile', help='phone number, with or without the country code')
+    parser.add_argument('--text', help='words to find in names and numbers')
+    parser.add_argument('--since', help='created at or after (ISO date/time or epoch seconds)')
+    parser.add_argument('--until', help='created before (ISO date/time or epoch seconds)')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    cases = store.search(
+        args.customer_name, args.client_name, args.mobile, args.text,
+        since=args.since and parse_time(args.since), until=args.until and parse_time(args.until), limit=args.limit
+    )
+    elapsed = time.perf_counter() - started
+    for case in cases:
+        print(json.dumps(case, ensure_ascii=False))
+    print(f'{len(cases)} case(s) in {elapsed * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Fast .docx packaging from a template package.
+
+A .docx is a ZIP archive in which only word/document.xml differs between
+filled forms. DocxPackage reads the template archive once and keeps every
+other part exactly as it was stored (already deflated, with its CRC and
+sizes), pre-assembled into one block of local headers and data plus their
+central-directory records. Building a filled package then deflates only
+the changed parts and appends them, instead of re-compressing styles.xml,
+the theme, fonts and the rest on every save. iter_build() streams one
+changed part from an iterable of chunks, for documents too large to hold
+in memory.
+"""
+
+import io
+import os
+import struct
+import zipfile
+import zlib
+
+DEFAULT_COMPRESSION_LEVEL = int(os.environ.get('DOCX_COMPRESSION_LEVEL', 6))
+
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+_END_OF_CENTRAL_DIR = struct.Struct('<4s4H2LH')
+_DATA_DESCRIPTOR = struct.Struct('<4s3L')
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+class DocxPackage:
+    """Template .docx split into pre-compressed static parts and replaceable parts."""
+
+    def __init__(self, docx_bytes, dynamic_parts=('word/document.xml',)):
+        view = memoryview(docx_bytes)
+        static, central = [], []
+        offset = 0
+        self.dynamic = {}
+        with zipfile.ZipFile(io.BytesIO(docx_bytes)) as package:
+            for info in package.infolist():
+                name = info.filename.encode('utf-8')
+                dos_time, dos_date = _dos_time(info.date_time)
+                if info.filename in dynamic_parts:
+                    self.dynamic[info.filename] = (name, dos_time, dos_date)
+                    continue
+                # Copy the stored (compressed) bytes straight from the source archive.
+                header = view[info.header_offset:info.header_offset + _LOCAL_HEADER.size]
+                name_len, extra_len = struct.unpack('<2H', header[26:30])
+                start = info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+                raw = bytes(view[start:start + info.compress_size])
+                flags = info.flag_bits & ~_DATA_DESCRIPTOR_FLAG
+                local = _LOCAL_HEADER.pack(
+                    b'PK\x03\x04', 20, flags, info.compress_type, dos_time, dos_date,
+                    info.CRC, info.compress_size, info.file_size, len(name), 0
+                )
+                static.append(local + name + raw)
+                central.append(_CENTRAL_HEADER.pack(
+                    b'PK\x01\x02', 20, 20, flags, info.compress_type, dos_time, dos_date,
+                    info.CRC, info.compress_size, info.file_size, len(name), 0, 0, 0, 0,
+                    info.external_attr, offset
+                ) + name)
+                offset += len(static[-1])
+        missing = set(dynamic_parts) - set(self.dynamic)
+        if missing:
+            raise ValueError(f'template package has no {", ".join(sorted(missing))}')
+        self.static_block = b''.join(static)
+        self.static_central = b''.join(central)
+        self.static_count = len(static)
+
+    def build(self, parts, level=None):
+        """Return package bytes with parts ({name: bytes}) replacing the dynamic parts."""
+        level = DEFAULT_COMPRESSION_LEVEL if level is None else level
+        out = [self.static_block]
+        central = [self.static_central]
+        offset = len(self.static_block)
+        for filename, (name, dos_time, dos_date) in self.dynamic.items():
+            data = parts[filename]
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+            deflated = compressor.compress(data) + compressor.flush()
+            crc = zlib.crc32(data)
+            local = _LOCAL_HEADER.pack(
+                b'PK\x03\x04', 20, 0, zipfile.ZIP_DEFLATED, dos_time, dos_date,
+                crc, len(deflated), len(data), len(name), 0
+            )
+            out.append(local + name)
+            out.append(deflated)
+            central.append(_CENTRAL_HEADER.pack(
+                b'PK\x01\x02', 20, 20, 0, zipfile.ZIP_DEFLATED, dos_time, dos_date,
+                crc, len(deflated), len(data), len(name), 0, 0, 0, 0, 0, offset
+            ) + name)
+            offset += len(local) + len(name) + len(deflated)
+        out.append(self._end(central, offset))
+        return b''.join(out)
+
+    def iter_build(self, filename, chunks, level=None):
+        """Yield package bytes with the dynamic part filename streamed from chunks.
+
+        chunks is an iterable of bytes; each one is deflated and yielded as
+        it arrives, so the part is never held in memory whole. Its CRC and
+        sizes follow in a data descriptor. The package has no ZIP64
+        support, so the part must stay under 4 GiB.
+        """
+        if set(self.dynamic) != {filename}:
+            raise ValueError(f'{filename} must be the only dynamic part')
+        level = DEFAULT_COMPRESSION_LEVEL if level is None else level
+        name, dos_time, dos_date = self.dynamic[filename]
+        yield self.static_block
+        yield _LOCAL_HEADER.pack(
+            b'PK\x03\x04', 20, _DATA_DESCRIPTOR_FLAG, zipfile.ZIP_DEFLATED, dos_time, dos_date,
+            0, 0, 0, len(name), 0
+        ) + name
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        crc = size = compressed = 0
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            deflated = compressor.compress(chunk)
+            if deflated:
+                compressed += len(deflated)
+                yield deflated
+        deflated = compressor.flush()
+        compressed += len(deflated)
+        yield deflated + _DATA_DESCRIPTOR.pack(b'PK\x07\x08', crc, compressed, size)
+        central = [self.static_central, _CENTRAL_HEADER.pack(
+            b'PK\x01\x02', 20, 20, _DATA_DESCRIPTOR_FLAG, zipfile.ZIP_DEFLATED, dos_time, dos_date,
+            crc, compressed, size, len(name), 0, 0, 0, 0, 0, len(self.static_block)
+        ) + name]
+        offset = len(self.static_block) + _LOCAL_HEADER.size + len(name) + compressed + _DATA_DESCRIPTOR.size
+        yield self._end(central, offset)
+
+    def _end(self, central, offset):
+        """Return the central directory records plus the end-of-central-directory record."""
+        central_dir = b''.join(central)
+        count = self.static_count + len(self.dynamic)
+        return central_dir + _END_OF_CENTRAL_DIR.pack(
+            b'PK\x05\x06', 0, 0, count, count, len(central_dir), offset, 0
+        )
@@ -0,0 +1,149 @@
+"""
+Bounded per-worker executor for form generation.
+
+Generation runs on a small thread pool (max_workers at a time) with at
+most max_queue more requests waiting for it. A request that would go
+past that is refused at once with QueueFull rather than piling up behind
+a slow render, and a request that waits longer than its timeout gets
+GenerationTimeout; a render that has not started yet is cancelled, one
+that has keeps running and still fills the result cache for a retry.
+
+Work the caller runs on its own thread, such as a streamed batch, holds
+a reserved slot for its whole lifetime instead. A reservation counts
+towards the limit and the queue depth like a waiting render, and at most
+max_reserved of them are held at once.
+
+The pool is created lazily in each process, since threads started in the
+gunicorn master do not survive the fork into workers.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class QueueFull(Exception):
+    """Raised when max_workers renders are running and max_queue more are waiting."""
+
+
+class GenerationTimeout(Exception):
+    """Raised when a render did not finish within the request timeout."""
+
+
+class BoundedExecutor:
+    """Thread pool with a hard limit on running plus waiting tasks."""
+
+    def __init__(self, max_workers=2, max_queue=4, timeout=30.0, on_change=None, max_reserved=1):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_reserved = max_reserved
+        self.timeout = timeout
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._in_flight = 0
+        self._running = 0
+        self._reserved = 0
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def reserved(self):
+        return self._reserved
+
+    @property
+    def queued(self):
+        return self._in_flight - self._running
+
+    def saturated(self):
+        """Return True when a new task would be refused."""
+        return self._in_flight >= self.max_workers + self.max_queue
+
+    def _get_pool(self):
+        if self._pid != os.getpid():
+            self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix='generate')
+            self._pid = os.getpid()
+            self._in_flight = self._running = self._reserved = 0
+        return self._pool
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) and return its future, or raise QueueFull."""
+        with self._lock:
+            if self.saturated():
+                raise QueueFull()
+            pool = self._get_pool()
+            self._in_flight += 1
+
+        def task():
+            with self._lock:
+                self._running += 1
+            self._changed()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        def done(_):
+            with self._lock:
+                self._in_flight -= 1
+            self._changed()
+
+        future = pool.submit(task)
+        future.add_done_callback(done)
+        self._changed()
+        return future
+
+    def reserve(self):
+        """Hold a slot for work run on the caller's thread; return a Reservation, or raise QueueFull.
+
+        QueueFull also comes when max_reserved slots are already held.
+        Release the reservation when the work is done.
+        """
+        with self._lock:
+            if self.saturated() or self._reserved >= self.max_reserved:
+                raise QueueFull()
+            self._get_pool()
+            self._in_flight += 1
+            self._reserved += 1
+        self._changed()
+        return Reservation(self)
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._reserved -= 1
+        self._changed()
+
+    def run(self, func, *args, **kwargs):
+        """Run func on the pool and wait up to the timeout for its result."""
+        future = self.submit(func, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise GenerationTimeout() from None
+
+
+class Reservation:
+    """A slot held with BoundedExecutor.reserve(); release() frees it (later calls do nothing)."""
+
+    def __init__(self, executor):
+        self._executor = executor
+        self._pid = os.getpid()
+        self._held = True
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            held, self._held = self._held, False
+        # A slot taken before a fork is not counted in the child's executor.
+        if held and self._pid == os.getpid():
+            self._executor._release()
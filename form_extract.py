@@ -0,0 +1,381 @@
+"""
+Field values read back out of returned, filled Form A documents.
+
+Branches and counterparties send back the .docx that /download or
+/render produced, filled in by hand. extract() reads one of them: only
+word/document.xml is opened, and it is parsed incrementally, table row
+by table row, with each row discarded once read, so memory per file
+stays bounded whatever the number of parties. python-docx is not used.
+
+Cells are found by their labels, not their position. The label to
+field rules come from the layout plan (see form_layout): a label cell
+("Name of Applicant", "Address", "Mobile No.", ...) names the field of
+the cell next to it. That field is the {{placeholder}} the layout puts
+there, or else the label itself ("mobile_no", "email_id"). Bold
+sub-labels such as "REGISTERED ADDRESS:" split a cell into several
+fields, and a label cell with an "extract" name (the nature of dispute)
+takes the text typed below it. The party heading rows and repeated labels
+start a new applicant or defendant, so forms with several parties come
+back as lists.
+
+Each file becomes one record, ready to feed back into /bulk or /jobs:
+
+    {"source": "branch-12.docx", "applicants": [{"client_name": ..., "branch_address": ...,
+     "mobile": ..., ...}], "defendants": [{"customer_name": ..., "address1": ...}], "dispute": ...}
+
+or {"source": ..., "error": ...} for a file that is not a readable form.
+
+    python form_extract.py returned/ more.zip -o cases.jsonl [--jobs 8]
+
+reads .docx files, directories of them and .zip archives of them on
+--jobs worker processes and writes the records as JSONL, in input order.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import zipfile
+from functools import lru_cache
+from io import BytesIO
+from multiprocessing import Pool
+
+from batch import normalize_column
+from form_layout import Block, Slot, Table, load_plan
+from form_template import DOCUMENT_PART, PARTY_GROUPS, TAG_RE
+from schema import normalize_text
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+# Limits per file; a larger one is reported as an error instead of read.
+MAX_FILE_BYTES = int(os.environ.get('EXTRACT_MAX_FILE_BYTES', 20 * 1024 * 1024))
+MAX_DOCUMENT_BYTES = int(os.environ.get('EXTRACT_MAX_DOCUMENT_BYTES', 50 * 1024 * 1024))
+CHUNK_SIZE = 8
+# Lines with nothing filled in: blanks, "________________" and the like.
+BLANK_RE = re.compile(r'[\s_.…-]*')
+FIELD_TAG_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+# Any piece of a template tag, left in a form that was returned unfilled.
+TAG_PIECE_RE = re.compile(r'\{[{%]|[}%]\}')
+
+
+class ExtractError(ValueError):
+    """Raised for a file that is not a readable .docx form."""
+
+
+def _key(text):
+    """Return text as labels are compared: whitespace collapsed, case folded."""
+    return normalize_text(text).casefold()
+
+
+class Rules:
+    """Label to field rules derived from one layout plan."""
+
+    def __init__(self, plan):
+        # {group (None outside repeated blocks): {label: ((sub-label or None, field), ...)}}
+        self.labels = {}
+        # {group: heading prefix} for blocks whose heading row names the party
+        self.headings = {}
+        # {label: field} for label cells followed by free text
+        self.trailing = {}
+        for item in plan.body:
+            if not isinstance(item, Table):
+                continue
+            for row_or_block in item.rows:
+                if isinstance(row_or_block, Block):
+                    group = row_or_block.group
+                    self.labels.setdefault(group, {})
+                    used = set()
+                    for row in row_or_block.rows:
+                        self._row(row, group, used)
+                else:
+                    self._row(row_or_block, None, set())
+
+    def _row(self, row, group, used):
+        cells = row.cells
+        for index, cell in enumerate(cells):
+            texts = [p.text for p in cell.paragraphs]
+            if Slot('heading') in texts and group is not None:
+                self.headings[group] = _key(PARTY_GROUPS[group][2].removesuffix('/s'))
+                return
+            if not _is_label(texts):
+                continue
+            label = _key(' '.join(texts))
+            if cell.extract and index == len(cells) - 1:
+                self.trailing[label] = cell.extract
+                return
+            if index + 1 < len(cells) and _is_value(cells[index + 1]):
+                self.labels.setdefault(group, {})[label] = _segments(label, cells[index + 1], used)
+                return
+
+
+def _is_label(texts):
+    return all(isinstance(t, str) for t in texts) and any(texts) and not any(TAG_RE.search(t) for t in texts)
+
+
+def _is_value(cell):
+    """A value cell holds a slot, a placeholder or nothing, not static text alone."""
+    texts = [p.text for p in cell.paragraphs]
+    return any(isinstance(t, Slot) or TAG_RE.search(t) for t in texts) or not any(texts)
+
+
+def _segments(label, cell, used):
+    """Return ((sub-label or None, field), ...) for a value cell.
+
+    A field is the first placeholder of its segment not already taken in
+    the block, else the cell's extract name or the (sub-)label as a name.
+    """
+    segments = []
+    for paragraph in cell.paragraphs:
+        text = paragraph.text
+        if isinstance(text, str) and text and not TAG_RE.search(text) and paragraph.style.bold:
+            segments.append([_key(text), text, []])
+        else:
+            if not segments:
+                segments.append([None, label, []])
+            if isinstance(text, str):
+                segments[-1][2].extend(FIELD_TAG_RE.findall(text))
+    result = []
+    for position, (sub_label, name, fields) in enumerate(segments):
+        field = next((f for f in fields if f not in used), None)
+        if field is None:
+            field = cell.extract if position == 0 and cell.extract else normalize_column(name)
+        used.add(field)
+        result.append((sub_label, field))
+    return tuple(result)
+
+
+_rules = {}
+
+
+def rules_for(plan):
+    """Return the Rules of a layout plan, derived once per spec hash."""
+    rules = _rules.get(plan.spec_hash)
+    if rules is None:
+        rules = _rules[plan.spec_hash] = Rules(plan)
+    return rules
+
+
+class _Limited:
+    """A read-only stream that raises ExtractError past limit bytes."""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.left = limit
+
+    def read(self, size=-1):
+        data = self.stream.read(size if size is not None and size >= 0 else self.left + 1)
+        self.left -= len(data)
+        if self.left < 0:
+            raise ExtractError(f'{DOCUMENT_PART} is larger than {MAX_DOCUMENT_BYTES} bytes')
+        return data
+
+
+def _paragraph_text(p):
+    parts = []
+    for node in p.iter(f'{W}t', f'{W}tab', f'{W}br'):
+        if node.tag == f'{W}t':
+            parts.append(node.text or '')
+        else:
+            parts.append('\t' if node.tag == f'{W}tab' else '\n')
+    return ''.join(parts)
+
+
+def iter_rows(stream):
+    """Yield every table row of a document.xml stream as [[paragraph text, ...] per cell].
+
+    Rows and body paragraphs are dropped from the tree as soon as they
+    have been read.
+    """
+    from lxml import etree
+
+    events = etree.iterparse(
+        stream, events=('end',), tag=(f'{W}tr', f'{W}p'), resolve_entities=False, no_network=True
+    )
+    for _, element in events:
+        parent = element.getparent()
+        if element.tag == f'{W}tr':
+            yield [[_paragraph_text(p) for p in tc.iter(f'{W}p')] for tc in element.iterchildren(f'{W}tc')]
+        elif parent is None or parent.tag != f'{W}body':
+            continue  # a paragraph inside a cell, read with its row
+        element.clear()
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _clean(lines):
+    """Join the filled-in lines of a field, dropping blanks and unfilled placeholders."""
+    kept = []
+    for line in lines:
+        for part in line.split('\n'):
+            part = normalize_text(part)
+            if not BLANK_RE.fullmatch(part) and not TAG_PIECE_RE.search(part):
+                kept.append(part)
+    return '\n'.join(kept)
+
+
+def _values(paragraphs, segments):
+    lines = {field: [] for _, field in segments}
+    sub_labels = {sub_label: field for sub_label, field in segments if sub_label}
+    current = segments[0][1] if segments[0][0] is None else None
+    for text in paragraphs:
+        field = sub_labels.get(_key(text))
+        if field is not None:
+            current = field
+        elif current is not None:
+            lines[current].append(text)
+    return {field: _clean(found) for field, found in lines.items()}
+
+
+def read_record(rows, rules):
+    """Return the record for the rows of one document (see iter_rows)."""
+    record = {group: [] for group in rules.labels if group is not None}
+    group = party = None
+    trailing = None
+    for cells in rows:
+        texts = [_key(' '.join(paragraphs)) for paragraphs in cells]
+        heading = next(
+            (g for g, prefix in rules.headings.items() for text in texts if text.startswith(prefix)), None
+        )
+        if heading is not None:
+            if heading != group:
+                group, party = heading, None
+            trailing = None
+            continue
+        for index, text in enumerate(texts[:-1]):
+            owners = [g for g, labels in rules.labels.items() if text in labels]
+            if not owners:
+                continue
+            owner = group if group in owners else owners[0]
+            segments = rules.labels[owner][text]
+            if owner is None:
+                target = record
+            else:
+                if owner != group:
+                    group, party = owner, None
+                # A label the current party already has starts the next party.
+                if party is None or any(field in party for _, field in segments):
+                    party = {}
+                    record[owner].append(party)
+                target = party
+            target.update(_values(cells[index + 1], segments))
+            trailing = None
+            break
+        else:
+            for paragraphs in cells:
+                field = rules.trailing.get(_key(paragraphs[0])) if paragraphs else None
+                if field is not None:
+                    trailing = field
+                    record[field] = _clean(paragraphs[1:])
+                    break
+            else:
+                if trailing is not None:
+                    record[trailing] = _clean([record[trailing]] + [t for paragraphs in cells for t in paragraphs])
+    return record
+
+
+def extract(source, plan=None):
+    """Return the record read from one filled form, a path or a binary file.
+
+    Raises ExtractError when source is not a readable .docx.
+    """
+    from lxml import etree
+
+    rules = rules_for(plan or load_plan())
+    try:
+        with zipfile.ZipFile(source) as package:
+            try:
+                info = package.getinfo(DOCUMENT_PART)
+            except KeyError:
+                raise ExtractError(f'not a .docx file: no {DOCUMENT_PART}') from None
+            if info.file_size > MAX_DOCUMENT_BYTES:
+                raise ExtractError(f'{DOCUMENT_PART} is larger than {MAX_DOCUMENT_BYTES} bytes')
+            with package.open(info) as stream:
+                return read_record(iter_rows(_Limited(stream, MAX_DOCUMENT_BYTES)), rules)
+    except zipfile.BadZipFile:
+        raise ExtractError('not a .docx file') from None
+    except etree.XMLSyntaxError as exc:
+        raise ExtractError(f'unreadable {DOCUMENT_PART}: {exc}') from None
+
+
+def iter_sources(path, name=None):
+    """Yield (path, member, name) for the forms in a .docx, a .zip of them or a directory.
+
+    member is the entry inside a .zip, else None; name is what the
+    record's source says, path (or the given name) based.
+    """
+    name = name or path
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.lower().endswith(('.docx', '.zip')) and not filename.startswith('~$'):
+                    full = os.path.join(root, filename)
+                    yield from iter_sources(full, os.path.join(name, os.path.relpath(full, path)))
+    elif path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                member = info.filename
+                if member.lower().endswith('.docx') and not info.is_dir() and not os.path.basename(member).startswith('~$'):
+                    yield path, member, f'{name}:{member}'
+    else:
+        yield path, None, name
+
+
+@lru_cache(maxsize=4)
+def _archive(path):
+    """Keep the last few archives open in each worker; thousands of members share one."""
+    return zipfile.ZipFile(path)
+
+
+def extract_task(task):
+    """Return the record (or error record) of one (path, member, name) source."""
+    path, member, name = task
+    try:
+        if member is None:
+            if os.path.getsize(path) > MAX_FILE_BYTES:
+                raise ExtractError(f'larger than {MAX_FILE_BYTES} bytes')
+            record = extract(path)
+        else:
+            info = _archive(path).getinfo(member)
+            if info.file_size > MAX_FILE_BYTES:
+                raise ExtractError(f'larger than {MAX_FILE_BYTES} bytes')
+            record = extract(BytesIO(_archive(path).read(member)))
+    except (OSError, ExtractError, zipfile.BadZipFile) as exc:
+        return {'source': name, 'error': str(exc)}
+    return {'source': name, **record}
+
+
+def extract_all(tasks, pool=None):
+    """Yield the record of every task, in order, on pool's processes (inline without one)."""
+    if pool is None:
+        return map(extract_task, tasks)
+    return pool.imap(extract_task, tasks, CHUNK_SIZE)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Read field values back out of filled Form A documents.')
+    parser.add_argument('inputs', nargs='+', help='.docx files, directories of them or .zip archives of them')
+    parser.add_argument('-o', '--output', help='JSONL file to write (default: stdout)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes (default: all cores)')
+    args = parser.parse_args(argv)
+
+    tasks = [task for path in args.inputs for task in iter_sources(path)]
+    load_plan()  # parsed once here, inherited by forked workers
+    pool = Pool(args.jobs) if args.jobs > 1 and len(tasks) > 1 else None
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    failed = 0
+    try:
+        for record in extract_all(tasks, pool):
+            failed += 'error' in record
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if out is not sys.stdout:
+            out.close()
+    print(f'{len(tasks) - failed} forms read, {failed} failed', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
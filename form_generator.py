@@ -0,0 +1,207 @@
+"""
+Form A laid out with python-docx.
+
+build_document() runs the compiled layout plan (see form_layout) through
+python-docx; the web app imports this module lazily so routes that never
+generate a document do not pay for importing python-docx.
+
+Each applicant and defendant block is wrapped in a bookmark (applicant_1,
+defendant_1, ...). Further blocks are deep copies of the first block's
+rows inserted straight into the table, since table.add_row() copies the
+previous row and row.cells re-scans the whole table on every call.
+"""
+
+from copy import deepcopy
+from functools import lru_cache
+from io import BytesIO
+
+from docx import Document
+from docx.shared import Pt, RGBColor, Twips
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.enum.table import WD_TABLE_ALIGNMENT, WD_CELL_VERTICAL_ALIGNMENT
+from docx.oxml.ns import nsdecls, qn
+from docx.oxml import parse_xml, OxmlElement
+
+from form_layout import Block, Table, load_plan, party_counts, party_values, resolve, tenant_values
+from form_template import PARTY_GROUPS
+from tenants import DEFAULT as DEFAULT_TENANT
+
+TABLE_BORDER_EDGES = ("top", "left", "bottom", "right", "insideH", "insideV")
+ALIGNMENTS = {
+    "left": WD_ALIGN_PARAGRAPH.LEFT,
+    "center": WD_ALIGN_PARAGRAPH.CENTER,
+    "right": WD_ALIGN_PARAGRAPH.RIGHT,
+    "both": WD_ALIGN_PARAGRAPH.JUSTIFY,
+}
+TABLE_ALIGNMENTS = {"left": WD_TABLE_ALIGNMENT.LEFT, "center": WD_TABLE_ALIGNMENT.CENTER, "right": WD_TABLE_ALIGNMENT.RIGHT}
+
+
+@lru_cache(maxsize=None)
+def _border_prototype(tag, edges, border_color, border_size):
+    """Parse a borders element once; callers append deep copies of it."""
+    return parse_xml(
+        f'<w:{tag} {nsdecls("w")}>'
+        + ''.join(f'<w:{edge} w:val="single" w:sz="{border_size}" w:color="{border_color}"/>' for edge in edges)
+        + f'</w:{tag}>'
+    )
+
+
+def set_table_borders(table, border_color="000000", border_size="4"):
+    """Set borders for every cell of a table once, through w:tblBorders."""
+    prototype = _border_prototype("tblBorders", TABLE_BORDER_EDGES, border_color, border_size)
+    table._tbl.tblPr.insert_element_before(
+        deepcopy(prototype),
+        "w:shd", "w:tblLayout", "w:tblCellMar", "w:tblLook", "w:tblCaption", "w:tblDescription", "w:tblPrChange"
+    )
+
+
+def format_paragraph(para, text, style, font):
+    """Apply a form_layout.Style to para and add text as its one run."""
+    if style.align is not None:
+        para.alignment = ALIGNMENTS[style.align]
+    if style.before is not None:
+        para.paragraph_format.space_before = Twips(style.before)
+    if style.after is not None:
+        para.paragraph_format.space_after = Twips(style.after)
+    para.paragraph_format.line_spacing = style.line / 240
+    run = para.add_run(text)
+    if style.bold is not None:
+        run.bold = style.bold
+    if style.underline is not None:
+        run.underline = style.underline
+    if style.size is not None:
+        run.font.size = Pt(style.size / 2)
+    if style.color is not None:
+        run.font.color.rgb = RGBColor.from_string(style.color)
+    run.font.name = font
+    return para
+
+
+def fill_cell(cell, paragraphs, values, font):
+    """Write a plan cell's paragraphs into a new python-docx cell."""
+    first, *rest = paragraphs
+    para = cell.paragraphs[0]
+    format_paragraph(para, resolve(first.text, values), first.style, font)
+    for paragraph in rest:
+        format_paragraph(cell.add_paragraph(), resolve(paragraph.text, values), paragraph.style, font)
+
+
+def add_row(table, row, values, font):
+    """Append a plan row to a python-docx table and return its w:tr."""
+    docx_row = table.add_row()
+    cells = docx_row.cells
+    start = 0
+    for plan_cell in row.cells:
+        cell = cells[start]
+        if plan_cell.span > 1:
+            cell = cell.merge(cells[start + plan_cell.span - 1])
+        fill_cell(cell, plan_cell.paragraphs, values, font)
+        if plan_cell.center:
+            cell.vertical_alignment = WD_CELL_VERTICAL_ALIGNMENT.CENTER
+        start += plan_cell.span
+    return docx_row._tr
+
+
+def mark_block(first_tr, last_tr, name, bookmark_id):
+    """Wrap the rows first_tr..last_tr in a bookmark called name."""
+    start = OxmlElement("w:bookmarkStart")
+    start.set(qn("w:id"), str(bookmark_id))
+    start.set(qn("w:name"), name)
+    first_p = first_tr.find(qn("w:tc")).find(qn("w:p"))
+    first_p.insert(1 if first_p.pPr is not None else 0, start)
+    end = OxmlElement("w:bookmarkEnd")
+    end.set(qn("w:id"), str(bookmark_id))
+    last_tr.findall(qn("w:tc"))[-1].findall(qn("w:p"))[-1].append(end)
+
+
+def repeat_block(rows, group, count, first_id, insert):
+    """Add blocks 2..count by copying the rows of block 1.
+
+    rows are the w:tr elements of the first block, already labelled and
+    bookmarked for count parties; insert(tr) places each copied row.
+    """
+    prefix = PARTY_GROUPS[group][0]
+    first = party_values(group, 1, count)
+    for index in range(2, count + 1):
+        labels = {first[slot]: value for slot, value in party_values(group, index, count).items() if first[slot]}
+        for tr in rows:
+            clone = deepcopy(tr)
+            for t in clone.iter(qn("w:t")):
+                if t.text in labels:
+                    t.text = labels[t.text]
+            for mark in clone.iter(qn("w:bookmarkStart"), qn("w:bookmarkEnd")):
+                mark.set(qn("w:id"), str(first_id + index - 1))
+                if mark.tag == qn("w:bookmarkStart"):
+                    mark.set(qn("w:name"), f"{prefix}_{index}")
+            insert(clone)
+
+
+def add_table(doc, table_plan, values, counts, bookmark_id, font):
+    """Lay out a plan table; return the next free bookmark id."""
+    table = doc.add_table(rows=0, cols=len(table_plan.columns))
+    if table_plan.align is not None:
+        table.alignment = TABLE_ALIGNMENTS[table_plan.align]
+    if table_plan.border is not None:
+        set_table_borders(table, table_plan.border[1], str(table_plan.border[0]))
+    for column, width in zip(table.columns, table_plan.columns):
+        column.width = Twips(width)
+
+    # Each repeated block is laid out once and copied only after every
+    # fixed row exists: row.cells walks the whole table, so it must not run
+    # on a table of thousands of rows.
+    blocks = []
+    for item in table_plan.rows:
+        if isinstance(item, Block):
+            count = counts[item.group]
+            if not count:
+                continue
+            block_values = {**values, **party_values(item.group, 1, count)}
+            blocks.append((item.group, count, [add_row(table, row, block_values, font) for row in item.rows]))
+        else:
+            add_row(table, item, values, font)
+    # Copies go before whatever row followed block 1, fixed before any are inserted.
+    anchors = [trs[-1].getnext() for _, _, trs in blocks]
+    for (group, count, trs), anchor in zip(blocks, anchors):
+        mark_block(trs[0], trs[-1], f"{PARTY_GROUPS[group][0]}_1", bookmark_id)
+        insert = anchor.addprevious if anchor is not None else table._tbl.append
+        repeat_block(trs, group, count, bookmark_id, insert)
+        bookmark_id += count
+    return bookmark_id
+
+
+def build_document(applicants=1, defendants=1, tenant=None, plan=None):
+    """Build the Mediation Application Form as a python-docx Document.
+
+    applicants and defendants are the number of party blocks to lay out
+    (0 leaves the block out); tenant (a tenants.Tenant, the default
+    profile if None) fills the layout's tenant slots, and plan is a
+    form_layout.Plan (the configured layout if None).
+    """
+    tenant = tenant or DEFAULT_TENANT
+    plan = plan or load_plan()
+    values = tenant_values(tenant)
+    counts = party_counts(applicants, defendants)
+    doc = Document()
+
+    for section in doc.sections:
+        section.page_width, section.page_height = (Twips(length) for length in plan.page)
+        top, right, bottom, left = (Twips(length) for length in plan.margins)
+        section.top_margin, section.right_margin = top, right
+        section.bottom_margin, section.left_margin = bottom, left
+
+    bookmark_id = 0
+    for item in plan.body:
+        if isinstance(item, Table):
+            bookmark_id = add_table(doc, item, values, counts, bookmark_id, plan.font)
+        else:
+            format_paragraph(doc.add_paragraph(), resolve(item.text, values), item.style, plan.font)
+    return doc
+
+
+def create_mediation_form(applicants=1, defendants=1, tenant=None, plan=None):
+    """Create the Mediation Application Form document and return as BytesIO."""
+    doc = build_document(applicants, defendants, tenant, plan)
+    file_stream = BytesIO()
+    doc.save(file_stream)
+    file_stream.seek(0)
+    return file_stream
@@ -0,0 +1,110 @@
+"""
+HTML preview of Form A.
+
+Converts a rendered word/document.xml into an HTML fragment: paragraphs
+with their alignment and spacing, bordered tables with their column
+widths and merged cells, and bold, underlined, coloured and sized runs.
+The document is read with form_pdf.parse_document, so the preview, the
+PDF and the .docx all come from the same create_mediation_form() output
+rather than a hand-written copy of the form. Template tags left in a
+blank form are highlighted.
+"""
+
+import re
+from html import escape
+
+from form_pdf import CELL_PADDING, parse_document
+
+TAG_RE = re.compile(r'(\{\{.*?\}\}|\{%.*?%\})')
+DEFAULT_SIZE = 11.0
+
+
+def _style(**properties):
+    """Return an inline style attribute for the properties that are set."""
+    css = ';'.join(f'{name.replace("_", "-")}:{value}' for name, value in properties.items() if value is not None)
+    return f' style="{css}"' if css else ''
+
+
+def _text(text, tags):
+    """Return escaped run text, with template tags wrapped in spans when tags is set."""
+    if not tags:
+        return escape(text)
+    return ''.join(
+        f'<span class="template-var">{escape(piece)}</span>' if i % 2 else escape(piece)
+        for i, piece in enumerate(TAG_RE.split(text))
+    )
+
+
+def _runs(runs, tags):
+    """Return the HTML of a paragraph's runs, merging neighbours with the same formatting."""
+    merged = []
+    for text, bold, underline, size, color in runs:
+        if not text:
+            continue
+        if merged and merged[-1][1:] == (bold, underline, size, color):
+            merged[-1][0] += text
+        else:
+            merged.append([text, bold, underline, size, color])
+    out = []
+    for text, bold, underline, size, color in merged:
+        html = _text(text, tags)
+        if bold:
+            html = f'<strong>{html}</strong>'
+        if underline:
+            html = f'<u>{html}</u>'
+        if size != DEFAULT_SIZE or color:
+            html = f'<span{_style(font_size=f"{size:g}pt", color=color and f"#{color}")}>{html}</span>'
+        out.append(html)
+    return ''.join(out)
+
+
+def _paragraph(block, tags):
+    _, align, before, after, line, runs = block
+    style = _style(
+        text_align='justify' if align == 'both' else align,
+        margin=f'{before:g}pt 0 {after:g}pt',
+        line_height=f'{line:g}',
+        min_height='1em',
+    )
+    return f'<p{style}>{_runs(runs, tags)}</p>'
+
+
+def _table(block, tags):
+    _, align, grid, rows = block
+    margin = {'center': '0 auto', 'right': '0 0 0 auto'}.get(align, '0')
+    out = [
+        f'<table{_style(border_collapse="collapse", table_layout="fixed", margin=margin, width=f"{sum(grid):g}pt")}>',
+        '<colgroup>',
+        *(f'<col{_style(width=f"{width:g}pt")}>' for width in grid),
+        '</colgroup>',
+    ]
+    cell_style = dict(border='0.5pt solid #000', padding=f'0 {CELL_PADDING:g}pt')
+    for cells in rows:
+        out.append('<tr>')
+        for span, valign, paragraphs in cells:
+            colspan = f' colspan="{span}"' if span > 1 else ''
+            style = _style(vertical_align='middle' if valign == 'center' else valign, **cell_style)
+            out.append(f'<td{colspan}{style}>{"".join(_paragraph(p, tags) for p in paragraphs)}</td>')
+        out.append('</tr>')
+    out.append('</table>')
+    return ''.join(out)
+
+
+def document_to_html(document_xml, font='Times New Roman', tags=False):
+    """Return an HTML fragment laying out a (filled or blank) Form A word/document.xml.
+
+    The fragment carries its own inline styles, so it can be dropped into
+    any page. tags highlights {{...}} and {% ... %} template tags.
+    """
+    page, blocks = parse_document(document_xml)
+    style = _style(
+        font_family=f"'{font}', Times, serif",
+        font_size=f'{DEFAULT_SIZE:g}pt',
+        max_width=f'{page["width"]:g}pt',
+        padding=f'{page["top"]:g}pt {page["right"]:g}pt {page["bottom"]:g}pt {page["left"]:g}pt',
+        box_sizing='border-box',
+        background='#fff',
+        margin='0 auto',
+    )
+    body = ''.join(_table(block, tags) if block[0] == 'tbl' else _paragraph(block, tags) for block in blocks)
+    return f'<div class="form-page"{style}>{body}</div>'
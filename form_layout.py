@@ -0,0 +1,415 @@
+"""
+Form A layout as data.
+
+layouts/form_a.json (or FORM_LAYOUT) describes the form: page size and
+margins, named paragraph styles, and a body of paragraphs and tables
+whose rows list their cells, merges (span) and the style of every
+paragraph. compile_spec() checks it and turns it into a Plan, a tree of
+immutable tuples with every length already in twips and every style
+resolved, which both backends run: form_generator through python-docx,
+form_xml as WordprocessingML strings.
+
+Text starting with "$" is a slot filled at build time: a tenant profile
+field ($authority, $court, $email) anywhere, or inside a block repeated
+per applicant or defendant, that party's $number and $heading (see
+form_template.party_labels). "$$" writes a literal "$". A cell's
+optional "extract" names the field form_extract reads it back into.
+
+Plans are memoized by spec_hash, a hash of the canonical spec JSON, which
+also goes into the template version, so a layout change invalidates the
+built forms and cached renders and nothing else does.
+
+    python form_layout.py [layout.json]
+
+checks a spec and prints its hash and how long it took to compile.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from functools import lru_cache
+from typing import NamedTuple
+
+from form_template import PARTY_GROUPS, party_labels
+from tenants import PROFILE_FIELDS
+
+LAYOUT_PATH = os.environ.get('FORM_LAYOUT') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'layouts', 'form_a.json'
+)
+EMU_PER_CM = 360000
+EMU_PER_TWIP = 635
+STYLE_KEYS = ('base', 'bold', 'underline', 'size', 'color', 'align', 'before', 'after')
+ALIGNMENTS = ('left', 'center', 'right', 'both')
+TABLE_ALIGNMENTS = ('left', 'center', 'right')
+PARTY_SLOTS = ('number', 'heading')
+DEFAULT_CELL_STYLE = 'cell'
+
+
+class LayoutError(ValueError):
+    """Raised when a layout spec is malformed; problems lists each one."""
+
+    def __init__(self, problems):
+        super().__init__('invalid layout:\n' + '\n'.join(f'  {p}' for p in problems))
+        self.problems = problems
+
+
+class Style(NamedTuple):
+    bold: object  # True, False (written as off) or None (not written)
+    underline: object
+    size: object  # half-points
+    color: object  # 'RRGGBB'
+    align: object
+    before: object  # twips
+    after: object
+    line: int  # 240ths of a line
+
+
+class Slot(NamedTuple):
+    name: str
+
+
+class Paragraph(NamedTuple):
+    text: object  # str or Slot
+    style: Style
+
+
+class Cell(NamedTuple):
+    paragraphs: tuple
+    width: int  # twips, the sum of the columns it spans
+    span: int
+    center: bool
+    extract: object  # field name form_extract reads this cell into, if not derived
+
+
+class Row(NamedTuple):
+    cells: tuple
+    dynamic: bool  # has slots, so it differs per tenant or party
+
+
+class Block(NamedTuple):
+    group: str  # form_template.PARTY_GROUPS key
+    rows: tuple
+
+
+class Table(NamedTuple):
+    columns: tuple  # twips
+    align: object
+    border: object  # (size in eighths of a point, color) or None
+    rows: tuple  # Row and Block
+
+
+class Plan(NamedTuple):
+    spec_hash: str
+    font: str
+    page: tuple  # (width, height) in twips
+    margins: tuple  # (top, right, bottom, left) in twips
+    body: tuple  # Paragraph and Table
+
+
+def resolve(text, values):
+    """Return a paragraph's text, looking slots up in values."""
+    if isinstance(text, Slot):
+        return values.get(text.name) or ''
+    return text
+
+
+def tenant_values(tenant):
+    """Return the slot values a tenant profile supplies."""
+    return {name: getattr(tenant, name) for name in PROFILE_FIELDS}
+
+
+def party_values(group, index, count):
+    """Return the slot values of party index (1-based) of count in a repeated block."""
+    number, heading = party_labels(group, index, count)
+    return {'number': number, 'heading': heading}
+
+
+def party_counts(applicants, defendants):
+    """Return {group: count} of party blocks to lay out; a count of 0 leaves that block out.
+
+    Raises ValueError for a count that is not a whole number of at least 0.
+    """
+    counts = {'applicants': applicants, 'defendants': defendants}
+    for group, count in counts.items():
+        if not isinstance(count, int) or isinstance(count, bool) or count < 0:
+            raise ValueError(f'{group} must be a whole number of at least 0, not {count!r}')
+    return counts
+
+
+def spec_hash(spec):
+    """Return a short hash of spec that ignores key order and whitespace."""
+    payload = json.dumps(spec, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _is_color(value):
+    return isinstance(value, str) and len(value) == 6 and all(c in '0123456789abcdefABCDEF' for c in value)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _twips(cm):
+    # As python-docx: Cm() truncates to EMU, twips are rounded.
+    return round(int(cm * EMU_PER_CM) / EMU_PER_TWIP)
+
+
+class _Compiler:
+    """Resolves one spec into plan tuples, collecting every problem on the way."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.problems = []
+        self.line = round(spec.get('line_spacing', 1.15) * 240)
+        self.raw_styles = spec.get('styles', {})
+        self.styles = {}
+        self.groups = set()
+
+    def problem(self, where, message):
+        self.problems.append(f'{where}: {message}')
+
+    def style(self, value, where, resolving=()):
+        """Return the Style for a style name or an inline style object."""
+        if isinstance(value, str):
+            if value in self.styles:
+                return self.styles[value]
+            if value in resolving:
+                self.problem(where, f'style "{value}" is its own base')
+                return None
+            if value not in self.raw_styles:
+                self.problem(where, f'unknown style "{value}"')
+                return None
+            style = self.style(self.raw_styles[value], f'styles.{value}', resolving + (value,))
+            if style is not None:
+                self.styles[value] = style
+            return style
+        if not isinstance(value, dict):
+            self.problem(where, 'a style is a name or an object')
+            return None
+        unknown = set(value) - set(STYLE_KEYS)
+        if unknown:
+            self.problem(where, f'unknown style keys {", ".join(sorted(unknown))}')
+        if 'base' in value:
+            base = self.style(value['base'], where, resolving)
+            if base is None:
+                return None
+        else:
+            base = Style(None, None, None, None, None, None, None, self.line)
+        changes = {}
+        for key in ('bold', 'underline'):
+            if key in value:
+                if not isinstance(value[key], bool):
+                    self.problem(where, f'{key} must be true or false')
+                changes[key] = value[key]
+        for key in ('size', 'before', 'after'):
+            if key in value:
+                if not _is_number(value[key]) or value[key] < 0:
+                    self.problem(where, f'{key} must be a number of points')
+                    continue
+                # Sizes are in half-points, spacing in twips.
+                changes[key] = round(value[key] * 2) if key == 'size' else round(value[key] * 20)
+        if 'color' in value:
+            color = value['color']
+            if not _is_color(color):
+                self.problem(where, 'color must be six hex digits')
+            changes['color'] = color
+        if 'align' in value:
+            if value['align'] not in ALIGNMENTS:
+                self.problem(where, f'align must be one of {", ".join(ALIGNMENTS)}')
+            changes['align'] = value['align']
+        return base._replace(**changes)
+
+    def text(self, value, where, slots):
+        if not isinstance(value, str):
+            self.problem(where, 'text must be a string')
+            return ''
+        if value.startswith('$$'):
+            return value[1:]
+        if value.startswith('$'):
+            if value[1:] not in slots:
+                self.problem(where, f'unknown slot "{value}" (here: {", ".join("$" + s for s in slots)})')
+            return Slot(value[1:])
+        return value
+
+    def cell(self, value, columns, start, where, slots):
+        if isinstance(value, str):
+            value = {'text': value}
+        if not isinstance(value, dict):
+            self.problem(where, 'a cell is a string or an object')
+            return None
+        unknown = set(value) - {'text', 'style', 'span', 'valign', 'extract'}
+        if unknown:
+            self.problem(where, f'unknown cell keys {", ".join(sorted(unknown))}')
+        span = value.get('span', 1)
+        if not isinstance(span, int) or span < 1:
+            self.problem(where, 'span must be a positive integer')
+            span = 1
+        if value.get('valign', 'top') not in ('top', 'center'):
+            self.problem(where, 'valign must be "top" or "center"')
+        extract = value.get('extract')
+        if extract is not None and not (isinstance(extract, str) and extract.isidentifier()):
+            self.problem(where, 'extract must be a field name')
+        style = self.style(value.get('style', DEFAULT_CELL_STYLE), where)
+        texts = value.get('text', '')
+        paragraphs = []
+        for i, item in enumerate(texts if isinstance(texts, list) else [texts]):
+            here = f'{where}.text[{i}]' if isinstance(texts, list) else where
+            if isinstance(item, dict):
+                paragraphs.append(Paragraph(
+                    self.text(item.get('text', ''), here, slots),
+                    self.style(item['style'], here) if 'style' in item else style,
+                ))
+            else:
+                paragraphs.append(Paragraph(self.text(item, here, slots), style))
+        if not paragraphs:
+            self.problem(where, 'a cell needs at least one paragraph')
+        return Cell(
+            tuple(paragraphs), sum(columns[start:start + span]), span, value.get('valign') == 'center', extract
+        )
+
+    def row(self, value, columns, where, slots):
+        if not isinstance(value, list):
+            self.problem(where, 'a row is a list of cells')
+            return None
+        cells = []
+        start = 0
+        for i, item in enumerate(value):
+            cell = self.cell(item, columns, start, f'{where}[{i}]', slots)
+            if cell is not None:
+                cells.append(cell)
+                start += cell.span
+        if start != len(columns):
+            self.problem(where, f'cells span {start} columns, the table has {len(columns)}')
+        dynamic = any(isinstance(p.text, Slot) for cell in cells for p in cell.paragraphs)
+        return Row(tuple(cells), dynamic)
+
+    def border(self, value, where):
+        """Return (size in eighths of a point, colour) for a table border object."""
+        if not isinstance(value, dict):
+            self.problem(where, 'border must be an object')
+            return None
+        unknown = set(value) - {'size', 'color'}
+        if unknown:
+            self.problem(where, f'unknown border keys {", ".join(sorted(unknown))}')
+        size, color = value.get('size', 4), value.get('color', '000000')
+        if not isinstance(size, int) or isinstance(size, bool) or not 2 <= size <= 96:
+            self.problem(where, 'border size must be a whole number of eighths of a point, 2 to 96')
+        if not _is_color(color):
+            self.problem(where, 'border color must be six hex digits')
+        return size, color
+
+    def table(self, value, where, page, margins):
+        if 'columns_cm' in value:
+            widths = value['columns_cm']
+            if not (isinstance(widths, list) and widths and all(_is_number(cm) and cm > 0 for cm in widths)):
+                self.problem(where, 'columns_cm must be a list of positive widths in cm')
+                return None
+            columns = tuple(_twips(cm) for cm in widths)
+        else:
+            # An even split of the text width, as python-docx gives a new table.
+            count = value.get('columns', 1)
+            if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+                self.problem(where, 'columns must be a positive integer')
+                return None
+            text_width = int(page[0] * EMU_PER_CM) - int(margins['left'] * EMU_PER_CM) - int(margins['right'] * EMU_PER_CM)
+            columns = (round(text_width // count / EMU_PER_TWIP),) * count
+        border = value.get('border')
+        if border is not None:
+            border = self.border(border, f'{where}.border')
+        if value.get('align') not in (None,) + TABLE_ALIGNMENTS:
+            self.problem(where, f'align must be one of {", ".join(TABLE_ALIGNMENTS)}')
+        tenant_slots = tuple(PROFILE_FIELDS)
+        rows = []
+        for i, item in enumerate(value.get('rows', [])):
+            here = f'{where}.rows[{i}]'
+            if isinstance(item, dict):
+                group = item.get('repeat')
+                if group not in PARTY_GROUPS:
+                    self.problem(here, f'repeat must be one of {", ".join(PARTY_GROUPS)}')
+                    continue
+                if group in self.groups:
+                    self.problem(here, f'"{group}" is repeated twice')
+                self.groups.add(group)
+                block_rows = [
+                    self.row(row, columns, f'{here}.rows[{j}]', tenant_slots + PARTY_SLOTS)
+                    for j, row in enumerate(item.get('rows', []))
+                ]
+                if not block_rows:
+                    self.problem(here, 'a repeated block needs rows')
+                rows.append(Block(group, tuple(row for row in block_rows if row is not None)))
+            else:
+                row = self.row(item, columns, here, tenant_slots)
+                if row is not None:
+                    rows.append(row)
+        return Table(columns, value.get('align'), border, tuple(rows))
+
+    def compile(self):
+        spec = self.spec
+        page_spec = spec.get('page', {})
+        margins = {'top': 2.54, 'right': 2.54, 'bottom': 2.54, 'left': 2.54, **page_spec.get('margins_cm', {})}
+        page_cm = (page_spec.get('width_cm', 21.59), page_spec.get('height_cm', 27.94))
+        body = []
+        for i, item in enumerate(spec.get('body', [])):
+            where = f'body[{i}]'
+            if isinstance(item, dict) and 'paragraph' in item:
+                body.append(Paragraph(
+                    self.text(item['paragraph'], where, tuple(PROFILE_FIELDS)), self.style(item.get('style', {}), where)
+                ))
+            elif isinstance(item, dict) and isinstance(item.get('table'), dict):
+                body.append(self.table(item['table'], where, page_cm, margins))
+            else:
+                self.problem(where, 'expected {"paragraph": ...} or {"table": {...}}')
+        if self.problems:
+            raise LayoutError(self.problems)
+        return Plan(
+            spec_hash(spec),
+            spec.get('font', 'Times New Roman'),
+            tuple(_twips(cm) for cm in page_cm),
+            tuple(_twips(margins[side]) for side in ('top', 'right', 'bottom', 'left')),
+            tuple(body),
+        )
+
+
+_plans = {}
+
+
+def compile_spec(spec):
+    """Return the Plan for a layout spec, compiled once per spec hash.
+
+    Raises LayoutError listing every problem in the spec.
+    """
+    key = spec_hash(spec)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = _Compiler(spec).compile()
+    return plan
+
+
+@lru_cache(maxsize=None)
+def load_plan(path=LAYOUT_PATH):
+    """Read and compile the layout spec at path, once per process."""
+    with open(path, encoding='utf-8') as f:
+        return compile_spec(json.load(f))
+
+
+def main():
+    import time
+
+    path = sys.argv[1] if len(sys.argv) > 1 else LAYOUT_PATH
+    started = time.perf_counter()
+    try:
+        plan = load_plan(path)
+    except (OSError, ValueError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    elapsed = (time.perf_counter() - started) * 1000
+    tables = [item for item in plan.body if isinstance(item, Table)]
+    print(f'{path}\t{plan.spec_hash}\t{len(plan.body)} body items, {len(tables)} tables, '
+          f'loaded and compiled in {elapsed:.2f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
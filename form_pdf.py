@@ -0,0 +1,485 @@
+"""
+Native PDF output for Form A.
+
+Lays out a rendered word/document.xml (paragraphs, bordered tables with
+merged cells, bold/underlined/coloured runs, page size and margins)
+and writes it as a small PDF using the standard Times-Roman and
+Times-Bold fonts, so no office suite or PDF library is needed. Those
+fonts only cover Windows-1252, so text outside it (Devanagari, most
+diacritics beyond Latin-1) is refused with UnsupportedCharacters rather
+than replaced; such forms can still be generated as .docx. The
+layout follows whatever create_mediation_form() produced, filled or
+blank, rather than a separate hand-written copy of the form.
+"""
+
+import re
+import zlib
+
+from lxml import etree
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+# Advance widths (1/1000 em) of the standard 14 Times fonts for ASCII 32-126.
+_TIMES_ROMAN_ASCII = (
+    250, 333, 408, 500, 500, 833, 778, 180, 333, 333, 500, 564, 250, 333, 250, 278,
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 278, 278, 564, 564, 564, 444,
+    921, 722, 667, 667, 722, 611, 556, 722, 722, 333, 389, 722, 611, 889, 722, 722,
+    556, 722, 667, 556, 611, 722, 722, 944, 722, 722, 611, 333, 278, 333, 469, 500,
+    333, 444, 500, 444, 500, 444, 333, 500, 500, 278, 278, 500, 278, 778, 500, 500,
+    500, 500, 333, 389, 278, 500, 500, 722, 500, 500, 444, 480, 200, 480, 541,
+)
+_TIMES_BOLD_ASCII = (
+    250, 333, 555, 500, 500, 1000, 833, 278, 333, 333, 500, 570, 250, 333, 250, 278,
+    500, 500, 500, 500, 500, 500, 500, 500, 500, 500, 333, 333, 570, 570, 570, 500,
+    930, 722, 667, 722, 722, 667, 611, 778, 778, 389, 500, 778, 667, 944, 722, 778,
+    611, 778, 722, 556, 667, 722, 722, 1000, 722, 722, 667, 333, 278, 333, 581, 500,
+    333, 500, 556, 444, 556, 444, 333, 500, 556, 278, 333, 556, 278, 833, 556, 500,
+    556, 556, 444, 389, 333, 556, 500, 722, 500, 500, 444, 394, 220, 394, 520,
+)
+
+
+def _widths(ascii_widths):
+    widths = {chr(32 + i): w for i, w in enumerate(ascii_widths)}
+    widths['…'] = 1000  # ellipsis, used in the dispute heading
+    widths['–'] = 500
+    widths['—'] = 1000
+    widths['‘'] = widths['’'] = 333
+    widths['“'] = widths['”'] = 444 if ascii_widths is _TIMES_ROMAN_ASCII else 500
+    return widths
+
+
+FONTS = {
+    False: ('F1', 'Times-Roman', _widths(_TIMES_ROMAN_ASCII)),
+    True: ('F2', 'Times-Bold', _widths(_TIMES_BOLD_ASCII)),
+}
+
+LINE_HEIGHT = 1.15   # Times single line height in em
+ASCENT = 0.891
+CELL_PADDING = 5.4   # Word's default left/right cell margin in points
+BORDER_WIDTH = 0.5
+TOKEN_RE = re.compile(r'\S+|\s+')
+
+
+def _twips(value, default=0):
+    return int(value) / 20 if value is not None else default
+
+
+def _on(element, default=False):
+    """Return whether a w:b / w:u style toggle element is switched on."""
+    if element is None:
+        return default
+    value = element.get(f'{W}val')
+    return value not in ('0', 'false', 'none')
+
+
+def _parse_paragraph(p):
+    ppr = p.find(f'{W}pPr')
+    align, before, after, line = 'left', 0.0, 0.0, 1.0
+    if ppr is not None:
+        jc = ppr.find(f'{W}jc')
+        if jc is not None:
+            align = jc.get(f'{W}val')
+        spacing = ppr.find(f'{W}spacing')
+        if spacing is not None:
+            before = _twips(spacing.get(f'{W}before'))
+            after = _twips(spacing.get(f'{W}after'))
+            if spacing.get(f'{W}line') and spacing.get(f'{W}lineRule', 'auto') == 'auto':
+                line = int(spacing.get(f'{W}line')) / 240
+    runs = []
+    for r in p.iter(f'{W}r'):
+        rpr = r.find(f'{W}rPr')
+        bold = underline = False
+        size, color = 11.0, None
+        if rpr is not None:
+            bold = _on(rpr.find(f'{W}b'))
+            underline = _on(rpr.find(f'{W}u'))
+            sz = rpr.find(f'{W}sz')
+            if sz is not None:
+                size = int(sz.get(f'{W}val')) / 2
+            c = rpr.find(f'{W}color')
+            if c is not None and c.get(f'{W}val') not in (None, 'auto', '000000'):
+                color = c.get(f'{W}val')
+        text = ''.join(
+            (t.text or '') if t.tag == f'{W}t' else '\t' if t.tag == f'{W}tab' else ' '
+            for t in r if t.tag in (f'{W}t', f'{W}tab', f'{W}br')
+        )
+        runs.append((text, bold, underline, size, color))
+    return ('p', align, before, after, line, runs)
+
+
+def _parse_table(tbl):
+    tblpr = tbl.find(f'{W}tblPr')
+    jc = tblpr.find(f'{W}jc') if tblpr is not None else None
+    align = jc.get(f'{W}val') if jc is not None else 'left'
+    grid = [_twips(col.get(f'{W}w')) for col in tbl.find(f'{W}tblGrid')]
+    rows = []
+    for tr in tbl.iter(f'{W}tr'):
+        cells = []
+        for tc in tr.iter(f'{W}tc'):
+            tcpr = tc.find(f'{W}tcPr')
+            span, valign = 1, 'top'
+            if tcpr is not None:
+                gs = tcpr.find(f'{W}gridSpan')
+                if gs is not None:
+                    span = int(gs.get(f'{W}val'))
+                va = tcpr.find(f'{W}vAlign')
+                if va is not None:
+                    valign = va.get(f'{W}val')
+            cells.append((span, valign, [_parse_paragraph(p) for p in tc.iter(f'{W}p')]))
+        rows.append(cells)
+    return ('tbl', align, grid, rows)
+
+
+def parse_document(document_xml):
+    """Return (page geometry, blocks) for a word/document.xml string or bytes."""
+    if isinstance(document_xml, str):
+        document_xml = document_xml.encode('utf-8')
+    body = etree.fromstring(document_xml).find(f'{W}body')
+    blocks = []
+    page = {'width': 612.0, 'height': 792.0, 'top': 72.0, 'bottom': 72.0, 'left': 72.0, 'right': 72.0}
+    for child in body:
+        if child.tag == f'{W}p':
+            blocks.append(_parse_paragraph(child))
+        elif child.tag == f'{W}tbl':
+            blocks.append(_parse_table(child))
+        elif child.tag == f'{W}sectPr':
+            size = child.find(f'{W}pgSz')
+            if size is not None:
+                page['width'] = _twips(size.get(f'{W}w'), page['width'])
+                page['height'] = _twips(size.get(f'{W}h'), page['height'])
+            margins = child.find(f'{W}pgMar')
+            if margins is not None:
+                for side in ('top', 'bottom', 'left', 'right'):
+                    page[side] = _twips(margins.get(f'{W}{side}'), page[side])
+    return page, blocks
+
+
+def _text_width(text, bold, size):
+    widths = FONTS[bold][2]
+    return sum(widths.get(ch, 500) for ch in text) * size / 1000
+
+
+def _wrap(runs, max_width):
+    """Break runs into lines that fit max_width.
+
+    Returns (font size, lines), each line being (width, segments).
+    """
+    lines, line, width = [], [], 0.0
+    line_size = max((run[3] for run in runs), default=11.0)
+
+    def finish():
+        while line and line[-1][0].isspace():
+            line.pop()
+        lines.append((sum(seg[5] for seg in line), list(line)))
+
+    for text, bold, underline, size, color in runs:
+        for token in TOKEN_RE.findall(text.replace('\t', '    ')):
+            token_width = _text_width(token, bold, size)
+            if token.isspace():
+                if line:
+                    line.append((token, bold, underline, size, color, token_width))
+                    width += token_width
+                continue
+            if line and width + token_width > max_width:
+                finish()
+                line, width = [], 0.0
+            while token_width > max_width and len(token) > 1:
+                # Hard-break a word longer than the whole line.
+                cut = len(token)
+                while cut > 1 and _text_width(token[:cut], bold, size) > max_width:
+                    cut -= 1
+                line.append((token[:cut], bold, underline, size, color, _text_width(token[:cut], bold, size)))
+                finish()
+                line, width = [], 0.0
+                token = token[cut:]
+                token_width = _text_width(token, bold, size)
+            line.append((token, bold, underline, size, color, token_width))
+            width += token_width
+    finish()
+    return line_size, lines
+
+
+class UnsupportedCharacters(ValueError):
+    """Raised when text uses characters the built-in Times fonts cannot draw."""
+
+    def __init__(self, problems):
+        super().__init__('; '.join(problems))
+        self.problems = problems
+
+
+def unsupported_characters(text):
+    """Return the distinct characters of text outside the fonts' WinAnsi encoding, in order."""
+    try:
+        text.encode('cp1252')
+        return []
+    except UnicodeEncodeError:
+        pass
+    missing = []
+    for ch in text:
+        if ch not in missing:
+            try:
+                ch.encode('cp1252')
+            except UnicodeEncodeError:
+                missing.append(ch)
+    return missing
+
+
+def _describe(characters):
+    return ', '.join(f'"{ch}" (U+{ord(ch):04X})' for ch in characters)
+
+
+def _strings(value, path):
+    if isinstance(value, str):
+        yield path, value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from _strings(item, f'{path}.{key}' if path else str(key))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            yield from _strings(item, f'{path}[{index}]')
+
+
+def field_problems(fields):
+    """Return a problem for each field value (nested party values included) a PDF cannot show."""
+    problems = []
+    for path, text in _strings(fields, ''):
+        missing = unsupported_characters(text)
+        if missing:
+            problems.append(f'{path}: {_describe(missing)} cannot be drawn with the PDF fonts')
+    return problems
+
+
+def drawable_cases(cases, errors):
+    """Yield the (row_number, fields) cases a PDF can show; append the others to errors."""
+    for number, fields in cases:
+        problems = field_problems(fields)
+        if problems:
+            errors.append((number, '; '.join(problems)))
+        else:
+            yield number, fields
+
+
+def _check_text(blocks):
+    """Raise UnsupportedCharacters if any run of the parsed document cannot be drawn."""
+    paragraphs = []
+    for block in blocks:
+        if block[0] == 'tbl':
+            paragraphs.extend(p for cells in block[3] for _, _, cell in cells for p in cell)
+        else:
+            paragraphs.append(block)
+    missing = unsupported_characters(''.join(run[0] for p in paragraphs for run in p[5]))
+    if missing:
+        raise UnsupportedCharacters([f'{_describe(missing)} cannot be drawn with the PDF fonts'])
+
+
+def _escape(text):
+    data = text.encode('cp1252')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class _Canvas:
+    """Collects PDF content-stream operators page by page."""
+
+    def __init__(self, page):
+        self.page = page
+        self.pages = [[]]
+
+    @property
+    def ops(self):
+        return self.pages[-1]
+
+    def new_page(self):
+        self.pages.append([])
+
+    def text(self, x, y, segments):
+        """Draw line segments starting at x with the baseline y points from the top."""
+        baseline = self.page['height'] - y
+        for text, bold, underline, size, color, width in segments:
+            if color:
+                r, g, b = (int(color[i:i + 2], 16) / 255 for i in (0, 2, 4))
+                self.ops.append(b'%.3f %.3f %.3f rg' % (r, g, b))
+            self.ops.append(b'BT /%s %g Tf %.2f %.2f Td (%s) Tj ET' % (
+                FONTS[bold][0].encode(), size, x, baseline, _escape(text)))
+            if underline:
+                self.ops.append(b'%.2f w %.2f %.2f m %.2f %.2f l S' % (
+                    size / 20, x, baseline - size * 0.12, x + width, baseline - size * 0.12))
+            if color:
+                self.ops.append(b'0 0 0 rg')
+            x += width
+
+    def rect(self, x, y, width, height):
+        self.ops.append(b'%.2f w %.2f %.2f %.2f %.2f re S' % (
+            BORDER_WIDTH, x, self.page['height'] - y - height, width, height))
+
+
+def _paragraph_height(block, width):
+    _, _, before, after, line, runs = block
+    size, lines = _wrap(runs, width)
+    return before + after + len(lines) * size * LINE_HEIGHT * line, lines
+
+
+def _draw_paragraph(canvas, block, x, y, width, lines=None):
+    _, align, before, after, line, runs = block
+    size = max((run[3] for run in runs), default=11.0)
+    if lines is None:
+        size, lines = _wrap(runs, width)
+    step = size * LINE_HEIGHT * line
+    y += before
+    for line_width, segments in lines:
+        if align == 'center':
+            offset = (width - line_width) / 2
+        elif align in ('right', 'end'):
+            offset = width - line_width
+        else:
+            offset = 0.0
+        canvas.text(x + offset, y + ASCENT * size + (step - size * LINE_HEIGHT) / 2, segments)
+        y += step
+    return y + after
+
+
+def _line_fragments(paragraphs, heights):
+    """Return a cell's content as (height, paragraph, lines) pieces of one line each.
+
+    A paragraph's spacing before and after stays with its first and last
+    line, so the pieces drawn in order look like the whole paragraphs.
+    """
+    fragments = []
+    for paragraph, (height, lines) in zip(paragraphs, heights):
+        kind, align, before, after, line, runs = paragraph
+        if not lines:
+            fragments.append((height, paragraph, lines))
+            continue
+        step = max((run[3] for run in runs), default=11.0) * LINE_HEIGHT * line
+        for index, entry in enumerate(lines):
+            space_before = before if index == 0 else 0.0
+            space_after = after if index == len(lines) - 1 else 0.0
+            piece = (kind, align, space_before, space_after, line, runs)
+            fragments.append((space_before + step + space_after, piece, [entry]))
+    return fragments
+
+
+def _split_row(canvas, laid_out, y, page):
+    """Draw a row taller than a page, continuing each cell's lines on the next pages; return y below it.
+
+    Each page gets as many lines of every cell as fit, top aligned, with
+    the cell borders repeated around every slice of the row.
+    """
+    bottom = page['height'] - page['bottom']
+    pending = [_line_fragments(paragraphs, heights) for _, _, _, paragraphs, heights in laid_out]
+    while True:
+        slices = []
+        for fragments in pending:
+            taken, used = 0, 0.0
+            while taken < len(fragments) and y + used + fragments[taken][0] <= bottom:
+                used += fragments[taken][0]
+                taken += 1
+            if not taken and fragments and y == page['top']:
+                taken = 1  # a single line taller than the page is drawn past the margin rather than lost
+            slices.append(fragments[:taken])
+        if any(slices):
+            height = max(sum(f[0] for f in fragments) for fragments in slices)
+            for (x, width, _, _, _), fragments in zip(laid_out, slices):
+                canvas.rect(x, y, width, height)
+                cy = y
+                for _, paragraph, lines in fragments:
+                    cy = _draw_paragraph(canvas, paragraph, x + CELL_PADDING, cy, width - 2 * CELL_PADDING, lines)
+            y += height
+            pending = [fragments[len(done):] for fragments, done in zip(pending, slices)]
+            if not any(pending):
+                return y
+        canvas.new_page()
+        y = page['top']
+
+
+def _layout_table(canvas, block, y, page):
+    _, align, grid, rows = block
+    content_width = page['width'] - page['left'] - page['right']
+    table_width = sum(grid)
+    x0 = page['left'] + (content_width - table_width) / 2 if align == 'center' else page['left']
+    for cells in rows:
+        laid_out = []
+        column = 0
+        for span, valign, paragraphs in cells:
+            width = sum(grid[column:column + span])
+            inner = width - 2 * CELL_PADDING
+            heights = [_paragraph_height(p, inner) for p in paragraphs]
+            laid_out.append((x0 + sum(grid[:column]), width, valign, paragraphs, heights))
+            column += span
+        row_height = max((sum(h for h, _ in cell[4]) for cell in laid_out), default=0.0)
+        if row_height > page['height'] - page['bottom'] - page['top']:
+            y = _split_row(canvas, laid_out, y, page)
+            continue
+        if y + row_height > page['height'] - page['bottom'] and y > page['top']:
+            canvas.new_page()
+            y = page['top']
+        for x, width, valign, paragraphs, heights in laid_out:
+            canvas.rect(x, y, width, row_height)
+            content = sum(h for h, _ in heights)
+            cy = y + (row_height - content) / 2 if valign == 'center' else y
+            for paragraph, (_, lines) in zip(paragraphs, heights):
+                cy = _draw_paragraph(canvas, paragraph, x + CELL_PADDING, cy, width - 2 * CELL_PADDING, lines)
+        y += row_height
+    return y
+
+
+def layout(page, blocks):
+    """Draw the blocks onto pages and return the canvas."""
+    canvas = _Canvas(page)
+    width = page['width'] - page['left'] - page['right']
+    y = page['top']
+    for block in blocks:
+        if block[0] == 'tbl':
+            y = _layout_table(canvas, block, y, page)
+            continue
+        height, lines = _paragraph_height(block, width)
+        if y + height > page['height'] - page['bottom'] and y > page['top']:
+            canvas.new_page()
+            y = page['top']
+        y = _draw_paragraph(canvas, block, page['left'], y, width, lines)
+    return canvas
+
+
+def write_pdf(canvas):
+    """Serialize the canvas pages as PDF bytes."""
+    page = canvas.page
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # page tree, filled in once the page objects are numbered
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Times-Roman /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Times-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    kids = []
+    for ops in canvas.pages:
+        content = zlib.compress(b'\n'.join(ops))
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(content), content))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] '
+            b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+            % (page['width'], page['height'], len(objects))
+        )
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids))
+
+    out = [b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n']
+    offsets = []
+    position = len(out[0])
+    for number, body in enumerate(objects, start=1):
+        chunk = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        offsets.append(position)
+        out.append(chunk)
+        position += len(chunk)
+    out.append(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    out.extend(b'%010d 00000 n \n' % offset for offset in offsets)
+    out.append(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, position))
+    return b''.join(out)
+
+
+def document_to_pdf(document_xml):
+    """Return PDF bytes for a (filled or blank) Form A word/document.xml.
+
+    Raises UnsupportedCharacters rather than drawing text the standard
+    fonts have no glyphs for (anything outside Windows-1252).
+    """
+    page, blocks = parse_document(document_xml)
+    _check_text(blocks)
+    return write_pdf(layout(page, blocks))
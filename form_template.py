@@ -0,0 +1,388 @@
+"""
+Precompiled Form A template.
+
+The blank form produced by create_mediation_form() is compiled once, at
+startup, in three steps:
+
+1. normalize_tags() makes every {{ }} and {% %} tag contiguous. A tag that
+   python-docx split across runs or paragraphs (the defendant address
+   writes "{%" in one paragraph and "endif %}" in the next) is moved whole
+   into the w:t where it starts; the runs it spanned keep only the text
+   outside it.
+2. Every tag is linted: it must be a {{ field }} or an if/else/endif over
+   a field from the schema, and the conditionals must be balanced.
+   TemplateError lists every problem, so a malformed template stops the
+   app from starting instead of failing on a request.
+3. The XML becomes a flat list of ops (static text, field values,
+   conditional jumps) that render_xml() walks once, front to back.
+
+The other package parts are kept pre-compressed in a DocxPackage, so
+filling a form is that one walk plus deflating word/document.xml.
+
+The applicant and defendant rows are repeatable party blocks, marked in
+the blank form by the bookmarks applicant_1 and defendant_1. Each block
+is compiled into its own ops and emitted once per entry of the
+'applicants' or 'defendants' list, so a form with thousands of parties
+is still one linear pass.
+"""
+
+import re
+import zipfile
+from io import BytesIO
+from xml.sax.saxutils import escape, unescape
+
+from docx_package import DocxPackage
+from schema import FIELDS
+
+DOCUMENT_PART = 'word/document.xml'
+
+TEXT_NODE_RE = re.compile(r'<w:t(?: [^>]*)?>([^<]*)</w:t>')
+TAG_OPEN_RE = re.compile(r'\{[{%]')
+TAG_RE = re.compile(r'\{\{(.*?)\}\}|\{%(.*?)%\}', re.DOTALL)
+# {% if name %} or the generator's {% if name and name != "" %}
+IF_RE = re.compile(r'if\s+(\w+)(?:\s+and\s+\1\s*!=\s*(?:""|\'\'))?')
+BOOKMARK_START_RE = re.compile(r'<w:bookmarkStart w:id="(\d+)" w:name="([a-z]+)_1"/>')
+ROW_START_RE = re.compile(r'<w:tr[ >]')
+
+# List field: (bookmark prefix, section number cell, address heading).
+PARTY_GROUPS = {
+    'applicants': ('applicant', '1', 'Address and contact details of Applicant'),
+    'defendants': ('defendant', None, 'Address and contact details of Defendant/s'),
+}
+PAGE_BREAK_PPR = '<w:pPr><w:pageBreakBefore/></w:pPr>'
+# Characters XML 1.0 does not allow: C0 controls other than tab/newline/CR, lone
+# surrogates (which JSON input can carry, and which cannot be encoded) and U+FFFE/U+FFFF.
+INVALID_XML_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+class TemplateError(ValueError):
+    """Raised when the template has unclosed, unbalanced or unknown tags."""
+
+    def __init__(self, problems):
+        super().__init__('invalid template: ' + '; '.join(problems))
+        self.problems = problems
+
+
+def xml_text(value):
+    """Convert a field value to text that is safe inside <w:t>."""
+    if value is None:
+        return ''
+    return escape(INVALID_XML_CHARS_RE.sub('', str(value)))
+
+
+def party_labels(group, index, count):
+    """Return (section number, heading) for party index (1-based) of count.
+
+    A single party keeps the labels of the original form; with several,
+    each block is numbered, e.g. "1.2" and "... of Applicant 2".
+    """
+    _, number, heading = PARTY_GROUPS[group]
+    if count == 1:
+        return number, heading
+    return number and f'{number}.{index}', f'{heading.removesuffix("/s")} {index}'
+
+
+def party_lists(fields):
+    """Return {group: [party fields]} for the party lists given in fields.
+
+    Raises ValueError when a list is malformed.
+    """
+    lists = {}
+    for group in PARTY_GROUPS:
+        parties = fields.get(group)
+        if parties is None:
+            continue
+        if not isinstance(parties, list) or not all(isinstance(party, dict) for party in parties):
+            raise ValueError(f"'{group}' must be a list of objects")
+        if parties:
+            lists[group] = parties
+    return lists
+
+
+def normalize_tags(xml):
+    """Return xml with every template tag contiguous inside the w:t where it starts.
+
+    Raises TemplateError for a tag that is never closed.
+    """
+    nodes = list(TEXT_NODE_RE.finditer(xml))
+    texts = [m.group(1) for m in nodes]
+    view = ''.join(texts)
+    owner = [i for i, text in enumerate(texts) for _ in text]
+    moved = False
+    pos = 0
+    while True:
+        m = TAG_OPEN_RE.search(view, pos)
+        if m is None:
+            break
+        close = view.find('}}' if m.group() == '{{' else '%}', m.end())
+        if close == -1:
+            raise TemplateError([f'unclosed tag {unescape(view[m.start():m.start() + 40])!r}'])
+        end = close + 2
+        first = owner[m.start()]
+        if owner[end - 1] != first:
+            owner[m.start():end] = [first] * (end - m.start())
+            moved = True
+        pos = end
+    if not moved:
+        return xml
+
+    new_texts = [[] for _ in texts]
+    for char, i in zip(view, owner):
+        new_texts[i].append(char)
+    out = []
+    prev = 0
+    for m, chars in zip(nodes, new_texts):
+        text = ''.join(chars)
+        opening = xml[m.start():m.start(1)]
+        if text != text.strip() and 'xml:space' not in opening:
+            opening = '<w:t xml:space="preserve">'
+        out.append(xml[prev:m.start()])
+        out.append(opening)
+        out.append(text)
+        prev = m.end(1)
+    out.append(xml[prev:])
+    return ''.join(out)
+
+
+def _tag(m):
+    """Return (kind, text) for a TAG_RE match: kind is 'var' or 'stmt'."""
+    if m.group(1) is not None:
+        return 'var', unescape(m.group(1), {'&quot;': '"', '&apos;': "'"}).strip()
+    return 'stmt', unescape(m.group(2), {'&quot;': '"', '&apos;': "'"}).strip()
+
+
+def compile_ops(xml, extra=()):
+    """Lint the tags in xml and compile it into a flat list of ops.
+
+    Ops are ('text', xml), ('var', name), ('if', name, jump to when the
+    field is empty) and ('jump', target); extra holds already-located
+    (start, end, op) tokens whose spans are not scanned for tags.
+    Raises TemplateError listing every problem found.
+    """
+    tokens = sorted(extra, key=lambda token: token[:2])
+    covered = [(start, end) for start, end, _ in tokens]
+    for m in TAG_RE.finditer(xml):
+        if not any(start <= m.start() < end for start, end in covered):
+            tokens.append((m.start(), m.end(), _tag(m)))
+    tokens.sort(key=lambda token: token[:2])
+
+    ops, problems, stack = [], [], []
+    pos = 0
+    for start, end, token in tokens:
+        if start > pos:
+            ops.append(('text', xml[pos:start]))
+        pos = end
+        kind = token[0]
+        if kind == 'var':
+            if token[1] not in FIELDS:
+                problems.append(f'unknown field {{{{ {token[1]} }}}}')
+            ops.append(token)
+        elif kind != 'stmt':
+            ops.append(token)
+        elif (m := IF_RE.fullmatch(token[1])) is not None:
+            if m.group(1) not in FIELDS:
+                problems.append(f'unknown field in {{% {token[1]} %}}')
+            stack.append([len(ops), None, token[1]])
+            ops.append(['if', m.group(1), None])
+        elif token[1] == 'else':
+            if not stack:
+                problems.append('{% else %} without a matching {% if %}')
+                continue
+            if stack[-1][1] is not None:
+                problems.append(f'second {{% else %}} in {{% {stack[-1][2]} %}}')
+                continue
+            stack[-1][1] = len(ops)
+            ops.append(['jump', None])
+            ops[stack[-1][0]][2] = len(ops)
+        elif token[1] == 'endif':
+            if not stack:
+                problems.append('{% endif %} without a matching {% if %}')
+                continue
+            if_index, jump_index, _ = stack.pop()
+            if jump_index is None:
+                ops[if_index][2] = len(ops)
+            else:
+                ops[jump_index][1] = len(ops)
+        else:
+            problems.append(f'unknown tag {{% {token[1]} %}}')
+    if pos < len(xml):
+        ops.append(('text', xml[pos:]))
+    problems.extend(f'{{% {condition} %}} is never closed' for _, _, condition in stack)
+    if problems:
+        raise TemplateError(problems)
+    return [tuple(op) for op in ops]
+
+
+def _run(ops, fields, out, labels=None, block=None):
+    """Append the output of ops for fields to out in one pass.
+
+    labels fills the per-party ops of a block; block(op, out) renders a
+    nested party block.
+    """
+    pc = 0
+    end = len(ops)
+    while pc < end:
+        op = ops[pc]
+        kind = op[0]
+        if kind == 'text':
+            out.append(op[1])
+        elif kind == 'var':
+            out.append(xml_text(fields.get(op[1])))
+        elif kind == 'if':
+            if not fields.get(op[1]):
+                pc = op[2]
+                continue
+        elif kind == 'jump':
+            pc = op[1]
+            continue
+        elif kind == 'block':
+            block(op, out)
+        else:
+            out.append(labels[kind])
+        pc += 1
+
+
+class CompiledTemplate:
+    """Form A document compiled into a flat list of render ops."""
+
+    def __init__(self, docx_bytes):
+        with zipfile.ZipFile(BytesIO(docx_bytes)) as package:
+            document_xml = package.read(DOCUMENT_PART).decode('utf-8')
+        self.package = DocxPackage(docx_bytes, dynamic_parts=(DOCUMENT_PART,))
+        document_xml = normalize_tags(document_xml)
+        self.ops = compile_ops(document_xml, self._party_blocks(document_xml))
+        names = set()
+        for op in self.ops:
+            if op[0] == 'block':
+                names.add(op[1])
+                names.update(o[1] for o in op[2] if o[0] in ('var', 'if'))
+            elif op[0] in ('var', 'if'):
+                names.add(op[1])
+        self.fields = sorted(names)
+        # Offsets of the body content inside the first and last text ops,
+        # and the start of the body for forms that must begin on a new page.
+        first, last = self.ops[0][1], self.ops[-1][1]
+        head = first.index('<w:body>') + len('<w:body>')
+        tail = len(last) - last.rindex('<w:sectPr')
+        self._body_bounds = head, tail
+        body = first[head:]
+        if body.startswith('<w:p><w:pPr>'):
+            self._page_break_body = '<w:p><w:pPr><w:pageBreakBefore/>' + body[len('<w:p><w:pPr>'):]
+        else:
+            self._page_break_body = '<w:p>' + PAGE_BREAK_PPR + body[len('<w:p>'):]
+
+    @staticmethod
+    def _party_blocks(xml):
+        """Return (start, end, op) tokens for the rows of each bookmarked party block."""
+        prefixes = {prefix: group for group, (prefix, _, _) in PARTY_GROUPS.items()}
+        tokens = []
+        for m in BOOKMARK_START_RE.finditer(xml):
+            group = prefixes.get(m.group(2))
+            if group is None:
+                continue
+            end_tag = f'<w:bookmarkEnd w:id="{m.group(1)}"/>'
+            end_pos = xml.index(end_tag, m.end())
+            start = max(r.start() for r in ROW_START_RE.finditer(xml, 0, m.start()))
+            end = xml.index('</w:tr>', end_pos) + len('</w:tr>')
+            region = xml[start:end]
+            number, heading = party_labels(group, 1, 1)
+            labels = [
+                (m.start() - start, m.end() - start, ('bookmark_start',)),
+                (end_pos - start, end_pos - start + len(end_tag), ('bookmark_end',)),
+            ]
+            for label, op in ((heading, ('heading',)), (number, ('number',))):
+                if label is None:
+                    continue
+                for t in re.finditer(f'<w:t>({re.escape(escape(label))})</w:t>', region):
+                    labels.append((t.start(1), t.end(1), op))
+            tokens.append((start, end, ('block', group, compile_ops(region, labels))))
+        return tokens
+
+    def render_xml(self, fields):
+        """Return word/document.xml with the placeholders filled from fields.
+
+        'applicants' and 'defendants' may be lists of per-party field
+        objects; each party gets its own block. Without a list the single
+        block is filled from the top-level fields.
+        """
+        out = []
+        self._render_into(out, fields)
+        return ''.join(out)
+
+    def _render_into(self, out, fields, bookmark_id=0, bookmark_prefix=''):
+        """Append the filled document XML pieces to out; return the next bookmark id."""
+        lists = party_lists(fields)
+
+        def render_block(op, out):
+            nonlocal bookmark_id
+            _, group, ops = op
+            parties = lists.get(group, [fields])
+            name = bookmark_prefix + PARTY_GROUPS[group][0]
+            for position, party in enumerate(parties, start=1):
+                number, heading = party_labels(group, position, len(parties))
+                labels = {
+                    'bookmark_start': f'<w:bookmarkStart w:id="{bookmark_id}" w:name="{name}_{position}"/>',
+                    'bookmark_end': f'<w:bookmarkEnd w:id="{bookmark_id}"/>',
+                    'heading': escape(heading),
+                    'number': escape(number or ''),
+                }
+                _run(ops, party, out, labels)
+                bookmark_id += 1
+
+        _run(self.ops, fields, out, block=render_block)
+        return bookmark_id
+
+    def iter_merged_xml(self, records, notes=None):
+        """Yield word/document.xml for many filled forms as UTF-8 chunks, one per record.
+
+        Every form after the first starts on a new page, and bookmarks are
+        prefixed with form<N>_ so they stay unique. notes, a list that may
+        still grow while records are consumed, is printed on a final page.
+        """
+        head, tail = self._body_bounds
+        first_chunk = self.ops[0][1]
+        yield first_chunk[:head].encode('utf-8')
+        bookmark_id = 0
+        for number, fields in enumerate(records, start=1):
+            out = []
+            bookmark_id = self._render_into(out, fields, bookmark_id, f'form{number}_')
+            out[0] = (first_chunk[head:] if number == 1 else self._page_break_body)
+            out[-1] = out[-1][:-tail]
+            yield ''.join(out).encode('utf-8')
+        if notes:
+            yield ''.join(
+                f'<w:p>{PAGE_BREAK_PPR if i == 0 else ""}<w:r><w:t xml:space="preserve">{xml_text(line)}</w:t></w:r></w:p>'
+                for i, line in enumerate(notes)
+            ).encode('utf-8')
+        yield self.ops[-1][1][-tail:].encode('utf-8')
+
+    def render_merged(self, records, notes=None, level=None):
+        """Yield the bytes of one .docx holding a filled form per record."""
+        return self.package.iter_build(DOCUMENT_PART, self.iter_merged_xml(records, notes), level)
+
+    def render(self, fields, level=None):
+        """Return the bytes of a filled .docx package.
+
+        level is the zlib level for word/document.xml (1 = fastest,
+        9 = smallest); it defaults to DOCX_COMPRESSION_LEVEL.
+        """
+        document = self.render_xml(fields).encode('utf-8')
+        return self.package.build({DOCUMENT_PART: document}, level)
+
+
+def main():
+    """Compile the generator's blank form and report its fields, or exit 1 with the problems."""
+    import sys
+
+    import form_generator
+
+    try:
+        template = CompiledTemplate(form_generator.create_mediation_form().getvalue())
+    except TemplateError as exc:
+        print('\n'.join(exc.problems), file=sys.stderr)
+        sys.exit(1)
+    print(f'{len(template.ops)} ops, fields: {", ".join(template.fields)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""
+Form A written directly as WordprocessingML.
+
+form_generator runs the layout plan (see form_layout) through
+python-docx, where every run, paragraph_format setter and cell merge goes
+through proxy objects and lxml. This backend runs the same plan but
+writes word/document.xml as a string, joined from cached fragments: run
+and paragraph properties once per style, paragraphs once per text and
+style, and rows without slots once per plan. Every other package part is
+taken, still compressed, from the default template that python-docx
+itself starts from, through a DocxPackage, so python-docx is never
+imported.
+
+The result is structurally equivalent to form_generator's output: every
+part parses to the same canonical XML (python-docx only re-serializes
+the template parts it loads). differences() checks that, and
+
+    python form_xml.py [--applicants 1] [--defendants 1] [--repeat 20]
+
+runs the check and times both backends.
+"""
+
+import importlib.util
+import os
+import zipfile
+from functools import lru_cache
+from io import BytesIO
+
+from docx_package import DocxPackage
+from form_layout import Block, Table, load_plan, party_counts, party_values, resolve, tenant_values
+from form_template import DOCUMENT_PART, PARTY_GROUPS, xml_text
+from tenants import DEFAULT as DEFAULT_TENANT
+
+DOCUMENT_HEAD = (
+    "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+    '<w:document xmlns:wpc="http://schemas.microsoft.com/office/word/2010/wordprocessingCanvas"'
+    ' xmlns:mo="http://schemas.microsoft.com/office/mac/office/2008/main"'
+    ' xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"'
+    ' xmlns:mv="urn:schemas-microsoft-com:mac:vml" xmlns:o="urn:schemas-microsoft-com:office:office"'
+    ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+    ' xmlns:m="http://schemas.openxmlformats.org/officeDocument/2006/math" xmlns:v="urn:schemas-microsoft-com:vml"'
+    ' xmlns:wp14="http://schemas.microsoft.com/office/word/2010/wordprocessingDrawing"'
+    ' xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"'
+    ' xmlns:w10="urn:schemas-microsoft-com:office:word"'
+    ' xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    ' xmlns:w14="http://schemas.microsoft.com/office/word/2010/wordml"'
+    ' xmlns:wpg="http://schemas.microsoft.com/office/word/2010/wordprocessingGroup"'
+    ' xmlns:wpi="http://schemas.microsoft.com/office/word/2010/wordprocessingInk"'
+    ' xmlns:wne="http://schemas.microsoft.com/office/word/2006/wordml"'
+    ' xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape" mc:Ignorable="w14 wp14">'
+    '<w:body>'
+)
+SECTION_PROPERTIES = (
+    '<w:sectPr w:rsidR="00FC693F" w:rsidRPr="0006063C" w:rsidSect="00034616"><w:pgSz w:w="{}" w:h="{}"/>'
+    '<w:pgMar w:top="{}" w:right="{}" w:bottom="{}" w:left="{}" w:header="720" w:footer="720" w:gutter="0"/>'
+    '<w:cols w:space="720"/><w:docGrid w:linePitch="360"/></w:sectPr>'
+)
+TABLE_BORDER_EDGES = ('top', 'left', 'bottom', 'right', 'insideH', 'insideV')
+TABLE_LOOK = '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" w:noHBand="0" w:noVBand="1" w:val="04A0"/>'
+
+
+def _default_template_path():
+    """Return the path of python-docx's default.docx without importing python-docx."""
+    spec = importlib.util.find_spec('docx')
+    return os.path.join(spec.submodule_search_locations[0], 'templates', 'default.docx')
+
+
+@lru_cache(maxsize=1)
+def _package():
+    with open(_default_template_path(), 'rb') as f:
+        return DocxPackage(f.read())
+
+
+@lru_cache(maxsize=None)
+def _run_properties(font, style):
+    """Return the w:rPr of a form_layout.Style, in schema order; None leaves bold/underline unset."""
+    props = f'<w:rFonts w:ascii="{font}" w:hAnsi="{font}"/>'
+    if style.bold is not None:
+        props += '<w:b/>' if style.bold else '<w:b w:val="0"/>'
+    if style.color is not None:
+        props += f'<w:color w:val="{style.color}"/>'
+    if style.size is not None:
+        props += f'<w:sz w:val="{style.size}"/>'
+    if style.underline is not None:
+        props += '<w:u w:val="single"/>' if style.underline else '<w:u w:val="none"/>'
+    return f'<w:rPr>{props}</w:rPr>'
+
+
+@lru_cache(maxsize=None)
+def _paragraph_properties(style):
+    spacing = ''
+    if style.before is not None:
+        spacing += f' w:before="{style.before}"'
+    if style.after is not None:
+        spacing += f' w:after="{style.after}"'
+    jc = f'<w:jc w:val="{style.align}"/>' if style.align is not None else ''
+    return f'<w:pPr><w:spacing{spacing} w:line="{style.line}" w:lineRule="auto"/>{jc}</w:pPr>'
+
+
+# Party headings and tenant values make the texts open-ended, so this one is bounded.
+@lru_cache(maxsize=4096)
+def _paragraph(font, text, style):
+    """Return one paragraph with a single run, as form_generator.format_paragraph() writes it."""
+    if text:
+        space = ' xml:space="preserve"' if len(text.strip()) < len(text) else ''
+        body = f'<w:t{space}>{xml_text(text)}</w:t>'
+    else:
+        body = ''
+    return f'<w:p>{_paragraph_properties(style)}<w:r>{_run_properties(font, style)}{body}</w:r></w:p>'
+
+
+def _row(font, row, values):
+    cells = []
+    for cell in row.cells:
+        props = f'<w:tcW w:type="dxa" w:w="{cell.width}"/>'
+        if cell.span > 1:
+            props += f'<w:gridSpan w:val="{cell.span}"/>'
+        if cell.center:
+            props += '<w:vAlign w:val="center"/>'
+        paragraphs = ''.join(_paragraph(font, resolve(p.text, values), p.style) for p in cell.paragraphs)
+        cells.append(f'<w:tc><w:tcPr>{props}</w:tcPr>{paragraphs}</w:tc>')
+    return f'<w:tr>{"".join(cells)}</w:tr>'
+
+
+@lru_cache(maxsize=None)
+def _static_row(font, row):
+    """Return a row without slots, rendered once."""
+    return _row(font, row, {})
+
+
+def _rows(font, rows, values):
+    return [_row(font, row, values) if row.dynamic else _static_row(font, row) for row in rows]
+
+
+def _bookmark(rows, bookmark_id, name):
+    """Wrap a block's rows in a bookmark: the start after the first paragraph's pPr, the end in the last paragraph."""
+    first, last = rows[0], rows[-1]
+    at = first.index('</w:pPr>') + len('</w:pPr>')
+    rows[0] = first = f'{first[:at]}<w:bookmarkStart w:id="{bookmark_id}" w:name="{name}"/>{first[at:]}'
+    if len(rows) == 1:
+        last = first
+    at = last.rindex('</w:p>')
+    rows[-1] = f'{last[:at]}<w:bookmarkEnd w:id="{bookmark_id}"/>{last[at:]}'
+    return rows
+
+
+@lru_cache(maxsize=None)
+def _table_head(table):
+    props = '<w:tblW w:type="auto" w:w="0"/>'
+    if table.align is not None:
+        props += f'<w:jc w:val="{table.align}"/>'
+    if table.border is not None:
+        size, color = table.border
+        props += '<w:tblBorders>' + ''.join(
+            f'<w:{edge} w:val="single" w:sz="{size}" w:color="{color}"/>' for edge in TABLE_BORDER_EDGES
+        ) + '</w:tblBorders>'
+    columns = ''.join(f'<w:gridCol w:w="{width}"/>' for width in table.columns)
+    return f'<w:tbl><w:tblPr>{props}{TABLE_LOOK}</w:tblPr><w:tblGrid>{columns}</w:tblGrid>'
+
+
+def _table(font, table, values, counts, bookmark_id, out):
+    """Append a plan table's XML to out; return the next free bookmark id."""
+    out.append(_table_head(table))
+    for item in table.rows:
+        if isinstance(item, Block):
+            prefix = PARTY_GROUPS[item.group][0]
+            count = counts[item.group]
+            for index in range(1, count + 1):
+                rows = _rows(font, item.rows, {**values, **party_values(item.group, index, count)})
+                out.extend(_bookmark(rows, bookmark_id, f'{prefix}_{index}'))
+                bookmark_id += 1
+        else:
+            out.append(_row(font, item, values) if item.dynamic else _static_row(font, item))
+    out.append('</w:tbl>')
+    return bookmark_id
+
+
+def document_xml(applicants=1, defendants=1, tenant=None, plan=None):
+    """Return word/document.xml of the blank form as a string.
+
+    The arguments are those of form_generator.build_document(): party
+    block counts, a tenant (the default profile if None) and a
+    form_layout.Plan (the configured layout if None).
+    """
+    tenant = tenant or DEFAULT_TENANT
+    plan = plan or load_plan()
+    values = tenant_values(tenant)
+    counts = party_counts(applicants, defendants)
+    out = [DOCUMENT_HEAD]
+    bookmark_id = 0
+    for item in plan.body:
+        if isinstance(item, Table):
+            bookmark_id = _table(plan.font, item, values, counts, bookmark_id, out)
+        else:
+            out.append(_paragraph(plan.font, resolve(item.text, values), item.style))
+    out.append(SECTION_PROPERTIES.format(*plan.page, *plan.margins))
+    out.append('</w:body></w:document>')
+    return ''.join(out)
+
+
+def build_docx(applicants=1, defendants=1, tenant=None, plan=None):
+    """Return the bytes of the blank form .docx."""
+    document = document_xml(applicants, defendants, tenant, plan).encode('utf-8')
+    return _package().build({DOCUMENT_PART: document})
+
+
+def create_mediation_form(applicants=1, defendants=1, tenant=None, plan=None):
+    """Create the Mediation Application Form document and return as BytesIO, like form_generator's."""
+    return BytesIO(build_docx(applicants, defendants, tenant, plan))
+
+
+def _canonical_parts(docx_bytes):
+    from lxml import etree
+
+    parser = etree.XMLParser(remove_blank_text=True)
+    parts = {}
+    with zipfile.ZipFile(BytesIO(docx_bytes)) as package:
+        for name in package.namelist():
+            data = package.read(name)
+            if name == '[Content_Types].xml':
+                # Entry order carries no meaning in the content types part.
+                root = etree.fromstring(data, parser)
+                root[:] = sorted(root, key=lambda e: (e.tag, sorted(e.attrib.items())))
+                data = etree.tostring(root, method='c14n')
+            elif name.endswith(('.xml', '.rels')):
+                data = etree.tostring(etree.fromstring(data, parser), method='c14n')
+            parts[name] = data
+    return parts
+
+
+def differences(first, second):
+    """Return the names of the parts that differ structurally between two .docx packages."""
+    a, b = _canonical_parts(first), _canonical_parts(second)
+    return sorted(name for name in set(a) | set(b) if a.get(name) != b.get(name))
+
+
+def main():
+    import argparse
+    import sys
+    import time
+
+    import form_generator
+
+    parser = argparse.ArgumentParser(description='Check the XML backend against python-docx and time both.')
+    parser.add_argument('--applicants', type=int, default=1)
+    parser.add_argument('--defendants', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    counts = (args.applicants, args.defendants)
+    problems = differences(
+        form_generator.create_mediation_form(*counts).getvalue(), create_mediation_form(*counts).getvalue()
+    )
+    if problems:
+        print(f'Parts that differ from the python-docx build: {", ".join(problems)}', file=sys.stderr)
+        sys.exit(1)
+    print('Structurally equivalent to the python-docx build.')
+    for name, build in (('python-docx', form_generator.create_mediation_form), ('xml', create_mediation_form)):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            build(*counts)
+        print(f'{name:12s} {(time.perf_counter() - started) / args.repeat * 1000:8.2f} ms per build')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Production gunicorn settings.
+
+The app is imported and warmed up once in the master (preload_app plus
+the when_ready hook below), so workers fork with python-docx imported and
+the blank form, compiled template and blank PDF already built; the
+copy-on-write pages are shared between workers instead of each worker
+paying for a cold build on its first request. Compiling the template in
+the master also means a malformed template (see form_template.py) stops
+gunicorn at startup with the list of problems.
+
+Once warm, the master also starts the background job runner (jobs.py)
+and restarts it if it exits, so queued /jobs are processed on the same
+disk as the web workers that accepted them.
+
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import gc
+import glob
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Threaded workers, so / and /ready keep answering while the generation
+# executor (GENERATION_CONCURRENCY + GENERATION_QUEUE_DEPTH) is busy.
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+
+# Metrics from all workers are aggregated through one directory; start each
+# deployment without the previous one's snapshots. Only the <pid>.json
+# files are removed, since METRICS_DIR may be a directory the operator
+# chose. This runs before the app is preloaded.
+metrics_dir = os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'mediation-metrics'))
+for path in glob.glob(os.path.join(metrics_dir, '*.json')) + glob.glob(os.path.join(metrics_dir, '*.json.tmp')):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+# The job runner (jobs.py) must see the same JOBS_DIR and artifact store as
+# the web workers, so by default the master starts it next to them and
+# restarts it whenever it exits. Set JOB_RUNNER=0 when a runner is started
+# separately on a disk shared with the web service.
+JOB_RUNNER = os.environ.get('JOB_RUNNER', '1').lower() in ('1', 'true', 'yes', 'on')
+JOB_PROCESSES = int(os.environ.get('JOB_PROCESSES', 1))
+RUNNER_RESTART_DELAY = 5
+_runner = {'process': None, 'stopping': False}
+
+
+def _supervise_job_runner(server):
+    """Run jobs.py until gunicorn exits, restarting it after a crash."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs.py')
+    while not _runner['stopping']:
+        process = subprocess.Popen([sys.executable, script, '--processes', str(JOB_PROCESSES)])
+        _runner['process'] = process
+        server.log.info('Started job runner (pid %s)', process.pid)
+        code = process.wait()
+        if _runner['stopping']:
+            break
+        server.log.error('Job runner exited with status %s; restarting in %ss', code, RUNNER_RESTART_DELAY)
+        time.sleep(RUNNER_RESTART_DELAY)
+
+
+def when_ready(server):
+    from app import STARTUP, warm_up
+
+    warm_up()
+    # Move everything built so far out of the collector's reach so that GC
+    # passes in the workers do not touch (and un-share) those pages.
+    gc.freeze()
+    server.log.info('Warmed up: %s', STARTUP)
+    if JOB_RUNNER:
+        threading.Thread(target=_supervise_job_runner, args=(server,), name='job-runner', daemon=True).start()
+
+
+def post_fork(server, worker):
+    # The warm-up's counters and timings were recorded in the master; drop
+    # them so they are not summed once per worker.
+    from metrics import registry
+
+    registry.reset()
+
+
+def on_exit(server):
+    _runner['stopping'] = True
+    process = _runner['process']
+    if process is None or process.poll() is not None:
+        return
+    # SIGINT lets the runner's Pool shut its worker processes down; an
+    # unfinished job is resumed from its last chunk on the next start.
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
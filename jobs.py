@@ -0,0 +1,292 @@
+"""
+SQLite-backed job queue for large generation batches.
+
+The web app validates an uploaded batch against the field schema, stores
+the normalized rows under JOBS_DIR/<job id>/ and records the job in
+JOBS_DIR/jobs.sqlite3. A runner process started with
+
+    python jobs.py [--processes 2]
+
+claims queued jobs and fills the forms on a pool of worker processes,
+CHUNK_SIZE rows at a time. Every finished chunk is written as its own
+part-NNNNNN.zip before progress is committed, so a runner that is
+restarted (or a job whose runner died) resumes from the first missing
+chunk. When all chunks are done the parts are joined into one ZIP in the
+artifact store, which the web app serves from disk; the job directory
+keeps only the result's hash, and each form is recorded in the case store.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+import zipfile
+from multiprocessing import Pool
+
+import batch
+import case_store
+from artifacts import store as artifacts
+from builds import DEFAULT_BACKEND, TENANTS, get_compiled_template, render_part, template_key
+from case_store import store as cases_db
+
+JOBS_DIR = os.environ.get('JOBS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs')
+CHUNK_SIZE = 500
+# A running job whose heartbeat is older than this is assumed orphaned and reclaimed.
+STALE_AFTER = 120
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    format TEXT NOT NULL,
+    mapping TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    heartbeat REAL,
+    worker_pid INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+
+def connect(directory=JOBS_DIR):
+    """Open the job database, creating it if needed."""
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(directory, 'jobs.sqlite3'), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _job_dir(job_id, directory=JOBS_DIR):
+    return os.path.join(directory, job_id)
+
+
+def _cases_path(job_id, directory=JOBS_DIR):
+    return os.path.join(_job_dir(job_id, directory), 'cases.jsonl')
+
+
+def submit(stream, fmt, mapping=None, directory=JOBS_DIR, on_error='skip', tenant='default', backend=None):
+    """Validate an uploaded batch, store its valid rows and queue it; return the new job id.
+
+    Invalid rows are skipped and listed in the job's errors.txt, or with
+    on_error='reject' the whole batch is refused with BatchRejected.
+    tenant is the id of the tenant profile the forms are filled for and
+    backend the layout backend (builds.BACKENDS) of their template.
+    """
+    job_id = uuid.uuid4().hex
+    job_dir = _job_dir(job_id, directory)
+    os.makedirs(job_dir)
+    errors = []
+    total = 0
+    with open(_cases_path(job_id, directory), 'w', encoding='utf-8') as f:
+        cases = batch.read_cases(stream, fmt, mapping, errors)
+        for case in batch.validate(cases, errors, batch.VALIDATE_BLOCK):
+            f.write(json.dumps(case, separators=(',', ':')) + '\n')
+            total += 1
+    if errors:
+        if on_error == 'reject':
+            shutil.rmtree(job_dir)
+            raise batch.BatchRejected(errors)
+        with open(os.path.join(job_dir, 'errors.txt'), 'w', encoding='utf-8') as f:
+            f.write(batch.error_report(errors))
+    with open(os.path.join(job_dir, 'options.json'), 'w', encoding='utf-8') as f:
+        json.dump({'tenant': tenant, 'backend': backend}, f)
+    conn = connect(directory)
+    try:
+        conn.execute(
+            'INSERT INTO jobs (id, status, format, mapping, total, created) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, 'queued', fmt, json.dumps(mapping or {}), total, time.time())
+        )
+    finally:
+        conn.close()
+    return job_id
+
+
+def get_job(job_id, directory=JOBS_DIR):
+    """Return the status of a job as a dict, or None if it does not exist."""
+    conn = connect(directory)
+    try:
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    eta = None
+    if row['status'] == 'running' and row['done'] and row['started']:
+        elapsed = time.time() - row['started']
+        eta = round(elapsed / row['done'] * (row['total'] - row['done']), 1)
+    return {
+        'id': row['id'],
+        'status': row['status'],
+        'total': row['total'],
+        'done': row['done'],
+        'eta_seconds': eta,
+        'error': row['error'],
+    }
+
+
+def claim_job(conn):
+    """Atomically mark the oldest queued (or orphaned) job as running and return it."""
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?)"
+            ' ORDER BY created LIMIT 1',
+            (now - STALE_AFTER,)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_pid = ?, heartbeat = ?,"
+                ' started = COALESCE(started, ?) WHERE id = ?',
+                (os.getpid(), now, now, row['id'])
+            )
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return row
+
+
+def _part_path(job_id, index, directory):
+    return os.path.join(_job_dir(job_id, directory), f'part-{index:06d}.zip')
+
+
+def _iter_chunks(job, directory):
+    """Yield (index, rows) for the job's validated rows in CHUNK_SIZE groups."""
+    with open(_cases_path(job['id'], directory), encoding='utf-8') as f:
+        yield from enumerate(batch.chunked((tuple(json.loads(line)) for line in f), CHUNK_SIZE))
+
+
+def _job_options(job_id, directory):
+    """Return (tenant id, backend) a job was submitted with; backend None means the default."""
+    try:
+        with open(os.path.join(_job_dir(job_id, directory), 'options.json'), encoding='utf-8') as f:
+            options = json.load(f)
+    except FileNotFoundError:
+        options = {}
+    return options.get('tenant', 'default'), options.get('backend')
+
+
+def run_job(conn, job, pool, processes, directory=JOBS_DIR):
+    """Render every missing chunk of a claimed job and mark it done or failed."""
+    job_id = job['id']
+    tenant_id, backend = _job_options(job_id, directory)
+    done = 0
+
+    def progress(count):
+        nonlocal done
+        done += count
+        conn.execute('UPDATE jobs SET done = ?, heartbeat = ? WHERE id = ?', (done, time.time(), job_id))
+
+    def tasks():
+        for index, rows in _iter_chunks(job, directory):
+            path = _part_path(job_id, index, directory)
+            if os.path.exists(path):
+                progress(len(rows))
+            else:
+                yield path, rows, tenant_id, backend, 'docx'
+
+    try:
+        batch.run_chunks(pool, render_part, tasks(), processes, progress)
+        _store_result(job_id, directory)
+    except Exception as exc:
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+            (str(exc), time.time(), job_id)
+        )
+        return
+    conn.execute("UPDATE jobs SET status = 'done', finished = ? WHERE id = ?", (time.time(), job_id))
+
+
+def iter_parts_zip(job_dir):
+    """Yield one ZIP built from the part-*.zip files and errors.txt in job_dir."""
+
+    def entries():
+        for name in sorted(os.listdir(job_dir)):
+            if name.startswith('part-') and name.endswith('.zip'):
+                with zipfile.ZipFile(os.path.join(job_dir, name)) as part:
+                    for info in part.infolist():
+                        yield info.filename, part.read(info)
+        errors_path = os.path.join(job_dir, 'errors.txt')
+        if os.path.exists(errors_path):
+            with open(errors_path, 'rb') as f:
+                yield 'errors.txt', f.read()
+
+    return batch.iter_zip(entries())
+
+
+def _record_cases(job_id, directory, path, digest):
+    """Archive a job's result in the case store and record one case per form in it."""
+    tenant_id, backend = _job_options(job_id, directory)
+    version = template_key(TENANTS[tenant_id], backend or DEFAULT_BACKEND)
+    cases_db.keep(path, 'zip', digest)
+    with open(_cases_path(job_id, directory), encoding='utf-8') as f:
+        rows = (json.loads(line) for line in f)
+        cases_db.record(
+            case_store.case_record('job', fields, 'docx', digest, 'zip', tenant_id, version,
+                                   batch.entry_name(number, fields))
+            for number, fields in rows
+        )
+
+
+def _store_result(job_id, directory):
+    """Spool the joined result into the artifact store, record its forms and drop the parts."""
+    job_dir = _job_dir(job_id, directory)
+    path, digest = artifacts.put_chunks(iter_parts_zip(job_dir), 'zip')
+    if case_store.ENABLED:
+        _record_cases(job_id, directory, path, digest)
+    tmp_path = os.path.join(job_dir, 'result.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(digest)
+    os.replace(tmp_path, os.path.join(job_dir, 'result'))
+    for name in os.listdir(job_dir):
+        if name.startswith('part-'):
+            os.unlink(os.path.join(job_dir, name))
+
+
+def result_path(job_id, directory=JOBS_DIR):
+    """Return (path, sha256) of a finished job's ZIP, or None if it has expired."""
+    try:
+        with open(os.path.join(_job_dir(job_id, directory), 'result')) as f:
+            digest = f.read().strip()
+    except OSError:
+        return None
+    path = artifacts.get(digest, 'zip')
+    return None if path is None else (path, digest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run queued form generation jobs.')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help='worker processes rendering forms')
+    parser.add_argument('--poll', type=float, default=1.0, help='seconds between queue checks when idle')
+    parser.add_argument('--once', action='store_true', help='exit when the queue is empty')
+    args = parser.parse_args()
+
+    conn = connect()
+    # Built before the pool forks, so every worker starts with the default template.
+    get_compiled_template()
+    with Pool(args.processes) as pool:
+        while True:
+            job = claim_job(conn)
+            if job is None:
+                if args.once:
+                    break
+                time.sleep(args.poll)
+                continue
+            print(f'Running job {job["id"]} ({job["total"]} rows)')
+            run_job(conn, job, pool, args.processes)
+
+
+if __name__ == '__main__':
+    main()
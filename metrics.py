@@ -0,0 +1,216 @@
+"""
+Minimal Prometheus-style metrics for the form generator.
+
+Counters, gauges and histograms are kept in plain dicts per process.
+When METRICS_DIR is set (one directory shared by all gunicorn workers),
+each worker periodically writes a snapshot to <METRICS_DIR>/<pid>.json
+and /metrics sums the snapshots of every worker, so any worker can answer
+a scrape. Gauges are summed over live workers only, so a worker that has
+exited stops contributing its last value. Recording a sample is a dict
+update under a lock; snapshots are written by a background thread at
+most once per flush interval.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'mediation_http_requests_total': ('counter', 'HTTP requests by route, method and status.'),
+    'mediation_http_request_duration_seconds': ('histogram', 'HTTP request latency by route.'),
+    'mediation_http_response_bytes_total': ('counter', 'Response body bytes with a known length, by route.'),
+    'mediation_generation_phase_seconds': ('histogram', 'Time spent in each form generation phase.'),
+    'mediation_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit/miss).'),
+    'mediation_generation_running': ('gauge', 'Renders running on the generation executors.'),
+    'mediation_generation_queue_depth': ('gauge', 'Renders waiting for a generation executor thread, plus running batches.'),
+    'mediation_generation_batches': ('gauge', 'Streaming /bulk and /merge requests holding a generation slot.'),
+    'mediation_generation_rejected_total': ('counter', 'Generation requests refused, by reason (queue_full/timeout).'),
+    'mediation_tenant_templates_cached': ('gauge', 'Tenants whose blank form and compiled template are held in memory.'),
+    'mediation_extracted_forms_total': ('counter', 'Returned forms read by /extract, by result (ok/error).'),
+    'mediation_cases_recorded_total': ('counter', 'Generated forms recorded in the case store, by source.'),
+    'mediation_cases_dropped_total': ('counter', 'Case records lost because the case store could not be written.'),
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labels(labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+
+class Registry:
+    """Per-process counters and histograms with optional shared-directory export."""
+
+    def __init__(self, directory=None, buckets=DEFAULT_BUCKETS, flush_interval=1.0):
+        self.directory = directory
+        self.buckets = buckets
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._dirty = False
+        self._flusher_pid = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def inc(self, name, value=1, **labels):
+        key = f'{name}|{_labels(labels)}'
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._dirty = True
+
+    def set(self, name, value, **labels):
+        key = f'{name}|{_labels(labels)}'
+        with self._lock:
+            self._gauges[key] = value
+            self._dirty = True
+
+    def observe(self, name, seconds, **labels):
+        key = f'{name}|{_labels(labels)}'
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                # One slot per bucket plus +Inf, then sum and count.
+                series = self._histograms[key] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+            self._dirty = True
+
+    @contextmanager
+    def time(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        """Forget counters and histograms recorded so far; gauges keep their current values.
+
+        Called in each forked gunicorn worker, so work done in the master
+        (the warm-up) is not reported once per worker.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'histograms': {key: list(series) for key, series in self._histograms.items()},
+            }
+
+    def flush(self):
+        """Write this worker's snapshot to the shared directory if it changed."""
+        if not self.directory or not self._dirty:
+            return
+        self._dirty = False
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def ensure_flusher(self):
+        """Make sure this process has a thread flushing snapshots in the background.
+
+        Threads do not survive fork, so the flusher is started lazily in each
+        worker rather than at import time.
+        """
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def _collect(self):
+        """Sum snapshots from every worker, using live values for this process."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own = f'{os.getpid()}.json'
+            for filename in os.listdir(self.directory):
+                if not filename.endswith('.json') or filename == own:
+                    continue
+                try:
+                    with open(os.path.join(self.directory, filename)) as f:
+                        snap = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if not _alive(filename[:-len('.json')]):
+                    snap['gauges'] = {}
+                snapshots.append(snap)
+        counters, gauges, histograms = {}, {}, {}
+        for snap in snapshots:
+            for key, value in snap['counters'].items():
+                counters[key] = counters.get(key, 0) + value
+            for key, value in snap.get('gauges', {}).items():
+                gauges[key] = gauges.get(key, 0) + value
+            for key, series in snap['histograms'].items():
+                if len(series) != len(self.buckets) + 3:
+                    continue
+                total = histograms.setdefault(key, [0] * len(series))
+                for i, value in enumerate(series):
+                    total[i] += value
+        return counters, gauges, histograms
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        counters, gauges, histograms = self._collect()
+        values = {**counters, **gauges}
+        series_by_name = {}
+        for key in list(values) + list(histograms):
+            name, labels = key.split('|', 1)
+            series_by_name.setdefault(name, []).append((key, labels))
+
+        lines = []
+        for name in sorted(series_by_name):
+            kind, help_text = METRICS.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, labels in sorted(series_by_name[name]):
+                if key in values:
+                    lines.append(f'{name}{{{labels}}} {values[key]}' if labels else f'{name} {values[key]}')
+                    continue
+                series = histograms[key]
+                prefix = f'{labels},' if labels else ''
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                suffix = f'{{{labels}}}' if labels else ''
+                lines.append(f'{name}_sum{suffix} {series[-2]}')
+                lines.append(f'{name}_count{suffix} {series[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry(os.environ.get('METRICS_DIR') or None)
@@ -0,0 +1,215 @@
+"""
+Opt-in request profiling.
+
+With PROFILE=1 set, a sampled fraction of requests (PROFILE_SAMPLE_RATE)
+and any request carrying an X-Profile-Token header that matches
+PROFILE_TOKEN are profiled from before_request until the response has
+been sent, streamed bodies included. Each capture writes two files to
+PROFILE_DIR: <name>.prof (cProfile stats, for pstats or snakeviz) and
+<name>.txt (top functions by cumulative time plus the largest
+tracemalloc allocation sites). Only the newest PROFILE_KEEP captures are
+kept. The response carries X-Profile-Id: <name>.
+
+cProfile only sees the thread it runs in, so work handed to the
+generation executor is wrapped with bind(), which profiles it in the
+executor thread and adds it to the same capture. tracemalloc is process
+wide, so one capture runs at a time per process.
+
+When PROFILE is unset, install() registers nothing and bind() returns
+its argument, so there is no per-request cost.
+
+    python profiling.py [--defendants 100] [--repeat 5]
+
+profiles create_mediation_form() directly and writes a capture the same way.
+"""
+
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+
+ENABLED = os.environ.get('PROFILE', '').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01))
+TOKEN = os.environ.get('PROFILE_TOKEN') or None
+KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+_active_lock = threading.Lock()
+_local = threading.local()
+_sequence = itertools.count(1)
+
+
+class Capture:
+    """cProfile and tracemalloc data for one profiled request or run."""
+
+    def __init__(self, label):
+        self.label = label
+        self.name = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{next(_sequence)}-{re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_")}'
+        self.started = time.perf_counter()
+        self.profiles = []
+        self._lock = threading.Lock()
+        tracemalloc.start()
+        self.profile = self.add_profile()
+        self.profile.enable()
+
+    def add_profile(self):
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        return profile
+
+    def finish(self, directory=PROFILE_DIR, keep=KEEP):
+        """Stop profiling, write <name>.prof and <name>.txt, and rotate old captures."""
+        self.profile.disable()
+        elapsed = time.perf_counter() - self.started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        os.makedirs(directory, exist_ok=True)
+        stats = pstats.Stats(*self.profiles)
+        stats.dump_stats(os.path.join(directory, f'{self.name}.prof'))
+        report = io.StringIO()
+        report.write(f'{self.label}\nwall time {elapsed * 1000:.1f} ms, '
+                     f'traced memory peak {peak / 1024:.1f} KiB, still allocated {current / 1024:.1f} KiB\n\n')
+        pstats.Stats(*self.profiles, stream=report).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        report.write('Top allocations by line\n')
+        for stat in snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ]).statistics('lineno')[:TOP_ALLOCATIONS]:
+            report.write(f'{stat}\n')
+        with open(os.path.join(directory, f'{self.name}.txt'), 'w') as f:
+            f.write(report.getvalue())
+        _rotate(directory, keep)
+
+
+def _rotate(directory, keep):
+    """Delete all but the newest keep captures in directory."""
+    names = {}
+    for filename in os.listdir(directory):
+        base, ext = os.path.splitext(filename)
+        if ext in ('.prof', '.txt'):
+            path = os.path.join(directory, filename)
+            try:
+                names[base] = max(names.get(base, 0), os.stat(path).st_mtime)
+            except OSError:
+                continue
+    for base in sorted(names, key=names.get, reverse=True)[keep:]:
+        for ext in ('.prof', '.txt'):
+            try:
+                os.unlink(os.path.join(directory, base + ext))
+            except OSError:
+                pass
+
+
+def _start(label):
+    """Start a capture unless another one is running in this process."""
+    if not _active_lock.acquire(blocking=False):
+        return None
+    try:
+        return Capture(label)
+    except BaseException:
+        _active_lock.release()
+        raise
+
+
+def _finish(capture):
+    try:
+        capture.finish()
+    finally:
+        _active_lock.release()
+
+
+def _bind(func):
+    capture = getattr(_local, 'capture', None)
+    if capture is None:
+        return func
+
+    def profiled(*args, **kwargs):
+        profile = capture.add_profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    return profiled
+
+
+def _identity(func):
+    return func
+
+
+bind = _bind if ENABLED else _identity
+
+
+def install(app):
+    """Register the profiling hooks on a Flask app when PROFILE is set."""
+    if not ENABLED:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        wanted = (TOKEN is not None and request.headers.get('X-Profile-Token') == TOKEN) or (
+            SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+        )
+        if wanted:
+            capture = _start(f'{request.method} {request.path}')
+            if capture is not None:
+                g.profile_capture = _local.capture = capture
+
+    @app.after_request
+    def _finish_profile(response):
+        capture = g.pop('profile_capture', None)
+        if capture is not None:
+            _local.capture = None
+            response.headers['X-Profile-Id'] = capture.name
+            if response.direct_passthrough:
+                # send_file() bodies go to the server's file wrapper, which never
+                # runs close callbacks; there is no Python work left to profile.
+                _finish(capture)
+            else:
+                # Runs once the body has been sent, so streamed output is included.
+                response.call_on_close(lambda: _finish(capture))
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(_):
+        # The request failed before after_request; still write what was captured.
+        capture = g.pop('profile_capture', None)
+        if capture is not None:
+            _local.capture = None
+            _finish(capture)
+
+
+def main():
+    import argparse
+
+    import form_generator
+
+    parser = argparse.ArgumentParser(description='Profile create_mediation_form() and write a capture.')
+    parser.add_argument('--applicants', type=int, default=1)
+    parser.add_argument('--defendants', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    form_generator.create_mediation_form()  # keep imports and first-call setup out of the capture
+    capture = Capture(f'create_mediation_form x{args.repeat} {args.applicants}a {args.defendants}d')
+    for _ in range(args.repeat):
+        form_generator.create_mediation_form(args.applicants, args.defendants)
+    capture.finish()
+    print(os.path.join(PROFILE_DIR, f'{capture.name}.txt'))
+
+
+if __name__ == '__main__':
+    main()
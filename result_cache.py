@@ -0,0 +1,178 @@
+"""
+Content-addressed cache of filled documents.
+
+Entries are keyed by a hash of the template version, the output format
+and the normalized field values, so a repeated request costs a lookup
+instead of a render. The first tier is a per-process LRU bounded by total
+bytes; the optional second tier is a directory shared by all gunicorn
+workers. Disk entries are written to a temporary file and renamed into
+place, so readers in other workers never see a partial file, and the
+directory is trimmed back under its size limit by evicting the least
+recently used files.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def cache_key(version, fmt, fields, names=None):
+    """Return the hex key for a render of fields.
+
+    Only names that the template uses take part, and missing, None and
+    empty-string values are dropped since they all render the same way.
+    """
+    normalized = {
+        name: value for name, value in fields.items()
+        if (names is None or name in names) and value is not None and value != ''
+    }
+    payload = json.dumps([version, fmt, normalized], sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Bounded in-memory LRU with an optional on-disk tier."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, directory=None, max_disk_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'disk_evictions': 0}
+        self._disk_bytes = self._scan_disk()[1] if directory else 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Return cached bytes for key, or None."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return data
+        if self.directory:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                data = None
+            if data is not None:
+                self.stats['disk_hits'] += 1
+                self._remember(key, data)
+                return data
+        self.stats['misses'] += 1
+        return None
+
+    def peek(self, key):
+        """Return cached bytes for key, or None, without changing what is cached.
+
+        Unlike get(), a hit does not refresh the entry's recency and a disk
+        hit is not copied into memory, so bulk reads cannot evict the
+        entries interactive requests rely on.
+        """
+        with self._lock:
+            data = self._entries.get(key)
+        if data is None and self.directory:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                pass
+        return data
+
+    def put(self, key, data):
+        """Store data under key in memory and, when configured, on disk."""
+        self._remember(key, data)
+        if self.directory:
+            self._write_disk(key, data)
+
+    def get_or_render(self, key, render):
+        """Return (data, hit) for key, calling render() and caching it on a miss."""
+        data = self.get(key)
+        if data is not None:
+            return data, True
+        data = render()
+        self.put(key, data)
+        return data, False
+
+    def _remember(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.stats['evictions'] += 1
+
+    def _write_disk(self, key, data):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._disk_bytes += len(data)
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _scan_disk(self):
+        """Return ([(atime, size, path)], total bytes) for the disk tier."""
+        files, total = [], 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((max(st.st_atime, st.st_mtime), st.st_size, path))
+                total += st.st_size
+        return files, total
+
+    def _evict_disk(self):
+        """Delete least recently used files until the disk tier is 90% of its limit.
+
+        Other workers may be evicting at the same time, so files that are
+        already gone are skipped.
+        """
+        files, total = self._scan_disk()
+        files.sort()
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            self.stats['disk_evictions'] += 1
+        with self._lock:
+            self._disk_bytes = total
@@ -0,0 +1,112 @@
+"""
+Field schema for the Form A placeholders.
+
+Each field declares a type (which picks its normalizer), whether it is
+required and a maximum length. validate_cases() checks a whole batch
+column by column before anything is rendered: every value of a field is
+normalized in one sweep, and problems come back as (row_number, message)
+pairs for the batch error report.
+"""
+
+import re
+
+PHONE_SEPARATORS_RE = re.compile(r'[\s().-]+')
+PHONE_RE = re.compile(r'\+?\d{7,15}')
+EMAIL_RE = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+
+
+def normalize_text(value):
+    """Collapse runs of whitespace to single spaces and trim the ends."""
+    return ' '.join(str(value).split())
+
+
+def normalize_phone(value):
+    """Drop spaces, dots, dashes and brackets; keep a leading + and 7-15 digits."""
+    phone = PHONE_SEPARATORS_RE.sub('', str(value))
+    if not PHONE_RE.fullmatch(phone):
+        raise ValueError('not a valid phone number')
+    return phone
+
+
+def normalize_email(value):
+    """Trim the address and lower-case its domain."""
+    email = str(value).strip()
+    if not EMAIL_RE.fullmatch(email):
+        raise ValueError('not a valid email address')
+    local, domain = email.rsplit('@', 1)
+    return f'{local}@{domain.lower()}'
+
+
+NORMALIZERS = {
+    'text': normalize_text,
+    'phone': normalize_phone,
+}
+
+# name: (type, required, max length)
+FIELDS = {
+    'client_name': ('text', False, 200),
+    'branch_address': ('text', False, 500),
+    'mobile': ('phone', False, None),
+    'customer_name': ('text', True, 200),
+    'address1': ('text', False, 500),
+}
+
+# Fields that move into each party object when a row lists several parties.
+PARTY_FIELDS = {
+    'applicants': ('client_name', 'branch_address', 'mobile'),
+    'defendants': ('customer_name', 'address1'),
+}
+
+
+def _columns(rows):
+    """Return {field: [(row index, record, label)]} over the fields in the schema.
+
+    record is the dict that holds the value: the row itself, or one party
+    object when the row gives a list for that field's party group.
+    """
+    columns = {name: [] for name in FIELDS}
+    group_of = {name: group for group, names in PARTY_FIELDS.items() for name in names}
+    for index, (_, fields) in enumerate(rows):
+        for name in FIELDS:
+            parties = fields.get(group_of.get(name))
+            if isinstance(parties, list) and parties:
+                for position, party in enumerate(parties, start=1):
+                    columns[name].append((index, party, f'{group_of[name]}[{position}].{name}'))
+            else:
+                columns[name].append((index, fields, name))
+    return columns
+
+
+def validate_cases(rows):
+    """Normalize a batch of (row_number, fields) in place, field by field.
+
+    Returns (valid rows, errors) where errors lists (row_number, message)
+    in row order; a row with any error is left out of the valid rows.
+    """
+    errors = {}
+    for name, column in _columns(rows).items():
+        kind, required, max_length = FIELDS[name]
+        normalize = NORMALIZERS[kind]
+        for index, record, label in column:
+            value = record.get(name)
+            if value is None or value == '':
+                if required:
+                    errors.setdefault(index, []).append(f'{label}: required')
+                continue
+            try:
+                value = normalize(value)
+            except ValueError as exc:
+                errors.setdefault(index, []).append(f'{label}: {exc}')
+                continue
+            if not value and required:
+                errors.setdefault(index, []).append(f'{label}: required')
+            elif max_length and len(value) > max_length:
+                errors.setdefault(index, []).append(f'{label}: longer than {max_length} characters')
+            record[name] = value
+    valid = [row for index, row in enumerate(rows) if index not in errors]
+    report = [
+        (rows[index][0], message)
+        for index in sorted(errors)
+        for message in errors[index]
+    ]
+    return valid, report
@@ -0,0 +1,151 @@
+"""
+Tenant profiles: the parts of Form A that differ between firms and districts.
+
+The legal services authority and court in the header and the applicant's
+email address are static text in the blank form. Each tenant overrides
+them in a JSON file TENANTS_DIR/<tenant id>.json:
+
+    {"authority": "Pune District Legal Services Authority",
+     "court": "District Court, Pune",
+     "email": "mediation@example.in"}
+
+Keys left out keep the default profile's value, and a default.json
+changes the default itself. Profiles are read and checked once at
+startup; every tenant's blank form is then built and compiled on first
+use and kept in a bounded cache (see builds.build_once), keyed by the
+tenant's version, a hash of its profile.
+
+    python tenants.py
+
+checks every profile and lists the tenants.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+
+from schema import normalize_email, normalize_text
+
+TENANTS_DIR = os.environ.get('TENANTS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tenants')
+DEFAULT_ID = 'default'
+TENANT_ID_RE = re.compile(r'[a-z0-9][a-z0-9_-]{0,63}')
+
+# field: (normalizer, maximum length)
+PROFILE_FIELDS = {
+    'authority': (normalize_text, 200),
+    'court': (normalize_text, 200),
+    'email': (normalize_email, 254),
+}
+DEFAULT_PROFILE = {
+    'authority': 'Mumbai District Legal Services Authority',
+    'court': 'City Civil Court, Mumbai',
+    'email': 'info@kslegal.co.in',
+}
+
+
+class TenantError(ValueError):
+    """Raised when tenant profiles are malformed; problems lists each one."""
+
+    def __init__(self, problems):
+        super().__init__('invalid tenant profiles:\n' + '\n'.join(f'  {p}' for p in problems))
+        self.problems = problems
+
+
+class Tenant:
+    """One tenant's profile values and the version hash its builds are cached under."""
+
+    def __init__(self, tenant_id, authority, court, email):
+        self.id = tenant_id
+        self.authority = authority
+        self.court = court
+        self.email = email
+        payload = json.dumps([authority, court, email], separators=(',', ':'))
+        self.version = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def __repr__(self):
+        return f'Tenant({self.id!r}, version={self.version!r})'
+
+
+DEFAULT = Tenant(DEFAULT_ID, **DEFAULT_PROFILE)
+
+
+def _profile(tenant_id, data, base, problems):
+    """Return base updated from one profile's data, appending any problems."""
+    if not isinstance(data, dict):
+        problems.append(f'{tenant_id}: expected a JSON object')
+        return None
+    values = dict(base)
+    for key, value in data.items():
+        if key not in PROFILE_FIELDS:
+            problems.append(f'{tenant_id}: unknown key "{key}" (expected {", ".join(PROFILE_FIELDS)})')
+            continue
+        normalize, max_length = PROFILE_FIELDS[key]
+        if not isinstance(value, str):
+            problems.append(f'{tenant_id}.{key}: expected a string')
+            continue
+        try:
+            value = normalize(value)
+        except ValueError as exc:
+            problems.append(f'{tenant_id}.{key}: {exc}')
+            continue
+        if not value:
+            problems.append(f'{tenant_id}.{key}: must not be empty')
+        elif '{{' in value or '{%' in value:
+            problems.append(f'{tenant_id}.{key}: must not contain template tags')
+        elif len(value) > max_length:
+            problems.append(f'{tenant_id}.{key}: longer than {max_length} characters')
+        else:
+            values[key] = value
+    return values
+
+
+def load_tenants(directory=TENANTS_DIR):
+    """Return {tenant id: Tenant} for every profile in directory plus the default.
+
+    Raises TenantError listing every malformed file; a missing directory
+    just means only the default tenant exists.
+    """
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        names = []
+    raw = {}
+    problems = []
+    for name in names:
+        tenant_id, ext = os.path.splitext(name)
+        if ext != '.json':
+            continue
+        if not TENANT_ID_RE.fullmatch(tenant_id):
+            problems.append(f'{name}: tenant ids are lower-case letters, digits, "-" and "_"')
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                raw[tenant_id] = json.load(f)
+        except (OSError, ValueError) as exc:
+            problems.append(f'{name}: {exc}')
+    base = _profile(DEFAULT_ID, raw.pop(DEFAULT_ID, {}), DEFAULT_PROFILE, problems)
+    loaded = {DEFAULT_ID: Tenant(DEFAULT_ID, **base) if base else DEFAULT}
+    for tenant_id, data in raw.items():
+        values = _profile(tenant_id, data, base or DEFAULT_PROFILE, problems)
+        if values is not None:
+            loaded[tenant_id] = Tenant(tenant_id, **values)
+    if problems:
+        raise TenantError(problems)
+    return loaded
+
+
+def main():
+    try:
+        loaded = load_tenants()
+    except TenantError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    for tenant in loaded.values():
+        print(f'{tenant.id}\t{tenant.version}\t{tenant.authority} / {tenant.court} / {tenant.email}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
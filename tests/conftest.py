@@ -0,0 +1,14 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# The modules live at the repository root rather than in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the app's artifact, case and job directories out of the checkout.
+_scratch = tempfile.mkdtemp(prefix='mediation-tests-')
+atexit.register(shutil.rmtree, _scratch, True)
+for _name in ('ARTIFACT_DIR', 'CASES_DIR', 'JOBS_DIR'):
+    os.environ.setdefault(_name, os.path.join(_scratch, _name.lower()))
@@ -0,0 +1,105 @@
+"""Case lookups must find forms by normalized names, numbers and words, and page through them."""
+
+import pytest
+
+import app
+import case_store
+from artifacts import ArtifactStore
+from case_store import CaseQueryError, CaseStore, case_record
+
+TOKEN = 'test-token'
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CaseStore(str(tmp_path / 'cases'), ArtifactStore(str(tmp_path / 'cases' / 'artifacts')))
+    store.record(case_record('render', fields, 'docx', None, None) for fields in [
+        {'customer_name': 'Ravi  Sharma', 'client_name': 'HDFC Bank', 'mobile': '+91 98765-43210'},
+        {'customer_name': 'Ravinder Singh', 'client_name': 'ICICI Bank', 'mobile': '9123456780'},
+        {'customer_name': 'Meena Sharma', 'client_name': 'HDFC Bank', 'mobile': '+919000000001'},
+    ])
+    return store
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    monkeypatch.setattr(case_store, 'ENABLED', True)
+    monkeypatch.setattr(case_store, 'TOKEN', TOKEN)
+    monkeypatch.setattr(app, 'cases_db', store)
+    client = app.app.test_client()
+    client.environ_base['HTTP_X_CASES_TOKEN'] = TOKEN
+    return client
+
+
+def names(cases):
+    return [case['fields']['customer_name'] for case in cases]
+
+
+@pytest.mark.parametrize('mobile', ['9876543210', '+919876543210', '+91 98765 43210', '098765-43210'])
+def test_mobile_matches_with_or_without_the_country_code(store, mobile):
+    assert names(store.search(mobile=mobile)) == ['Ravi  Sharma']
+
+
+@pytest.mark.parametrize('mobile', ['9123456780', '+919123456780'])
+def test_number_stored_without_country_code_is_found_with_it(store, mobile):
+    assert names(store.search(mobile=mobile)) == ['Ravinder Singh']
+
+
+def test_names_match_whole_normalized_values(store):
+    assert names(store.search(customer_name='ravi sharma')) == ['Ravi  Sharma']
+    assert store.search(customer_name='Ravi') == []
+
+
+def test_trailing_star_matches_a_prefix(store):
+    assert names(store.search(customer_name='Ravi*')) == ['Ravinder Singh', 'Ravi  Sharma']
+    assert names(store.search(customer_name='ravi*', client_name='hdfc*')) == ['Ravi  Sharma']
+
+
+def test_text_matches_every_word_as_a_prefix(store):
+    assert names(store.search(text='sharma')) == ['Meena Sharma', 'Ravi  Sharma']
+    assert names(store.search(text='shar hdf')) == ['Meena Sharma', 'Ravi  Sharma']
+    assert names(store.search(text='rav icici')) == ['Ravinder Singh']
+    assert names(store.search(text='98765')) == ['Ravi  Sharma']
+
+
+@pytest.mark.parametrize('arguments, problem', [
+    ({'customer_name': '  '}, 'customer_name is empty'),
+    ({'text': '!!'}, 'text has no words'),
+    ({'limit': 0}, 'limit must be between'),
+    ({'before': 'unknown'}, 'before is not a known case'),
+])
+def test_unusable_searches_are_rejected(store, arguments, problem):
+    with pytest.raises(CaseQueryError) as error:
+        store.search(**arguments)
+    assert problem in '; '.join(error.value.problems)
+
+
+def test_next_link_pages_through_every_match(client):
+    seen, url = [], '/cases?q=bank&limit=2'
+    while url:
+        body = client.get(url).get_json()
+        seen.extend(names(body['cases']))
+        url = body['next']
+    assert seen == ['Meena Sharma', 'Ravinder Singh', 'Ravi  Sharma']
+
+
+def test_last_page_has_no_next_link(client):
+    body = client.get('/cases?customer_name=Ravi*&limit=5').get_json()
+    assert names(body['cases']) == ['Ravinder Singh', 'Ravi  Sharma']
+    assert body['next'] is None
+
+
+@pytest.mark.parametrize('query', [
+    'since=yesterday', 'until=2024-13-01', 'limit=ten', 'limit=0', 'limit=100000', 'q=%21%21',
+])
+def test_bad_search_parameters_get_400(client, query):
+    assert client.get(f'/cases?{query}').status_code == 400
+
+
+def test_since_bounds_the_creation_time(client):
+    assert len(client.get('/cases?since=2000-01-01').get_json()['cases']) == 3
+    assert client.get('/cases?since=2999-01-01').get_json()['cases'] == []
+
+
+def test_search_needs_the_token(client):
+    assert client.get('/cases', headers={'X-Cases-Token': 'wrong'}).status_code == 403
@@ -0,0 +1,67 @@
+"""Packages written from pre-compressed parts must read back as valid .docx files."""
+
+import io
+import zipfile
+
+import docx
+import pytest
+
+import form_generator
+import form_xml
+from docx_package import DocxPackage
+from form_template import DOCUMENT_PART
+
+DOCUMENT = '<w:document>Réparation … “quoted”</w:document>'.encode('utf-8') * 500
+
+
+@pytest.fixture(scope='module')
+def template():
+    return form_generator.create_mediation_form().getvalue()
+
+
+def read_parts(data):
+    """Return {name: bytes} of a package after checking every member's CRC."""
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        assert package.testzip() is None
+        return {name: package.read(name) for name in package.namelist()}
+
+
+@pytest.mark.parametrize('level', [0, 1, 6, 9])
+def test_build_replaces_only_the_document(template, level):
+    data = DocxPackage(template).build({DOCUMENT_PART: DOCUMENT}, level)
+    assert read_parts(data) == {**read_parts(template), DOCUMENT_PART: DOCUMENT}
+
+
+def test_iter_build_streams_the_document(template):
+    chunks = [b'<w:document>', b'', b'x' * 200000, DOCUMENT, b'</w:document>']
+    data = b''.join(DocxPackage(template).iter_build(DOCUMENT_PART, iter(chunks)))
+    assert read_parts(data) == {**read_parts(template), DOCUMENT_PART: b''.join(chunks)}
+
+
+def test_built_package_opens_in_python_docx(template):
+    with zipfile.ZipFile(io.BytesIO(template)) as package:
+        document = package.read(DOCUMENT_PART)
+    for data in (
+        DocxPackage(template).build({DOCUMENT_PART: document}),
+        b''.join(DocxPackage(template).iter_build(DOCUMENT_PART, [document])),
+    ):
+        assert 'MEDIATION' in '\n'.join(p.text for p in docx.Document(io.BytesIO(data)).paragraphs).upper()
+
+
+def test_missing_dynamic_part_is_rejected(template):
+    with pytest.raises(ValueError):
+        DocxPackage(template, dynamic_parts=('word/missing.xml',))
+
+
+@pytest.mark.parametrize('counts', [(1, 1), (2, 3), (0, 2), (1, 0), (0, 0)])
+def test_xml_backend_matches_python_docx(counts):
+    built = form_xml.create_mediation_form(*counts).getvalue()
+    read_parts(built)
+    assert form_xml.differences(form_generator.create_mediation_form(*counts).getvalue(), built) == []
+
+
+@pytest.mark.parametrize('counts', [(-1, 1), (1, 1.5), (None, 1)])
+def test_both_backends_reject_bad_party_counts(counts):
+    for backend in (form_generator, form_xml):
+        with pytest.raises(ValueError):
+            backend.create_mediation_form(*counts)
@@ -0,0 +1,122 @@
+"""Generation slots must be refused when full and always handed back, however a request ends."""
+
+import io
+import threading
+import time
+
+import pytest
+
+import app
+from executor import BoundedExecutor, GenerationTimeout, QueueFull
+
+CASES = ''.join(['customer_name\n'] + [f'Customer {n}\n' for n in range(50)]).encode()
+
+
+def wait_until_idle(executor, timeout=5):
+    deadline = time.monotonic() + timeout
+    while executor.running or executor.queued:
+        assert time.monotonic() < deadline, 'the executor kept its slots'
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    executor = BoundedExecutor(max_workers=1, max_queue=1, timeout=0.2, max_reserved=1)
+    monkeypatch.setattr(app, 'generation', executor)
+    return executor
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def test_full_queue_is_refused():
+    executor = BoundedExecutor(max_workers=1, max_queue=1, max_reserved=2)
+    slots = [executor.reserve(), executor.reserve()]
+    with pytest.raises(QueueFull):
+        executor.submit(lambda: None)
+    for slot in slots:
+        slot.release()
+        slot.release()  # a second release must not free someone else's slot
+    assert executor.queued == 0
+    assert executor.run(lambda: 'done') == 'done'
+
+
+def test_reservations_are_capped():
+    executor = BoundedExecutor(max_workers=2, max_queue=4, max_reserved=1)
+    slot = executor.reserve()
+    with pytest.raises(QueueFull):
+        executor.reserve()
+    slot.release()
+    executor.reserve().release()
+
+
+def test_failed_render_frees_its_slot():
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+
+    def fail():
+        raise RuntimeError('render failed')
+
+    with pytest.raises(RuntimeError):
+        executor.run(fail)
+    wait_until_idle(executor)
+    assert executor.run(lambda: 'next') == 'next'
+
+
+def test_timed_out_render_frees_its_slot_when_it_ends():
+    executor = BoundedExecutor(max_workers=1, max_queue=0, timeout=0.05)
+    release = threading.Event()
+    with pytest.raises(GenerationTimeout):
+        executor.run(release.wait)
+    release.set()
+    wait_until_idle(executor)
+    assert executor.run(lambda: 'next') == 'next'
+
+
+def test_render_gets_429_when_the_queue_is_full(generation, client):
+    slot = generation.reserve()
+    generation.submit(time.sleep, 0.2)
+    try:
+        response = client.post('/render', json={'customer_name': 'Queue Full'})
+    finally:
+        slot.release()
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == app.RETRY_AFTER
+    wait_until_idle(generation)
+
+
+def test_render_gets_503_on_timeout_and_frees_the_slot(generation, client, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(app, 'render_document', lambda *args: release.wait(5) and b'late')
+    response = client.post('/render', json={'customer_name': 'Slow Render'})
+    assert response.status_code == 503
+    release.set()
+    wait_until_idle(generation)
+
+
+def test_render_error_frees_the_slot(generation, client, monkeypatch):
+    def fail(*args):
+        raise RuntimeError('render failed')
+
+    monkeypatch.setattr(app, 'render_document', fail)
+    assert client.post('/render', json={'customer_name': 'Broken Render'}).status_code == 500
+    wait_until_idle(generation)
+
+
+def test_failed_batch_request_frees_its_slot(generation, client):
+    assert client.post('/bulk').status_code == 400  # no upload, refused after admission
+    assert generation.reserved == 0
+    assert generation.queued == 0
+
+
+def test_batch_slot_is_freed_when_the_stream_is_closed_early(generation, client):
+    response = client.post('/bulk', data={'file': (io.BytesIO(CASES), 'cases.csv')}, buffered=False)
+    assert response.status_code == 200
+    chunks = iter(response.response)
+    assert next(chunks)
+    assert generation.reserved == 1
+    assert client.post('/bulk', data={'file': (io.BytesIO(CASES), 'cases.csv')}).status_code == 429
+    response.close()
+    assert generation.reserved == 0
+    assert generation.queued == 0
@@ -0,0 +1,46 @@
+"""Filled forms must be drawn inside the page margins, however long a field is."""
+
+import re
+
+import pytest
+
+import form_generator
+import form_pdf
+from form_template import CompiledTemplate
+
+TEXT_RE = re.compile(rb'Tf [\d.]+ ([\d.]+) Td \((.*?)\) Tj')
+RECT_RE = re.compile(rb'w [\d.]+ ([\d.]+) [\d.]+ ([\d.]+) re S')
+
+
+@pytest.fixture(scope='module')
+def template():
+    return CompiledTemplate(form_generator.create_mediation_form().getvalue())
+
+
+def drawn(fields, template):
+    """Return (page, canvas) of a filled form laid out for PDF."""
+    page, blocks = form_pdf.parse_document(template.render_xml(fields))
+    return page, form_pdf.layout(page, blocks)
+
+
+@pytest.mark.parametrize('words', [10, 3000])
+def test_long_fields_stay_inside_the_margins(template, words):
+    address = ' '.join(f'word{n}' for n in range(words))
+    page, canvas = drawn({'customer_name': 'R. Sharma', 'address1': address}, template)
+    top = page['height'] - page['top']
+    shown = set()
+    for ops in canvas.pages:
+        for op in ops:
+            for baseline, text in TEXT_RE.findall(op):
+                assert page['bottom'] <= float(baseline) <= top
+                shown.update(re.findall(rb'word(\d+)', text))
+            for bottom, height in RECT_RE.findall(op):
+                assert float(bottom) >= page['bottom'] - 0.01
+                assert float(bottom) + float(height) <= top + 0.01
+    assert len(shown) == words
+
+
+def test_a_row_taller_than_a_page_continues_on_the_next(template):
+    _, short = drawn({'address1': 'Pune'}, template)
+    _, long = drawn({'address1': ' '.join(['Pune'] * 4000)}, template)
+    assert len(long.pages) > len(short.pages) + 1
@@ -0,0 +1,101 @@
+"""The compiled template must render the split tags of the layout exactly as Jinja would."""
+
+import io
+import json
+import zipfile
+
+import pytest
+from lxml import etree
+
+import form_generator
+from form_template import DOCUMENT_PART, CompiledTemplate, TemplateError, compile_ops, normalize_tags
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+BLANK = ' ________________ '
+
+
+@pytest.fixture(scope='module')
+def template():
+    return CompiledTemplate(form_generator.create_mediation_form().getvalue())
+
+
+def defendant_address_cells(document_xml):
+    """Return the paragraph texts of each defendant's Address cell."""
+    root = etree.fromstring(document_xml.encode('utf-8') if isinstance(document_xml, str) else document_xml)
+    cells = []
+    for cell in root.iter(f'{W}tc'):
+        texts = [''.join(t.text or '' for t in p.iter(f'{W}t')) for p in cell.iter(f'{W}p')]
+        if 'CORRESPONDENCE ADDRESS:' in texts:
+            cells.append(texts)
+    return cells
+
+
+def address_cell(value):
+    return ['REGISTERED ADDRESS:', value, '', 'CORRESPONDENCE ADDRESS:', value, '']
+
+
+def test_filled_address_replaces_the_split_conditional(template):
+    assert defendant_address_cells(template.render_xml({'address1': '12 MG Road, Pune'})) == [
+        address_cell('12 MG Road, Pune ')
+    ]
+
+
+@pytest.mark.parametrize('fields', [{}, {'address1': ''}, {'address1': None}])
+def test_missing_address_takes_the_else_branch(template, fields):
+    assert defendant_address_cells(template.render_xml(fields)) == [address_cell(BLANK)]
+
+
+def test_address_is_escaped(template):
+    assert defendant_address_cells(template.render_xml({'address1': 'A & <B>'})) == [address_cell('A & <B> ')]
+
+
+def test_each_defendant_gets_its_own_address(template):
+    cells = defendant_address_cells(template.render_xml({'defendants': [{'address1': 'First'}, {}]}))
+    assert cells == [address_cell('First '), address_cell(BLANK)]
+
+
+@pytest.mark.parametrize('fields', [{}, {'customer_name': 'R. Sharma', 'address1': 'Pune'}])
+def test_no_template_tags_survive(template, fields):
+    xml = template.render_xml(fields)
+    assert not any(tag in xml for tag in ('{{', '}}', '{%', '%}'))
+
+
+@pytest.mark.parametrize('value, shown', [
+    (json.loads('"\\ud800"'), ''),  # a lone surrogate, as JSON input can carry
+    ('A\udfffB', 'AB'),
+    ('A\x00\x0bB', 'AB'),
+    ('A\ufffe\uffffB', 'AB'),
+])
+def test_characters_xml_cannot_hold_are_dropped(template, value, shown):
+    fields = {'customer_name': value, 'address1': value}
+    etree.fromstring(template.render_xml(fields).encode('utf-8'))
+    with zipfile.ZipFile(io.BytesIO(template.render(fields))) as package:
+        assert package.testzip() is None
+    assert defendant_address_cells(template.render_xml(fields)) == [address_cell(f'{shown} ')]
+
+
+def test_render_packages_the_rendered_document(template):
+    fields = {'customer_name': 'R. Sharma', 'address1': 'Pune'}
+    with zipfile.ZipFile(io.BytesIO(template.render(fields))) as package:
+        assert package.testzip() is None
+        assert package.read(DOCUMENT_PART) == template.render_xml(fields).encode('utf-8')
+
+
+def test_render_merged_is_a_valid_package(template):
+    data = b''.join(template.render_merged([{'address1': 'One'}, {}], ['row 3: customer_name: required']))
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        assert package.testzip() is None
+        cells = defendant_address_cells(package.read(DOCUMENT_PART))
+    assert cells == [address_cell('One '), address_cell(BLANK)]
+
+
+@pytest.mark.parametrize('xml, problem', [
+    ('<w:t>{% if address1 %}x</w:t>', 'never closed'),
+    ('<w:t>{% if address1</w:t>', 'unclosed tag'),
+    ('<w:t>{{ unknown_field }}</w:t>', 'unknown field'),
+    ('<w:t>{% endif %}</w:t>', 'without a matching'),
+])
+def test_bad_tags_are_rejected(xml, problem):
+    with pytest.raises(TemplateError) as error:
+        compile_ops(normalize_tags(xml))
+    assert problem in '; '.join(error.value.problems)